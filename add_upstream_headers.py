@@ -2,50 +2,373 @@
 """
 Script to automatically add X-Upstream-Target headers after proxy_pass directives in nginx config files.
 
+Each file is tokenized and parsed into its block structure once, so multi-line
+directives, comments, quoted strings and `proxy_pass $variable` forms are
+handled, and a header that already applies to the block (directly, through an
+include, or inherited from an enclosing block) is never added twice.
+
 Usage:
     python add_upstream_headers.py [directory]
-    
+    python add_upstream_headers.py [directory] --jobs 8 --manifest .httptests/.headers-manifest.json
+    python add_upstream_headers.py [directory] --exclude 'vendor' --exclude 'legacy/*.conf'
+
     If no directory is specified, searches for all .conf files in current directory and subdirectories.
 """
 
+import fnmatch
+import glob
+import hashlib
+import json
 import os
 import re
 import sys
-from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+HEADER_NAME = 'X-Upstream-Target'
+
+# Directories never worth scanning for nginx configs
+DEFAULT_EXCLUDES = ['.git', 'node_modules']
+
+# Blocks in which nginx does not accept proxy_set_header
+HEADERLESS_BLOCKS = ('if', 'limit_except')
+
+# Below this many files a worker pool costs more than it saves
+PARALLEL_THRESHOLD = 32
+
+
+class NginxSyntaxError(ValueError):
+    """Raised when a config file cannot be parsed."""
+
+    def __init__(self, message, line):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+
+
+class Token:
+    """A word, quoted string or one of ';', '{', '}' with its position in the source."""
+
+    __slots__ = ('kind', 'value', 'start', 'end', 'line')
+
+    def __init__(self, kind, value, start, end, line):
+        self.kind = kind
+        self.value = value
+        self.start = start
+        self.end = end
+        self.line = line
+
+
+class Directive:
+    """A parsed directive; `block` holds the children of block directives, otherwise None."""
+
+    __slots__ = ('name', 'args', 'start', 'end', 'line', 'block', 'parent')
+
+    def __init__(self, name, args, start, end, line, parent):
+        self.name = name
+        self.args = args
+        self.start = start
+        self.end = end  # offset just after the terminating ';' or '{'
+        self.line = line
+        self.block = None
+        self.parent = parent
+
+
+def tokenize(text):
+    """Yield the tokens of an nginx config, skipping whitespace and comments."""
+    i = 0
+    line = 1
+    length = len(text)
+    while i < length:
+        char = text[i]
+        if char == '\n':
+            line += 1
+            i += 1
+        elif char.isspace():
+            i += 1
+        elif char == '#':
+            end = text.find('\n', i)
+            i = length if end == -1 else end
+        elif char in ';{}':
+            yield Token(char, char, i, i + 1, line)
+            i += 1
+        elif char in '"\'':
+            start, start_line = i, line
+            value = []
+            i += 1
+            while i < length and text[i] != char:
+                if text[i] == '\\' and i + 1 < length:
+                    i += 1
+                if text[i] == '\n':
+                    line += 1
+                value.append(text[i])
+                i += 1
+            if i >= length:
+                raise NginxSyntaxError('unterminated quoted string', start_line)
+            i += 1
+            yield Token('word', ''.join(value), start, i, start_line)
+        else:
+            start = i
+            value = []
+            while i < length and not text[i].isspace() and text[i] not in ';{}':
+                if text[i] == '\\' and i + 1 < length:
+                    i += 1
+                elif text[i] == '$' and text.startswith('{', i + 1):
+                    # ${var} inside a word is a variable, not a block
+                    close = text.find('}', i)
+                    if close == -1:
+                        raise NginxSyntaxError('unterminated variable', line)
+                    value.append(text[i:close + 1])
+                    i = close + 1
+                    continue
+                value.append(text[i])
+                i += 1
+            yield Token('word', ''.join(value), start, i, line)
+
+
+def parse(text):
+    """Parse an nginx config into a list of top-level Directives."""
+    root = []
+    stack = [(None, root)]
+    current = []  # words of the directive being read
+    for token in tokenize(text):
+        parent, children = stack[-1]
+        if token.kind == 'word':
+            current.append(token)
+            continue
+        if token.kind == '}':
+            if current:
+                raise NginxSyntaxError(f"unexpected '}}' after '{current[0].value}'", token.line)
+            if parent is None:
+                raise NginxSyntaxError("unexpected '}'", token.line)
+            stack.pop()
+            continue
+        if not current:
+            raise NginxSyntaxError(f"unexpected '{token.value}'", token.line)
+        directive = Directive(current[0].value, [t.value for t in current[1:]],
+                              current[0].start, token.end, current[0].line, parent)
+        children.append(directive)
+        current = []
+        if token.kind == '{':
+            directive.block = []
+            stack.append((directive, directive.block))
+    if current:
+        raise NginxSyntaxError(f"missing ';' after '{current[0].value}'", current[0].line)
+    if len(stack) > 1:
+        raise NginxSyntaxError(f"unclosed '{stack[-1][0].name}' block", stack[-1][0].line)
+    return root
+
+
+def upstream_target(proxy_pass_arg):
+    """Header value for a proxy_pass argument.
+
+    `http://backend:5001/` becomes `backend:5001`. A bare variable
+    (`proxy_pass $upstream;`) is passed through as-is so nginx interpolates
+    it at request time; note its value then includes the scheme.
+    """
+    url = proxy_pass_arg
+    if url.startswith('$'):
+        return url
+    url = re.sub(r'^[a-zA-Z][a-zA-Z0-9+.-]*://', '', url)
+    return url.rstrip('/')
 
 
 def extract_proxy_url(line):
     """Extract the URL from a proxy_pass directive."""
-    # Match proxy_pass http://backend:5001/; or similar patterns
-    match = re.search(r'proxy_pass\s+(https?://[^;]+);', line)
-    if match:
-        url = match.group(1)
-        # Remove trailing slash if present
-        url = url.rstrip('/')
-        # Remove protocol prefix for cleaner header
-        url = re.sub(r'^https?://', '', url)
-        return url
+    try:
+        directives = parse(line)
+    except NginxSyntaxError:
+        return None
+    for directive in directives:
+        if directive.name == 'proxy_pass' and directive.args:
+            return upstream_target(directive.args[0])
     return None
 
 
 def get_indentation(line):
     """Get the indentation (spaces/tabs) from a line."""
-    match = re.match(r'^(\s*)', line)
+    match = re.match(r'^([ \t]*)', line)
     return match.group(1) if match else ''
 
 
-def has_upstream_target_header(lines, start_idx, indentation):
-    """Check if X-Upstream-Target header already exists after the proxy_pass line."""
-    # Look ahead a few lines to see if the header already exists
-    for i in range(start_idx + 1, min(start_idx + 5, len(lines))):
-        if 'X-Upstream-Target' in lines[i]:
+def is_upstream_header(directive):
+    return directive.name == 'proxy_set_header' and directive.args and directive.args[0].lower() == HEADER_NAME.lower()
+
+
+def resolve_include(pattern, conf_dir, root_dir):
+    """Local files an include directive refers to.
+
+    Relative patterns are tried against the including file's directory and the
+    scanned directory. Absolute ones (e.g. /etc/nginx/snippets/*.conf) are
+    matched by their trailing path components inside the scanned directory.
+    """
+    if '$' in pattern:
+        return []
+    if os.path.isabs(pattern):
+        parts = pattern.strip('/').split('/')
+        candidates = [os.path.join(root_dir, *parts[i:]) for i in range(len(parts))]
+    else:
+        candidates = [os.path.join(conf_dir, pattern), os.path.join(root_dir, pattern)]
+    for candidate in candidates:
+        matches = sorted(path for path in glob.glob(candidate) if os.path.isfile(path))
+        if matches:
+            return matches
+    return []
+
+
+class HeaderScope:
+    """Answers which blocks already get an X-Upstream-Target header, following includes."""
+
+    def __init__(self, conf_dir, root_dir):
+        self.conf_dir = conf_dir
+        self.root_dir = root_dir
+        self.include_cache = {}
+
+    def included(self, directive, depth=0):
+        """Top-level directives of the files an include pulls in."""
+        if depth > 8 or not directive.args:
+            return []
+        directives = []
+        for path in resolve_include(directive.args[0], self.conf_dir, self.root_dir):
+            if path not in self.include_cache:
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        self.include_cache[path] = parse(f.read())
+                except (OSError, UnicodeDecodeError, NginxSyntaxError):
+                    self.include_cache[path] = []
+            for child in self.include_cache[path]:
+                if child.name == 'include':
+                    directives.extend(self.included(child, depth + 1))
+                else:
+                    directives.append(child)
+        return directives
+
+    def header_directives(self, block):
+        """proxy_set_header directives of a block, including those from includes."""
+        found = []
+        for directive in block:
+            if directive.name == 'proxy_set_header':
+                found.append(directive)
+            elif directive.name == 'include':
+                found.extend(d for d in self.included(directive) if d.name == 'proxy_set_header')
+        return found
+
+    def has_header(self, block, parent):
+        """Whether X-Upstream-Target applies to a block.
+
+        Like nginx, proxy_set_header directives are inherited from the enclosing
+        block only when the block itself defines none.
+        """
+        while True:
+            headers = self.header_directives(block)
+            if headers:
+                return any(is_upstream_header(d) for d in headers)
+            if parent is None:
+                return False
+            block, parent = parent.block, parent.parent
+
+
+def rewrite(text, conf_dir='.', root_dir='.', scope=None):
+    """Add missing X-Upstream-Target headers to a config.
+
+    Returns (new_text, changes, messages) where messages are (kind, line, text)
+    tuples in source order. The text is left untouched when nothing is added.
+    Pass a HeaderScope to find out afterwards which includes were read.
+    """
+    directives = parse(text)
+    scope = scope or HeaderScope(conf_dir, root_dir)
+    newline = '\r\n' if '\r\n' in text else '\n'
+    insertions = []
+    messages = []
+
+    def visit(block, parent):
+        for directive in block:
+            if directive.block is not None:
+                visit(directive.block, directive)
+                continue
+            if directive.name != 'proxy_pass' or not directive.args:
+                continue
+            target = upstream_target(directive.args[0])
+            if parent is not None and parent.name in HEADERLESS_BLOCKS:
+                messages.append(('WARN', directive.line,
+                                 f"proxy_set_header is not allowed in '{parent.name}' blocks, "
+                                 f"not adding {HEADER_NAME} for {target}"))
+                continue
+            if scope.has_header(block, parent):
+                messages.append(('SKIP', directive.line, f"{HEADER_NAME} already exists for {target}"))
+                continue
+            header = f'proxy_set_header {HEADER_NAME} "{target.replace(chr(34), chr(92) + chr(34))}";'
+            # A synthetic directive so a second proxy_pass in the block sees the header
+            block.append(Directive('proxy_set_header', [HEADER_NAME, target], directive.end, directive.end,
+                                   directive.line, parent))
+            line_end = text.find('\n', directive.end)
+            line_end = len(text) if line_end == -1 else line_end
+            rest = text[directive.end:line_end].strip()
+            if rest and not rest.startswith('#'):
+                # More directives on the same line (e.g. `location / { proxy_pass ...; }`)
+                insertions.append((directive.end, ' ' + header))
+            else:
+                if text[line_end - 1:line_end] == '\r':
+                    line_end -= 1
+                line_start = text.rfind('\n', 0, directive.start) + 1
+                indentation = get_indentation(text[line_start:directive.start])
+                insertions.append((line_end, newline + indentation + header))
+            messages.append(('ADD', directive.line, f"Added {HEADER_NAME} for {target}"))
+
+    visit(directives, None)
+    if not insertions:
+        return text, 0, messages
+
+    parts = []
+    previous = 0
+    for offset, insert in sorted(insertions):
+        parts.append(text[previous:offset])
+        parts.append(insert)
+        previous = offset
+    parts.append(text[previous:])
+    return ''.join(parts), len(insertions), messages
+
+
+def has_upstream_header_after(lines, index):
+    """Whether the lines following a proxy_pass already set X-Upstream-Target."""
+    for line in lines[index + 1:index + 5]:
+        if HEADER_NAME in line:
             return True
-        # Stop searching if we hit a closing brace or another directive
-        if re.match(r'^\s*\}', lines[i]) or re.match(r'^\s*proxy_', lines[i]):
+        # Stop searching at a closing brace or another proxy directive
+        if re.match(r'^\s*\}', line) or re.match(r'^\s*proxy_', line):
             break
     return False
 
 
+def rewrite_lines(text):
+    """Add X-Upstream-Target headers line by line, for files the parser rejects.
+
+    Only a proxy_pass on a line of its own is seen, and an existing header is
+    looked for in the next few lines. Returns (new_text, changes, messages)
+    like rewrite().
+    """
+    lines = text.splitlines(keepends=True)
+    newline = '\r\n' if '\r\n' in text else '\n'
+    new_lines = []
+    messages = []
+    changes = 0
+    for index, line in enumerate(lines):
+        new_lines.append(line)
+        if 'proxy_pass' not in line or line.lstrip().startswith('#'):
+            continue
+        target = extract_proxy_url(line)
+        if not target:
+            continue
+        if has_upstream_header_after(lines, index):
+            messages.append(('SKIP', index + 1, f"{HEADER_NAME} already exists for {target}"))
+            continue
+        if not line.endswith('\n'):
+            new_lines[-1] = line + newline
+        header = f'proxy_set_header {HEADER_NAME} "{target.replace(chr(34), chr(92) + chr(34))}";'
+        new_lines.append(get_indentation(line) + header + newline)
+        messages.append(('ADD', index + 1, f"Added {HEADER_NAME} for {target}"))
+        changes += 1
+    return ''.join(new_lines) if changes else text, changes, messages
+
+
 def safe_print(text):
     """Print text safely, handling encoding issues on Windows."""
     try:
@@ -55,71 +378,186 @@ def safe_print(text):
         print(text.encode('ascii', 'replace').decode('ascii'))
 
 
-def process_nginx_conf(filepath, dry_run=False):
-    """Process a single nginx.conf file and add X-Upstream-Target headers."""
-    safe_print(f"\n[*] Processing: {filepath}")
-    
-    with open(filepath, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-    
-    modified = False
-    new_lines = []
-    i = 0
-    changes_made = 0
-    
-    while i < len(lines):
-        line = lines[i]
-        new_lines.append(line)
-        
-        # Check if this line contains proxy_pass
-        if 'proxy_pass' in line and not line.strip().startswith('#'):
-            proxy_url = extract_proxy_url(line)
-            
-            if proxy_url:
-                indentation = get_indentation(line)
-                
-                # Check if X-Upstream-Target header already exists nearby
-                if has_upstream_target_header(lines, i, indentation):
-                    safe_print(f"  [SKIP] Line {i+1}: X-Upstream-Target already exists for {proxy_url}")
-                else:
-                    # Add the X-Upstream-Target header
-                    header_line = f'{indentation}proxy_set_header X-Upstream-Target "{proxy_url}";\n'
-                    new_lines.append(header_line)
-                    modified = True
-                    changes_made += 1
-                    safe_print(f"  [ADD] Line {i+1}: Added X-Upstream-Target for {proxy_url}")
-        
-        i += 1
-    
-    if modified:
+def file_sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def rewrite_file(filepath, dry_run=False, root_dir=None, known_sha256=None):
+    """Rewrite one file; safe to run in a worker process.
+
+    Returns a dict with the number of changes, the log lines to print and the
+    file's state afterwards (for the manifest), including the hashes of the
+    includes that were read. When the content hash equals known_sha256 the
+    file was already processed and is not parsed again.
+    """
+    result = {'path': filepath, 'changes': 0, 'log': [f"\n[*] Processing: {filepath}"], 'unchanged': False}
+    with open(filepath, 'rb') as f:
+        raw = f.read()
+    sha256 = hashlib.sha256(raw).hexdigest()
+    if known_sha256 == sha256:
+        result.update(unchanged=True, log=[], sha256=sha256)
+        return result
+
+    conf_dir = os.path.dirname(filepath) or '.'
+    root_dir = root_dir or conf_dir
+    scope = HeaderScope(conf_dir, root_dir)
+    try:
+        text = raw.decode('utf-8')
+    except UnicodeDecodeError as e:
+        result['log'].append(f"  [ERROR] Could not read {filepath}: {e}")
+        result['error'] = True
+        return result
+    try:
+        new_text, changes, messages = rewrite(text, conf_dir, root_dir, scope=scope)
+    except NginxSyntaxError as e:
+        # Still add the header where a plain proxy_pass line makes it obvious
+        result['log'].append(f"  [WARN] Could not parse {filepath}: {e}; falling back to line-based insertion")
+        new_text, changes, messages = rewrite_lines(text)
+    # An include gaining or losing the header changes what this file needs
+    result['includes'] = {os.path.relpath(path, root_dir).replace(os.sep, '/'): file_sha256(path)
+                          for path in scope.include_cache if os.path.isfile(path)}
+
+    for kind, line, message in messages:
+        result['log'].append(f"  [{kind}] Line {line}: {message}")
+    if changes:
         if not dry_run:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.writelines(new_lines)
-            safe_print(f"  [SAVED] {changes_made} change(s) to {filepath}")
+            raw = new_text.encode('utf-8')
+            with open(filepath, 'wb') as f:
+                f.write(raw)
+            sha256 = hashlib.sha256(raw).hexdigest()
+            result['log'].append(f"  [SAVED] {changes} change(s) to {filepath}")
         else:
-            safe_print(f"  [DRY RUN] Would save {changes_made} change(s) to {filepath}")
-        return changes_made
+            result['log'].append(f"  [DRY RUN] Would save {changes} change(s) to {filepath}")
     else:
-        safe_print(f"  [INFO] No changes needed")
-        return 0
+        result['log'].append(f"  [INFO] No changes needed")
+    result['changes'] = changes
+    result['sha256'] = sha256
+    return result
 
 
-def find_nginx_configs(directory):
+def process_nginx_conf(filepath, dry_run=False, root_dir=None):
+    """Process a single nginx.conf file and add X-Upstream-Target headers."""
+    result = rewrite_file(filepath, dry_run=dry_run, root_dir=root_dir)
+    for line in result['log']:
+        safe_print(line)
+    return result['changes']
+
+
+def is_excluded(rel_path, patterns):
+    """Whether a path relative to the search directory, or its name, matches an exclude glob."""
+    name = os.path.basename(rel_path)
+    return any(fnmatch.fnmatch(rel_path, pattern) or fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+
+def find_nginx_configs(directory, excludes=DEFAULT_EXCLUDES):
     """Find all nginx configuration files (.conf) in the directory and subdirectories."""
     nginx_files = []
-    
+
     for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.endswith('.conf'):
+        rel_root = os.path.relpath(root, directory).replace(os.sep, '/')
+        rel_root = '' if rel_root == '.' else rel_root + '/'
+        # Prune excluded directories instead of walking into them
+        dirs[:] = sorted(d for d in dirs if not is_excluded(rel_root + d, excludes))
+        for file in sorted(files):
+            if file.endswith('.conf') and not is_excluded(rel_root + file, excludes):
                 nginx_files.append(os.path.join(root, file))
-    
+
     return nginx_files
 
 
+def manifest_version():
+    """Changes whenever this script changes, so a new rewriter re-processes every file."""
+    with open(os.path.abspath(__file__), 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_manifest(path):
+    """Per-file state recorded by the previous run, or an empty manifest."""
+    if path and os.path.isfile(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') == manifest_version():
+                return manifest.get('files', {})
+        except (OSError, ValueError):
+            pass
+    return {}
+
+
+def save_manifest(path, files):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'version': manifest_version(), 'files': files}, f, indent=2, sort_keys=True)
+
+
+def includes_unchanged(entry, root_dir):
+    """Whether the includes recorded in a manifest entry still have the same content."""
+    for rel_path, sha256 in entry.get('includes', {}).items():
+        try:
+            if file_sha256(os.path.join(root_dir, rel_path)) != sha256:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def process_files(nginx_files, root_dir, dry_run=False, jobs=0, manifest_path=None):
+    """Rewrite files, in a worker pool when there are many, skipping those the manifest marks as done.
+
+    Logs are printed in file order. Returns the total number of changes.
+    """
+    manifest = load_manifest(manifest_path)
+    pending = []
+    skipped = 0
+    for filepath in nginx_files:
+        key = os.path.relpath(filepath, root_dir).replace(os.sep, '/')
+        entry = manifest.get(key)
+        if entry and not includes_unchanged(entry, root_dir):
+            entry = None
+        stat = os.stat(filepath)
+        if entry and entry.get('mtime_ns') == stat.st_mtime_ns and entry.get('size') == stat.st_size:
+            skipped += 1
+            continue
+        pending.append((filepath, key, entry.get('sha256') if entry else None))
+
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    if jobs > 1 and len(pending) >= PARALLEL_THRESHOLD:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(rewrite_file, [p[0] for p in pending], [dry_run] * len(pending),
+                                        [root_dir] * len(pending), [p[2] for p in pending],
+                                        chunksize=max(1, len(pending) // (jobs * 4))))
+    else:
+        results = [rewrite_file(filepath, dry_run, root_dir, sha256) for filepath, _, sha256 in pending]
+
+    total_changes = 0
+    for (filepath, key, _), result in zip(pending, results):
+        for line in result['log']:
+            safe_print(line)
+        total_changes += result['changes']
+        if result['unchanged']:
+            skipped += 1
+        if 'sha256' in result and not dry_run:
+            stat = os.stat(filepath)
+            includes = result['includes'] if 'includes' in result else manifest.get(key, {}).get('includes', {})
+            manifest[key] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': result['sha256'],
+                             'includes': includes}
+        elif key in manifest:
+            del manifest[key]
+
+    if skipped:
+        safe_print(f"\n[SKIP] {skipped} file(s) unchanged since the last run (manifest)")
+    if manifest_path and not dry_run:
+        # Files that disappeared since the last run are dropped
+        existing = {os.path.relpath(f, root_dir).replace(os.sep, '/') for f in nginx_files}
+        save_manifest(manifest_path, {k: v for k, v in manifest.items() if k in existing})
+    return total_changes
+
+
 def main():
     """Main entry point."""
     import argparse
-    
+
     parser = argparse.ArgumentParser(
         description='Add X-Upstream-Target headers after proxy_pass directives in nginx config files (.conf)'
     )
@@ -138,39 +576,54 @@ def main():
         '--file',
         help='Process a specific file instead of searching directory'
     )
-    
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=0,
+        help='Worker processes for large trees (default: number of CPUs, 1 disables the pool)'
+    )
+    parser.add_argument(
+        '--manifest',
+        help='JSON file recording processed files; unchanged files are skipped on the next run'
+    )
+    parser.add_argument(
+        '--exclude',
+        action='append',
+        default=[],
+        help=f"Glob of directories or files to skip, matched against the name or relative path "
+             f"(repeatable, always excludes {', '.join(DEFAULT_EXCLUDES)})"
+    )
+
     args = parser.parse_args()
-    
+
     if args.dry_run:
         safe_print("[DRY RUN MODE] No files will be modified\n")
-    
+
     if args.file:
         # Process a specific file
         if not os.path.isfile(args.file):
             safe_print(f"[ERROR] File not found: {args.file}")
             sys.exit(1)
-        
+
         total_changes = process_nginx_conf(args.file, dry_run=args.dry_run)
     else:
         # Search directory for nginx config files
         if not os.path.isdir(args.directory):
             safe_print(f"[ERROR] Directory not found: {args.directory}")
             sys.exit(1)
-        
+
         safe_print(f"[SEARCH] Searching for nginx config files (.conf) in: {args.directory}")
-        nginx_files = find_nginx_configs(args.directory)
-        
+        nginx_files = find_nginx_configs(args.directory, DEFAULT_EXCLUDES + args.exclude)
+
         if not nginx_files:
             safe_print(f"[ERROR] No .conf files found in {args.directory}")
             sys.exit(1)
-        
+
         safe_print(f"[FOUND] {len(nginx_files)} config file(s)")
-        
-        total_changes = 0
-        for nginx_file in nginx_files:
-            changes = process_nginx_conf(nginx_file, dry_run=args.dry_run)
-            total_changes += changes
-    
+
+        total_changes = process_files(nginx_files, args.directory, dry_run=args.dry_run,
+                                      jobs=args.jobs, manifest_path=args.manifest)
+
     safe_print(f"\n{'='*60}")
     if args.dry_run:
         safe_print(f"[DRY RUN] Would make {total_changes} total change(s)")
@@ -181,4 +634,3 @@ def main():
 
 if __name__ == '__main__':
     main()
-
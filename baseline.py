@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""Latency baselines and regression checks between runs.
+
+A baseline stores the latency samples (ms) of every case of a run:
+
+    {
+      "version": 1,
+      "testFile": ".httptests/test.json",
+      "recordedAt": "2026-01-01T00:00:00+00:00",
+      "cases": {"GET api.example.com [0] /users": {"samplesMs": [3.1, 2.9, 3.4]}}
+    }
+
+A later run is compared case by case with a one-sided Mann-Whitney U test
+(are the new samples stochastically larger?). A case only counts as a
+regression when the shift is significant *and* larger than both the
+absolute and the relative threshold, so noise on shared CI runners and
+tiny shifts of fast routes do not fail the build. The shift is the
+Hodges-Lehmann estimate: the median of all pairwise differences.
+"""
+import json
+import math
+import os
+import statistics
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+BASELINE_VERSION = 1
+
+# Fewer samples per side cannot reach significance at the usual alpha levels
+MIN_SAMPLES = 5
+
+# Samples kept per case when recording
+MAX_SAMPLES = 1000
+
+
+class BaselineError(ValueError):
+    """A baseline file that cannot be used"""
+
+
+def mann_whitney_greater(baseline: Sequence[float], current: Sequence[float]) -> float:
+    """One-sided p-value that ``current`` tends to be larger than ``baseline``.
+
+    Normal approximation with tie and continuity correction, which is
+    accurate enough from about five samples per side.
+    """
+    n1, n2 = len(baseline), len(current)
+    values = sorted([(value, 0) for value in baseline] + [(value, 1) for value in current])
+    # Average ranks over ties
+    rank_sum = 0.0
+    tie_term = 0.0
+    i = 0
+    while i < len(values):
+        j = i
+        while j + 1 < len(values) and values[j + 1][0] == values[i][0]:
+            j += 1
+        rank = (i + j) / 2 + 1
+        ties = j - i + 1
+        tie_term += ties ** 3 - ties
+        rank_sum += rank * sum(1 for k in range(i, j + 1) if values[k][1] == 1)
+        i = j + 1
+    u = rank_sum - n2 * (n2 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def hodges_lehmann(baseline: Sequence[float], current: Sequence[float], limit: int = 200) -> float:
+    """Median of pairwise differences current - baseline (on at most ``limit`` samples per side)"""
+    def thin(values: Sequence[float]) -> Sequence[float]:
+        if len(values) <= limit:
+            return values
+        ordered = sorted(values)
+        return [ordered[i * len(ordered) // limit] for i in range(limit)]
+    return statistics.median(c - b for b in thin(baseline) for c in thin(current))
+
+
+class Comparison:
+    """Result of comparing one case with the baseline"""
+
+    __slots__ = ("case", "baseline_n", "current_n", "baseline_p50", "current_p50", "shift_ms", "shift_pct",
+                 "p_value", "regressed")
+
+    def __init__(self, case: str, baseline: Sequence[float], current: Sequence[float], alpha: float,
+                 threshold_ms: float, threshold_pct: float):
+        self.case = case
+        self.baseline_n = len(baseline)
+        self.current_n = len(current)
+        self.baseline_p50 = statistics.median(baseline)
+        self.current_p50 = statistics.median(current)
+        self.shift_ms = hodges_lehmann(baseline, current)
+        self.shift_pct = self.shift_ms / self.baseline_p50 * 100 if self.baseline_p50 > 0 else math.inf
+        self.p_value = mann_whitney_greater(baseline, current)
+        self.regressed = (self.p_value < alpha and self.shift_ms > threshold_ms
+                          and self.shift_pct > threshold_pct)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "case": self.case,
+            "baselineSamples": self.baseline_n,
+            "samples": self.current_n,
+            "baselineP50Ms": round(self.baseline_p50, 3),
+            "p50Ms": round(self.current_p50, 3),
+            "shiftMs": round(self.shift_ms, 3),
+            "shiftPct": round(self.shift_pct, 1) if math.isfinite(self.shift_pct) else None,
+            "pValue": self.p_value,
+            "regressed": self.regressed,
+        }
+
+
+class Baseline:
+    """Recorded latency samples of a run and the comparisons made against them"""
+
+    def __init__(self, cases: Dict[str, List[float]], alpha: float = 0.01, threshold_ms: float = 5.0,
+                 threshold_pct: float = 10.0):
+        self.cases = cases
+        self.alpha = alpha
+        self.threshold_ms = threshold_ms
+        self.threshold_pct = threshold_pct
+        self.results: List[Comparison] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str, **thresholds: float) -> "Baseline":
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except OSError as e:
+            raise BaselineError(f"{path}: {e.strerror or e}") from None
+        except json.JSONDecodeError as e:
+            raise BaselineError(f"{path}: line {e.lineno}: {e.msg}") from None
+        if not isinstance(data, dict) or data.get("version") != BASELINE_VERSION:
+            raise BaselineError(f"{path}: not a version {BASELINE_VERSION} baseline")
+        cases = {case: entry.get("samplesMs") or [] for case, entry in (data.get("cases") or {}).items()}
+        return cls(cases, **thresholds)
+
+    def compare(self, case: str, samples: Sequence[float]) -> Optional[Comparison]:
+        """Compare the samples (ms) of a case; None when the baseline has no usable samples for it"""
+        baseline = self.cases.get(case)
+        if not baseline or len(baseline) < MIN_SAMPLES or len(samples) < MIN_SAMPLES:
+            return None
+        result = Comparison(case, baseline, samples, self.alpha, self.threshold_ms, self.threshold_pct)
+        with self._lock:
+            self.results.append(result)
+        return result
+
+    def table(self, limit: int = 10) -> List[str]:
+        """Lines of a table of the cases that slowed down the most"""
+        if not self.results:
+            return []
+        worst = sorted(self.results, key=lambda r: r.shift_ms, reverse=True)[:limit]
+        regressions = sum(r.regressed for r in self.results)
+        lines = [f"Latency vs baseline (ms): {regressions} regression(s) in {len(self.results)} compared case(s), "
+                 f"worst {len(worst)}",
+                 f"    {'Case':<48} {'base p50':>9} {'p50':>9} {'shift':>8} {'shift%':>7} {'p-value':>8}"]
+        for r in worst:
+            pct = f"{r.shift_pct:+.1f}" if math.isfinite(r.shift_pct) else "inf"
+            lines.append(f"  {'✗' if r.regressed else ' '} {r.case[:48]:<48} {r.baseline_p50:>9.1f} {r.current_p50:>9.1f} "
+                         f"{r.shift_ms:>+8.1f} {pct:>7} {r.p_value:>8.4f}")
+        return lines
+
+
+def case_samples(report_cases: Iterable[Dict[str, Any]]) -> Dict[str, List[float]]:
+    """Latency samples (ms) per case id of run report cases"""
+    samples: Dict[str, List[float]] = {}
+    for case in report_cases:
+        if case.get("id") and case.get("timing"):
+            samples.setdefault(case["id"], []).extend(case.get("samplesMs") or [case["timing"]["totalMs"]])
+    return samples
+
+
+def record(path: str, report_cases: Iterable[Dict[str, Any]], test_file: Optional[str] = None) -> int:
+    """Write a baseline of the cases of a run report; returns the number of cases"""
+    cases = {case: {"samplesMs": values[-MAX_SAMPLES:]} for case, values in case_samples(report_cases).items()}
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "version": BASELINE_VERSION,
+            "testFile": test_file,
+            "recordedAt": datetime.now(timezone.utc).isoformat(),
+            "cases": cases,
+        }, f, indent=1)
+    return len(cases)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""Benchmark of the test runner itself against a local echo server.
+
+Synthetic test files of increasing size are run with main.py against an
+in-process echo_server.py, without Docker or network, to measure the
+runner's own overhead: CPU time of the runner process, requests per second,
+peak RSS and the time until the first request goes out.
+
+Scenarios:
+    paths-1k, paths-10k, paths-100k   endpoints with one path each, spread over 10 hosts
+    headers                           1k cases with 50 request and 50 upstream header checks each
+    bodies                            200 POSTs of 1MB with payload checksum verification
+
+Usage:
+    python benchmark.py                                  # all but paths-100k
+    python benchmark.py --scenarios paths-1k,paths-100k --runs 3
+    python benchmark.py --json bench.json -- --runner unittest
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+from typing import Any, Callable, Dict, List
+
+from echo_server import EchoServer
+
+ACTION_DIR = os.path.dirname(os.path.abspath(__file__))
+HOSTS = [f"h{i}.bench.test" for i in range(10)]
+CONTENT_TYPE = ["Content-Type", "application/json; charset=utf-8"]
+
+
+def paths_suite(count: int) -> Dict[str, Any]:
+    hosts: Dict[str, List[Dict[str, Any]]] = {host: [] for host in HOSTS}
+    for i in range(count):
+        host = HOSTS[i % len(HOSTS)]
+        hosts[host].append({
+            "paths": [f"/items/{i}"],
+            "expectedStatus": 200,
+            "expectedResponseHeaders": [CONTENT_TYPE],
+            "expectedRequestHeadersToUpstream": [["host", host]],
+        })
+    return {"hosts": hosts}
+
+
+def headers_suite(count: int, headers: int) -> Dict[str, Any]:
+    sent = {f"X-Bench-{n}": f"value-{n}" for n in range(headers)}
+    endpoint = {
+        "paths": [f"/headers/{{1..{count}}}"],
+        "additionalRequestHeaders": sent,
+        "expectedStatus": 200,
+        "expectedResponseHeaders": [CONTENT_TYPE],
+        "expectedRequestHeadersToUpstream": [[name.lower(), value] for name, value in sent.items()],
+    }
+    return {"hosts": {HOSTS[0]: [endpoint]}}
+
+
+def bodies_suite(count: int, size: int) -> Dict[str, Any]:
+    endpoint = {
+        "paths": [f"/upload/{{1..{count}}}"],
+        "method": "POST",
+        "payload": {"size": size, "source": "seeded", "cache": True, "verifyChecksum": True},
+        "expectedStatus": 200,
+    }
+    return {"hosts": {HOSTS[0]: [endpoint]}}
+
+
+SCENARIOS: Dict[str, Callable[[], Dict[str, Any]]] = {
+    "paths-1k": lambda: paths_suite(1000),
+    "paths-10k": lambda: paths_suite(10000),
+    "paths-100k": lambda: paths_suite(100000),
+    "headers": lambda: headers_suite(1000, 50),
+    "bodies": lambda: bodies_suite(200, 1024 * 1024),
+}
+DEFAULT_SCENARIOS = ["paths-1k", "paths-10k", "headers", "bodies"]
+
+
+def peak_rss_mb(maxrss: int) -> float:
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+def run_once(server: EchoServer, test_file: str, extra_args: List[str]) -> Dict[str, Any]:
+    """Run main.py once and measure it"""
+    server.stats.reset()
+    command = [sys.executable, os.path.join(ACTION_DIR, "main.py"), "--test-file", test_file,
+               "--skip-health-check", "--base-url", f"http://127.0.0.1:{server.port}", *extra_args]
+    with tempfile.TemporaryFile() as errors:
+        start = perf_counter()
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=errors)
+        # wait4 gives the resource usage of this child alone
+        _, status, usage = os.wait4(process.pid, 0)
+        wall = perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+        errors.seek(0)
+        stderr = errors.read().decode("utf-8", "replace")
+    stats = server.stats
+    serving = (stats.last_request - stats.first_request) if stats.requests > 1 else 0
+    return {
+        "exitCode": process.returncode,
+        "stderr": stderr[-2000:],
+        "requests": stats.requests,
+        "wallS": wall,
+        "startupMs": (stats.first_request - start) * 1000 if stats.first_request else None,
+        "requestsPerS": stats.requests / serving if serving else None,
+        "cpuS": usage.ru_utime + usage.ru_stime,
+        "peakRssMb": peak_rss_mb(usage.ru_maxrss),
+    }
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Median of every measurement over the runs"""
+    summary: Dict[str, Any] = {"runs": len(runs), "exitCode": max(run["exitCode"] for run in runs),
+                               "requests": runs[-1]["requests"]}
+    for key in ("wallS", "startupMs", "requestsPerS", "cpuS", "peakRssMb"):
+        values = [run[key] for run in runs if run[key] is not None]
+        summary[key] = statistics.median(values) if values else None
+    summary["cpuUsPerRequest"] = summary["cpuS"] / summary["requests"] * 1e6 if summary["requests"] else None
+    return summary
+
+
+def print_table(results: Dict[str, Dict[str, Any]]) -> None:
+    def fmt(value: Any, spec: str) -> str:
+        return "-" if value is None else format(value, spec)
+
+    print(f"\n{'Scenario':<12} {'requests':>9} {'wall s':>8} {'startup ms':>11} {'req/s':>9} "
+          f"{'CPU s':>8} {'CPU µs/req':>11} {'peak RSS MB':>12}")
+    for name, r in results.items():
+        print(f"{name:<12} {r['requests']:>9} {fmt(r['wallS'], '.2f'):>8} {fmt(r['startupMs'], '.0f'):>11} "
+              f"{fmt(r['requestsPerS'], '.0f'):>9} {fmt(r['cpuS'], '.2f'):>8} {fmt(r['cpuUsPerRequest'], '.0f'):>11} "
+              f"{fmt(r['peakRssMb'], '.1f'):>12}{'' if r['exitCode'] == 0 else '  FAILED'}")
+
+
+def main() -> None:
+    """Main entry point"""
+    argv = sys.argv[1:]
+    extra_args: List[str] = []
+    if "--" in argv:
+        extra_args = argv[argv.index("--") + 1:]
+        argv = argv[:argv.index("--")]
+
+    parser = argparse.ArgumentParser(description="Benchmark the HTTPTests runner against a local echo server")
+    parser.add_argument("--scenarios", default=",".join(DEFAULT_SCENARIOS),
+                        help=f"Comma-separated scenarios out of {', '.join(SCENARIOS)} "
+                             f"(default: {','.join(DEFAULT_SCENARIOS)})")
+    parser.add_argument("--runs", type=int, default=1, help="Runs per scenario; the median is reported (default: 1)")
+    parser.add_argument("--concurrency", type=int, default=8, help="--concurrency of main.py (default: 8)")
+    parser.add_argument("--json", help="Also write the results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    runner_args = ["--concurrency", str(args.concurrency), *extra_args]
+    native = "--runner" not in extra_args or "native" in extra_args
+    if native and not {"--quiet", "--fail-only"} & set(extra_args):
+        runner_args.append("--quiet")
+
+    server = EchoServer()
+    server.start_in_thread()
+    print(f"Echo server on 127.0.0.1:{server.port}; main.py {' '.join(runner_args)}")
+
+    results: Dict[str, Dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory(prefix="httptests-bench-") as tmp:
+        for name in names:
+            test_file = os.path.join(tmp, f"{name}.json")
+            with open(test_file, "w", encoding="utf-8") as f:
+                json.dump(SCENARIOS[name](), f)
+            runs = []
+            for i in range(args.runs):
+                print(f"  {name} run {i + 1}/{args.runs}...", flush=True)
+                runs.append(run_once(server, test_file, runner_args))
+                if runs[-1]["exitCode"] != 0:
+                    print(f"  ⚠️  main.py exited with {runs[-1]['exitCode']}:\n{runs[-1]['stderr']}")
+            results[name] = summarize(runs)
+    server.stop()
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"runnerArgs": runner_args, "results": results}, f, indent=2)
+        print(f"\nWrote results to: {args.json}")
+    sys.exit(0 if all(r["exitCode"] == 0 for r in results.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""Local stand-in for the mendhak/http-https-echo upstream.
+
+Answers every request with a JSON description of what it received, in the
+shape the echo image uses (``path``, ``headers`` with lowercased names,
+``method``, ``body``, ...) plus ``bodySha256``, so main.py's checks work
+against it without Docker or network. Like the image, the
+``x-set-response-status-code`` and ``x-set-response-delay-ms`` request
+headers choose the status and delay.
+
+One process listens on any number of HTTP and HTTPS ports, so it also
+replaces the socat forwarders of ``additional_ports`` (see ``mock.builtin``
+in generate_docker_compose.py). HTTPS uses the self-signed test certificate
+echo_server.pem unless ``--tls-cert`` is given; never use it for anything
+but a test upstream.
+
+Usage:
+    python echo_server.py --port 8080
+    python echo_server.py --host 0.0.0.0 --port 80 --port 8080 --https-port 443
+"""
+import argparse
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import signal
+import ssl
+import threading
+from http import HTTPStatus
+from time import perf_counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+# Largest request head (request line and headers) accepted
+MAX_HEAD_BYTES = 1024 * 1024
+
+# Self-signed certificate and key for HTTPS ports (CN=httptests-mock)
+DEFAULT_CERT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "echo_server.pem")
+
+
+class EchoStats:
+    """Requests served, for benchmarks"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.requests = 0
+            self.first_request: Optional[float] = None  # perf_counter() of the first and last request
+            self.last_request: Optional[float] = None
+
+    def count(self) -> None:
+        now = perf_counter()
+        with self.lock:
+            self.requests += 1
+            if self.first_request is None:
+                self.first_request = now
+            self.last_request = now
+
+
+async def read_body(reader: asyncio.StreamReader, headers: Dict[str, str]) -> bytes:
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        parts = []
+        while True:
+            size = int((await reader.readline()).split(b";", 1)[0].strip() or b"0", 16)
+            if size == 0:
+                # Trailers end with an empty line
+                while (await reader.readline()).strip():
+                    pass
+                return b"".join(parts)
+            parts.append(await reader.readexactly(size))
+            await reader.readline()
+    length = int(headers.get("content-length") or 0)
+    return await reader.readexactly(length) if length else b""
+
+
+def parse_head(head: bytes) -> Tuple[str, str, str, List[Tuple[str, str]]]:
+    """Method, target, version and headers (in order) of a request head"""
+    lines = head.decode("latin-1").split("\r\n")
+    method, target, version = lines[0].split(" ", 2)
+    headers = []
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers.append((name.strip(), value.strip()))
+    return method, target, version, headers
+
+
+def echo(method: str, target: str, headers: Dict[str, str], body: bytes, peer: str,
+         protocol: str = "http") -> Dict[str, object]:
+    path, _, query = target.partition("?")
+    return {
+        "path": path,
+        "headers": headers,
+        "method": method,
+        "body": body.decode("utf-8", "replace"),
+        "bodySha256": hashlib.sha256(body).hexdigest(),
+        "hostname": headers.get("host", "").rsplit(":", 1)[0],
+        "ip": peer,
+        "protocol": protocol,
+        "query": dict(parse_qsl(query)),
+    }
+
+
+class EchoServer:
+    """asyncio echo server on one or more ports.
+
+    Run it with ``serve_forever`` or in a thread with ``start_in_thread``.
+    Port 0 binds a free port; ``ports`` and ``https_ports`` hold the bound
+    ports once started.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, ports: Iterable[int] = (),
+                 https_ports: Iterable[int] = (), certfile: Optional[str] = None, keyfile: Optional[str] = None):
+        self.host = host
+        self.ports = [port, *ports]
+        self.https_ports = list(https_ports)
+        self.certfile = certfile or DEFAULT_CERT
+        self.keyfile = keyfile
+        self.stats = EchoStats()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._servers: List[asyncio.base_events.Server] = []
+
+    @property
+    def port(self) -> int:
+        """First HTTP port"""
+        return self.ports[0]
+
+    def ssl_context(self) -> ssl.SSLContext:
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(self.certfile, self.keyfile)
+        return context
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                     protocol: str = "http") -> None:
+        peer = (writer.get_extra_info("peername") or ("",))[0]
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    return
+                method, target, version, header_list = parse_head(head)
+                headers = {name.lower(): value for name, value in header_list}
+                body = await read_body(reader, headers)
+                self.stats.count()
+
+                status = int(headers.get("x-set-response-status-code") or 200)
+                delay = float(headers.get("x-set-response-delay-ms") or 0)
+                if delay:
+                    await asyncio.sleep(delay / 1000)
+                out = b"" if status in (204, 304) else json.dumps(echo(method, target, headers, body, peer,
+                                                                       protocol)).encode()
+                # HEAD gets the headers of the GET response, without its body
+                length = len(out)
+                if method == "HEAD":
+                    out = b""
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                try:
+                    reason = HTTPStatus(status).phrase
+                except ValueError:
+                    reason = "Unknown"
+                response = [f"HTTP/1.1 {status} {reason}", "Content-Type: application/json; charset=utf-8",
+                            f"Content-Length: {length}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                writer.write(("\r\n".join(response) + "\r\n\r\n").encode("latin-1") + out)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, ssl.SSLError):
+            return
+        finally:
+            writer.close()
+
+    async def _listen(self, port: int, tls: Optional[ssl.SSLContext]) -> int:
+        handler = functools.partial(self.handle, protocol="https" if tls else "http")
+        server = await asyncio.start_server(handler, self.host, port, ssl=tls, limit=MAX_HEAD_BYTES, backlog=1024)
+        self._servers.append(server)
+        return server.sockets[0].getsockname()[1]
+
+    async def start(self) -> int:
+        """Start listening on every port; returns the first HTTP port"""
+        self._loop = asyncio.get_running_loop()
+        self.ports = [await self._listen(port, None) for port in self.ports]
+        if self.https_ports:
+            tls = self.ssl_context()
+            self.https_ports = [await self._listen(port, tls) for port in self.https_ports]
+        return self.port
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        urls = [f"http://{self.host}:{port}" for port in self.ports]
+        urls += [f"https://{self.host}:{port}" for port in self.https_ports]
+        print(f"Echo server listening on {', '.join(urls)}", flush=True)
+        await asyncio.gather(*(server.serve_forever() for server in self._servers))
+
+    def start_in_thread(self) -> int:
+        """Serve from a daemon thread with its own event loop; returns the bound port"""
+        started = threading.Event()
+
+        def run() -> None:
+            loop = asyncio.new_event_loop()
+            loop.run_until_complete(self.start())
+            started.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, name="echo-server", daemon=True).start()
+        started.wait()
+        return self.port
+
+    def stop(self) -> None:
+        if self._loop is not None:
+            for server in self._servers:
+                self._loop.call_soon_threadsafe(server.close)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+def main() -> None:
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Echo HTTP requests back as JSON")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, action="append",
+                        help="HTTP port to listen on (repeatable; default: 8080)")
+    parser.add_argument("--https-port", type=int, action="append", default=[],
+                        help="HTTPS port to listen on (repeatable)")
+    parser.add_argument("--tls-cert", help="PEM certificate (and key) for HTTPS ports (default: echo_server.pem)")
+    parser.add_argument("--tls-key", help="PEM key, if not part of --tls-cert")
+    args = parser.parse_args()
+    ports = args.port or [8080]
+    server = EchoServer(args.host, ports[0], ports=ports[1:], https_ports=args.https_port,
+                        certfile=args.tls_cert, keyfile=args.tls_key)
+    # As PID 1 of a container SIGTERM would otherwise be ignored until docker kills the process
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
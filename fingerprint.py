@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""Content fingerprint of a test suite and a cache of passing results.
+
+The fingerprint covers everything that can change the outcome of a run:
+the Dockerfile and its build context (including nginx .conf files after
+add_upstream_headers.py has rewritten them), config.yml, test.json, the
+action's own scripts and the arguments main.py runs with. Runner arguments
+are normalized: options that only decide where output goes are left out,
+and files given to ``--baseline-compare`` and ``--timings`` count with
+their content, so a new baseline runs the suite again.
+
+Usage:
+    python fingerprint.py --suite DIR/.httptests                        # print fingerprint
+    python fingerprint.py --suite DIR/.httptests --json                 # print fingerprint parts
+    python fingerprint.py --suite DIR/.httptests --image-key            # print nginx image fingerprint
+    python fingerprint.py --suite DIR/.httptests --cache-dir C --check  # exit 0 if a pass is cached
+    python fingerprint.py --suite DIR/.httptests --cache-dir C --record # store a passing result
+    python fingerprint.py --suite DIR/.httptests --cache-dir C --record --fingerprint HASH
+    python fingerprint.py --suite DIR/.httptests --cache-dir C --check -- --concurrency 4 --min-repeat 5
+    python fingerprint.py --suite DIR/.httptests --cache-dir C --check --write-reports -- --report-json r.json
+
+With ``--write-reports`` a cache hit writes reports of the skipped run to
+the ``--report-json`` and ``--junit-xml`` paths of the runner arguments,
+so steps that publish them find a file.
+"""
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import sys
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+# Scripts of this action that influence test results
+ACTION_FILES = ["main.py", "paths.py", "scheduler.py", "report.py", "pool.py", "readiness.py", "testfile.py",
+                "payload.py", "baseline.py", "nginxlogs.py", "h2client.py", "generate_docker_compose.py",
+                "add_upstream_headers.py", "echo_server.py", "echo_server.pem"]
+
+# main.py options that do not change the outcome of a run, and whether they take a value
+OUTPUT_OPTIONS = {"--report-json": True, "--junit-xml": True, "--events": True, "--baseline-record": True,
+                  "--plan-cache": True, "--quiet": False, "--fail-only": False}
+
+# main.py options whose value is a file that changes the outcome of a run
+FILE_OPTIONS = ["--baseline-compare", "--timings"]
+
+# Always left out of the build context hash
+DEFAULT_EXCLUDES = [".git", ".httptests/docker-compose.yml"]
+
+
+def hash_file(path: str, digest: "hashlib._Hash") -> None:
+    """Feed a file's content into digest"""
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+
+
+def load_dockerignore(context_dir: str) -> List[str]:
+    """Patterns from .dockerignore (negations with '!' are not supported)"""
+    path = os.path.join(context_dir, ".dockerignore")
+    if not os.path.isfile(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return [line.rstrip("/") for line in lines if line and not line.startswith(("#", "!"))]
+
+
+def is_excluded(rel_path: str, patterns: Iterable[str]) -> bool:
+    """Whether a context-relative path or one of its parent directories matches a pattern"""
+    parts = rel_path.split("/")
+    for pattern in patterns:
+        pattern = pattern[2:] if pattern.startswith("./") else pattern
+        for depth in range(1, len(parts) + 1):
+            if fnmatch.fnmatch("/".join(parts[:depth]), pattern):
+                return True
+    return False
+
+
+def context_files(context_dir: str, extra_excludes: Iterable[str] = ()) -> List[str]:
+    """Context-relative paths of all files docker would send for a build, sorted"""
+    patterns = DEFAULT_EXCLUDES + load_dockerignore(context_dir) + list(extra_excludes)
+    files = []
+    for root, dirs, names in os.walk(context_dir):
+        rel_root = os.path.relpath(root, context_dir).replace(os.sep, "/")
+        rel_root = "" if rel_root == "." else rel_root + "/"
+        dirs[:] = sorted(d for d in dirs if not is_excluded(rel_root + d, patterns))
+        files.extend(rel_root + name for name in names if not is_excluded(rel_root + name, patterns))
+    return sorted(files)
+
+
+def hash_paths(base_dir: str, rel_paths: Iterable[str]) -> str:
+    """Hash of file names and contents, independent of walk order"""
+    digest = hashlib.sha256()
+    for rel_path in rel_paths:
+        digest.update(rel_path.encode("utf-8") + b"\0")
+        hash_file(os.path.join(base_dir, rel_path), digest)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def runner_hash(runner_args: Iterable[str]) -> str:
+    """Hash of the main.py arguments that can change the outcome of a run"""
+    normalized: List[str] = []
+    args = iter(runner_args)
+    for arg in args:
+        option, has_value, value = arg.partition("=")
+        if option in OUTPUT_OPTIONS:
+            if OUTPUT_OPTIONS[option] and not has_value:
+                next(args, None)
+            continue
+        if option in FILE_OPTIONS:
+            path = value if has_value else next(args, "")
+            content = ""
+            if os.path.isfile(path):
+                digest = hashlib.sha256()
+                hash_file(path, digest)
+                content = digest.hexdigest()
+            normalized += [option, content]
+            continue
+        normalized.append(arg)
+    return hashlib.sha256(json.dumps(normalized).encode("utf-8")).hexdigest()
+
+
+def suite_fingerprint_parts(suite_dir: str, extra_excludes: Iterable[str] = (), variant: str = "",
+                            runner_args: Iterable[str] = ()) -> Dict[str, str]:
+    """Hashes of each input of a suite run"""
+    suite_dir = os.path.abspath(suite_dir)
+    context_dir = os.path.dirname(suite_dir)
+    files = context_files(context_dir, extra_excludes)
+    suite_name = os.path.basename(suite_dir)
+    action_dir = os.path.dirname(os.path.abspath(__file__))
+
+    def existing(base_dir: str, rel_paths: Iterable[str]) -> List[str]:
+        return [p for p in rel_paths if os.path.isfile(os.path.join(base_dir, p))]
+
+    return {
+        "dockerfile": hash_paths(context_dir, existing(context_dir, ["Dockerfile"])),
+        "context": hash_paths(context_dir, files),
+        "nginx": hash_paths(context_dir, [p for p in files if p.endswith(".conf")]),
+        "config": hash_paths(suite_dir, existing(suite_dir, ["config.yml"])),
+        "tests": hash_paths(suite_dir, existing(suite_dir, ["test.json", "test.jsonl"])),
+        "action": hash_paths(action_dir, existing(action_dir, ACTION_FILES)),
+        "suite": suite_name,
+        "variant": variant,
+        "runner": runner_hash(runner_args),
+    }
+
+
+def suite_fingerprint(suite_dir: str, extra_excludes: Iterable[str] = (), variant: str = "",
+                      runner_args: Iterable[str] = ()) -> str:
+    """Single fingerprint combining all inputs of a suite run"""
+    parts = suite_fingerprint_parts(suite_dir, extra_excludes, variant, runner_args)
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def image_fingerprint(suite_dir: str, extra_excludes: Iterable[str] = ()) -> str:
+    """Fingerprint of what goes into the nginx image: Dockerfile and build context.
+
+    The suite directory itself is left out, so editing test.json or
+    config.yml does not force a rebuild.
+    """
+    suite_dir = os.path.abspath(suite_dir)
+    excludes = list(extra_excludes) + [os.path.basename(suite_dir)]
+    context_dir = os.path.dirname(suite_dir)
+    return hash_paths(context_dir, context_files(context_dir, excludes))
+
+
+def marker_path(cache_dir: str, fingerprint: str) -> str:
+    return os.path.join(cache_dir, f"{fingerprint}.passed.json")
+
+
+def cached_result(cache_dir: str, fingerprint: str) -> Optional[Dict[str, str]]:
+    """Stored passing result for a fingerprint, or None"""
+    path = marker_path(cache_dir, fingerprint)
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def record_result(cache_dir: str, fingerprint: str, suite_dir: str) -> str:
+    """Store a passing result for a fingerprint"""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = marker_path(cache_dir, fingerprint)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "fingerprint": fingerprint,
+            "suite": os.path.abspath(suite_dir),
+            "passedAt": datetime.now(timezone.utc).isoformat(),
+        }, f, indent=2)
+    return path
+
+
+def option_value(args: List[str], option: str) -> Optional[str]:
+    """Value of the last ``option`` in main.py arguments (``--opt value`` or ``--opt=value``)"""
+    value = None
+    for i, arg in enumerate(args):
+        if arg == option and i + 1 < len(args):
+            value = args[i + 1]
+        elif arg.startswith(option + "="):
+            value = arg[len(option) + 1:]
+    return value
+
+
+def write_cached_reports(result: Dict[str, str], runner_args: List[str]) -> List[str]:
+    """Write JSON/JUnit reports of a run skipped for a cached pass; returns the paths written"""
+    test_file = option_value(runner_args, "--test-file")
+    message = f"Unchanged since the passing run of {result.get('passedAt', 'an earlier run')}"
+    written = []
+    report_json = option_value(runner_args, "--report-json")
+    if report_json:
+        with open(report_json, "w", encoding="utf-8") as f:
+            json.dump({"testFile": test_file, "totalAssertions": 0, "summary": {"hosts": {}, "endpoints": {}},
+                       "cases": [], "cached": result}, f, indent=2)
+        written.append(report_json)
+    junit_xml = option_value(runner_args, "--junit-xml")
+    if junit_xml:
+        suite = ET.Element("testsuite", {"name": test_file or "httptests", "tests": "1", "failures": "0",
+                                         "errors": "0", "skipped": "1"})
+        testcase = ET.SubElement(suite, "testcase", {"classname": "httptests", "name": "cached", "time": "0"})
+        ET.SubElement(testcase, "skipped", {"message": message})
+        ET.ElementTree(suite).write(junit_xml, encoding="utf-8", xml_declaration=True)
+        written.append(junit_xml)
+    return written
+
+
+def main() -> None:
+    """Main entry point"""
+    argv = sys.argv[1:]
+    runner_args: List[str] = []
+    if "--" in argv:
+        runner_args = argv[argv.index("--") + 1:]
+        argv = argv[:argv.index("--")]
+
+    parser = argparse.ArgumentParser(description="Fingerprint a HTTPTests suite and cache passing results",
+                                     epilog="Arguments after -- are the main.py arguments of the run")
+    parser.add_argument("--suite", required=True, help="Path to .httptests directory")
+    parser.add_argument("--cache-dir", help="Directory holding cached passing results")
+    parser.add_argument("--exclude", action="append", default=[],
+                        help="Extra glob of context paths to leave out of the fingerprint (repeatable)")
+    parser.add_argument("--fingerprint", help="With --record, store this fingerprint instead of recomputing it")
+    parser.add_argument("--variant", default="",
+                        help="Extra value mixed into the fingerprint, e.g. the shard being run")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--json", action="store_true", help="Print the hash of each input")
+    mode.add_argument("--image-key", action="store_true",
+                      help="Print the fingerprint of the nginx image build (Dockerfile and context only)")
+    mode.add_argument("--check", action="store_true", help="Exit 0 if a passing result is cached, 1 otherwise")
+    mode.add_argument("--record", action="store_true", help="Store a passing result for the current fingerprint")
+    parser.add_argument("--write-reports", action="store_true",
+                        help="With --check, write reports of the skipped run to the runner's report paths on a hit")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.suite):
+        print(f"Suite directory not found: {args.suite}", file=sys.stderr)
+        sys.exit(1)
+    if (args.check or args.record) and not args.cache_dir:
+        parser.error("--check and --record require --cache-dir")
+    if args.write_reports and not args.check:
+        parser.error("--write-reports requires --check")
+
+    excludes = list(args.exclude)
+    if args.cache_dir:
+        # Never fingerprint the cache itself when it lives inside the build context
+        context_dir = os.path.dirname(os.path.abspath(args.suite))
+        cache_rel = os.path.relpath(os.path.abspath(args.cache_dir), context_dir).replace(os.sep, "/")
+        if not cache_rel.startswith(".."):
+            excludes.append(cache_rel)
+
+    if args.json:
+        print(json.dumps(suite_fingerprint_parts(args.suite, excludes, args.variant, runner_args), indent=2))
+        return
+    if args.image_key:
+        print(image_fingerprint(args.suite, excludes))
+        return
+
+    # Files written during the run (e.g. reports) must not change what gets recorded
+    fingerprint = (args.fingerprint if args.record and args.fingerprint
+                   else suite_fingerprint(args.suite, excludes, args.variant, runner_args))
+    if args.check:
+        result = cached_result(args.cache_dir, fingerprint)
+        if result and args.write_reports:
+            write_cached_reports(result, runner_args)
+        print(fingerprint)
+        sys.exit(0 if result else 1)
+    if args.record:
+        record_result(args.cache_dir, fingerprint, args.suite)
+    print(fingerprint)
+
+
+if __name__ == "__main__":
+    main()
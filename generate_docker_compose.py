@@ -3,7 +3,12 @@
 import argparse
 import os
 import sys
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
+
+ACTION_DIR = os.path.dirname(os.path.abspath(__file__))
+MOCK_IMAGE = "mendhak/http-https-echo:18"
+# Runs echo_server.py (mounted from the action) for mock.builtin
+BUILTIN_MOCK_IMAGE = "python:3.12-alpine"
 
 try:
     import yaml  # type: ignore
@@ -29,88 +34,141 @@ def to_list(value: Any) -> List[Any]:
     return [value]
 
 
-def generate_compose(suite_dir: str, config: Dict[str, Any]) -> Dict[str, Any]:
-    """Generate docker-compose structure from config"""
-    parent_dir = os.path.abspath(os.path.join(suite_dir, os.pardir))
-
-    # Config mappings
+def mock_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Mock settings of a suite's config.yml that decide how the mock is started"""
     mock_cfg = config.get("mock", {}) or {}
-    nginx_cfg = config.get("nginx", {}) or {}
+    return {
+        "builtin": bool(mock_cfg.get("builtin")),
+        "image": mock_cfg.get("image"),
+        # Support both 'port' (legacy) and 'http_port' (new)
+        "http_port": mock_cfg.get("http_port") or mock_cfg.get("port", 80),
+        "https_port": mock_cfg.get("https_port", 443),
+        "additional_ports": to_list(mock_cfg.get("additional_ports") or []),
+    }
 
-    network_aliases = to_list(mock_cfg.get("network_aliases") or [])
-    
-    # Support both 'port' (legacy) and 'http_port' (new)
-    http_port = mock_cfg.get("http_port") or mock_cfg.get("port", 80)
-    https_port = mock_cfg.get("https_port", 443)
-    additional_ports = to_list(mock_cfg.get("additional_ports") or [])
-    
+
+def mock_services(settings: Dict[str, Any], network_aliases: List[Any], prefix: str = "httptests",
+                  service: str = "mock", network: str = "default") -> Dict[str, Dict[str, Any]]:
+    """Mock service plus the port forwarders its settings need, keyed by service name
+
+    Containers are named ``<prefix>_mock`` and ``<prefix>_forwarder_<port>``.
+    """
+    http_port = settings["http_port"]
+    https_port = settings["https_port"]
+    additional_ports = settings["additional_ports"]
+
+    if settings["builtin"]:
+        # One Python process serves every port, no forwarders needed
+        command = ["python", "/httptests/echo_server.py", "--host", "0.0.0.0", "--port", str(http_port)]
+        for port in additional_ports:
+            command += ["--port", str(port)]
+        command += ["--https-port", str(https_port)]
+        mock: Dict[str, Any] = {
+            "container_name": f"{prefix}_mock",
+            "image": settings["image"] or BUILTIN_MOCK_IMAGE,
+            "command": command,
+            "volumes": [
+                f"{os.path.join(ACTION_DIR, 'echo_server.py')}:/httptests/echo_server.py:ro",
+                f"{os.path.join(ACTION_DIR, 'echo_server.pem')}:/httptests/echo_server.pem:ro",
+            ],
+        }
+        additional_ports = []
+    else:
+        mock = {
+            "container_name": f"{prefix}_mock",
+            "image": MOCK_IMAGE,
+            "environment": [
+                f"HTTP_PORT={http_port}",
+                f"HTTPS_PORT={https_port}",
+            ],
+        }
+    mock["networks"] = {
+        network: {
+            "aliases": network_aliases or [],
+        }
+    }
+    services = {service: mock}
+
+    # Add port forwarders for additional ports
+    # This allows the mock service to be accessible on multiple ports using the same network aliases
+    for port in additional_ports:
+        services[f"{service}-forwarder-{port}"] = {
+            "container_name": f"{prefix}_forwarder_{port}",
+            "image": "alpine/socat:latest",
+            "command": f"TCP-LISTEN:{port},fork,reuseaddr TCP:{service}:{http_port}",
+            "networks": {
+                network: {
+                    "aliases": network_aliases or [],  # Share the same network aliases as mock
+                }
+            },
+            "depends_on": [service],
+        }
+    return services
+
+
+def nginx_service(suite_dir: str, config: Dict[str, Any], image: Optional[str] = None, prefix: str = "httptests",
+                  host_port: int = 80, network: str = "default",
+                  depends_on: Optional[List[str]] = None) -> Dict[str, Any]:
+    """nginx service built from the Dockerfile next to the suite, published on host_port
+
+    ``nginx.ports`` of config.yml publishes further listeners, e.g. 443 for
+    h2 over TLS or a cleartext h2c port: a port number is published on the
+    same host port, a ``"host:container"`` string as given.
+    """
+    parent_dir = os.path.abspath(os.path.join(suite_dir, os.pardir))
+    nginx_cfg = config.get("nginx", {}) or {}
     nginx_env = nginx_cfg.get("environment") or {}
+    extra_ports = [port if isinstance(port, str) else f"{port}:{port}" for port in to_list(nginx_cfg.get("ports"))]
 
     # Validate Dockerfile
     dockerfile_path = os.path.join(parent_dir, "Dockerfile")
     if not os.path.isfile(dockerfile_path):
         raise FileNotFoundError(f"Dockerfile not found at expected location: {dockerfile_path}")
 
-    # Build environment list for mock service
-    mock_environment = [
-        f"HTTP_PORT={http_port}",
-        f"HTTPS_PORT={https_port}",
-    ]
-
-    compose: Dict[str, Any] = {
-        "version": "3.9",
-        "services": {
-            "mock": {
-                "container_name": "httptests_mock",
-                "image": "mendhak/http-https-echo:18",
-                "environment": mock_environment,
-                "networks": {
-                    "default": {
-                        "aliases": network_aliases or [],
-                    }
-                },
-            },
-            "nginx": {
-                "container_name": "httptests_nginx",
-                "build": {
-                    "context": parent_dir,
-                    "dockerfile": "Dockerfile",
-                },
-                "ports": ["80:80"],
-                "networks": ["default"],
-                "depends_on": ["mock"],
-            },
+    nginx: Dict[str, Any] = {
+        "container_name": f"{prefix}_nginx",
+        "build": {
+            "context": parent_dir,
+            "dockerfile": "Dockerfile",
         },
+        "ports": [f"{host_port}:80", *extra_ports],
+        "networks": [network],
+        "depends_on": list(depends_on or []),
     }
 
+    if image:
+        nginx["image"] = image
+
     # Map nginx environment variables
     if nginx_env:
         # Accept dict or list in YAML
         if isinstance(nginx_env, dict):
-            compose["services"]["nginx"]["environment"] = nginx_env
+            nginx["environment"] = nginx_env
         else:
-            compose["services"]["nginx"]["environment"] = to_list(nginx_env)
+            nginx["environment"] = to_list(nginx_env)
+    return nginx
 
-    # Add port forwarders for additional ports
-    # This allows the mock service to be accessible on multiple ports using the same network aliases
-    if additional_ports:
-        for port in additional_ports:
-            service_name = f"mock-forwarder-{port}"
-            compose["services"][service_name] = {
-                "container_name": f"httptests_forwarder_{port}",
-                "image": "alpine/socat:latest",
-                "command": f"TCP-LISTEN:{port},fork,reuseaddr TCP:mock:{http_port}",
-                "networks": {
-                    "default": {
-                        "aliases": network_aliases or [],  # Share the same network aliases as mock
-                    }
-                },
-                "depends_on": ["mock"],
-            }
-            # Update nginx dependencies to include port forwarders
-            compose["services"]["nginx"]["depends_on"].append(service_name)
-
-    return compose
+
+def generate_compose(suite_dir: str, config: Dict[str, Any], image: Optional[str] = None,
+                     prefix: str = "httptests") -> Dict[str, Any]:
+    """Generate docker-compose structure from config
+
+    When image is given, the built nginx image is tagged with it so later runs
+    with the same suite fingerprint can reuse it without rebuilding. Container
+    names start with prefix, as main.py's --container-prefix expects.
+    """
+    mock_cfg = config.get("mock", {}) or {}
+    network_aliases = to_list(mock_cfg.get("network_aliases") or [])
+    mocks = mock_services(mock_settings(config), network_aliases, prefix=prefix)
+    nginx = nginx_service(suite_dir, config, image=image, prefix=prefix, depends_on=list(mocks))
+
+    # Keep the legacy service order: mock, nginx, forwarders
+    services = {"mock": mocks.pop("mock"), "nginx": nginx}
+    services.update(mocks)
+    return {
+        "version": "3.9",
+        "services": services,
+    }
 
 
 def main() -> None:
@@ -118,6 +176,9 @@ def main() -> None:
     parser = argparse.ArgumentParser(description="Generate docker-compose.yml for HTTPTests suite")
     parser.add_argument("--suite", required=True, help="Path to .httptests directory")
     parser.add_argument("--output", required=True, help="Output path for docker-compose.yml")
+    parser.add_argument("--image", help="Tag for the built nginx image (e.g. httptests-nginx:<fingerprint>)")
+    parser.add_argument("--container-prefix", default="httptests",
+                        help="Prefix of the container names, <prefix>_nginx and <prefix>_mock (default: httptests)")
     args = parser.parse_args()
 
     suite_dir = os.path.abspath(args.suite)
@@ -128,7 +189,7 @@ def main() -> None:
     config_path = os.path.join(suite_dir, "config.yml")
     config = load_config(config_path)
 
-    compose = generate_compose(suite_dir, config)
+    compose = generate_compose(suite_dir, config, image=args.image, prefix=args.container_prefix)
 
     # Write output YAML
     os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""HTTP/2 client that multiplexes requests as streams on one connection.
+
+Built on the ``h2`` protocol library (``pip install h2``), which is optional:
+``AVAILABLE`` is False without it and only hosts that select ``h2`` or
+``h2c`` in ``hostOptions`` need it. It is imported with the first
+connection, so runs without HTTP/2 hosts do not pay for it.
+
+``h2`` is HTTP/2 over TLS negotiated with ALPN, ``h2c`` is cleartext HTTP/2
+with prior knowledge (no ``Upgrade:`` round trip), as nginx serves it with
+``listen ... http2`` on a plain port.
+
+Requests of any number of threads share the connection; a reader thread
+dispatches frames to their streams. No more streams are opened at a time
+than the server's ``SETTINGS_MAX_CONCURRENT_STREAMS`` (and an optional
+client-side limit) allow; further requests wait for a stream to close.
+Request bodies are sent within the flow control windows of the stream and
+the connection. Response bodies are buffered per stream.
+"""
+import importlib.util
+import socket
+import ssl
+import threading
+from collections.abc import Iterator
+from time import perf_counter
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Connection-specific headers, not allowed in HTTP/2 (RFC 9113 8.2.2)
+CONNECTION_HEADERS = frozenset(("connection", "keep-alive", "proxy-connection", "transfer-encoding", "upgrade",
+                                "host", "te"))
+
+# Methods that may be sent again after the server closed the connection before answering (RFC 9110 9.2.2)
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "TRACE", "PUT", "DELETE"))
+
+READ_SIZE = 65536
+
+
+def _import_h2() -> None:
+    global h2
+    import h2.config
+    import h2.connection
+    import h2.events
+    import h2.exceptions
+
+
+class H2Error(Exception):
+    """Failure of an HTTP/2 connection or stream; ``retry`` when the request may be sent again"""
+
+    def __init__(self, message: str, retry: bool = False):
+        super().__init__(message)
+        self.retry = retry
+
+
+class StreamResult:
+    """Response of one stream, with its timings in seconds"""
+
+    __slots__ = ("stream_id", "status", "headers", "body", "ttfb", "total", "new_connection", "dns", "connect")
+
+    def __init__(self, stream_id: int):
+        self.stream_id = stream_id
+        self.status = 0
+        self.headers: List[Tuple[str, str]] = []
+        self.body = b""
+        self.ttfb = 0.0
+        self.total = 0.0
+        self.new_connection = False
+        self.dns: Optional[float] = None
+        self.connect: Optional[float] = None
+
+
+class _Stream:
+    __slots__ = ("result", "started", "replayable", "idempotent", "data", "done", "error")
+
+    def __init__(self, stream_id: int, started: float, replayable: bool, idempotent: bool):
+        self.result = StreamResult(stream_id)
+        self.started = started
+        self.replayable = replayable  # the body can be sent again
+        self.idempotent = idempotent
+        self.data: List[bytes] = []
+        self.done = threading.Event()
+        self.error: Optional[H2Error] = None
+
+
+class H2Connection:
+    """One HTTP/2 connection to ``host:port``; connects on the first request and after the server closed it"""
+
+    def __init__(self, host: str, port: int, tls: bool = False, max_streams: Optional[int] = None,
+                 timeout: float = 10.0):
+        if not AVAILABLE:
+            raise H2Error("HTTP/2 needs the h2 package (pip install h2)")
+        _import_h2()
+        self.host = host
+        self.port = port
+        self.tls = tls
+        self.max_streams = max_streams
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        # Held while connecting, so that concurrent requests do not open a connection each
+        self.connecting = threading.Lock()
+        # Both wait on self.lock: a free stream slot, a larger flow control window
+        self.slots = threading.Condition(self.lock)
+        self.window = threading.Condition(self.lock)
+        self.sock: Optional[socket.socket] = None
+        self.conn: Optional["h2.connection.H2Connection"] = None
+        self.streams: Dict[int, _Stream] = {}
+        self.open = False
+        self.settings = False  # SETTINGS of the current connection received
+        # Stats over the lifetime of the object
+        self.connections = 0
+        self.requests = 0
+        self.peak_streams = 0
+        self.server_max_streams: Optional[int] = None
+
+    def limit(self) -> int:
+        """Streams that may be open at a time"""
+        limit = self.conn.remote_settings.max_concurrent_streams
+        return min(limit, self.max_streams) if self.max_streams else limit
+
+    def _connect(self) -> Optional[Tuple[float, float]]:
+        """Open the connection unless another request just did; returns DNS and connect seconds if it opened it"""
+        with self.connecting:
+            with self.lock:
+                if self.open:
+                    return None
+            # The TCP and TLS handshakes hold up neither the reader of the old connection nor close()
+            start = perf_counter()
+            sock, resolved = self._handshake()
+            connected = perf_counter()
+            with self.lock:
+                self.sock = sock
+                self.conn = h2.connection.H2Connection(
+                    h2.config.H2Configuration(client_side=True, header_encoding="utf-8"))
+                self.conn.initiate_connection()
+                self.settings = False
+                self.open = True
+                self.connections += 1
+                self._flush()
+                threading.Thread(target=self._read, args=(sock, self.conn), name="httptests-h2-reader",
+                                 daemon=True).start()
+            return resolved - start, connected - resolved
+
+    def _handshake(self) -> Tuple[socket.socket, float]:
+        """Connected socket, with h2 negotiated over TLS; returns it and when DNS resolution finished"""
+        family, kind, proto, _, address = socket.getaddrinfo(self.host, self.port, type=socket.SOCK_STREAM)[0]
+        resolved = perf_counter()
+        sock = socket.socket(family, kind, proto)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(address)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if self.tls:
+                context = ssl.create_default_context()
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+                context.set_alpn_protocols(["h2"])
+                sock = context.wrap_socket(sock, server_hostname=self.host)
+                if sock.selected_alpn_protocol() != "h2":
+                    raise H2Error(f"{self.host}:{self.port} did not negotiate h2 with ALPN "
+                                  f"({sock.selected_alpn_protocol() or 'no ALPN'})")
+        except BaseException:
+            sock.close()
+            raise
+        sock.settimeout(None)
+        return sock, resolved
+
+    def _flush(self) -> None:
+        # Called with self.lock held
+        data = self.conn.data_to_send()
+        if data:
+            self.sock.sendall(data)
+
+    def _read(self, sock: socket.socket, conn: "h2.connection.H2Connection") -> None:
+        error = "connection closed by server"
+        try:
+            while True:
+                data = sock.recv(READ_SIZE)
+                if not data:
+                    break
+                with self.lock:
+                    if self.conn is not conn:
+                        break
+                    try:
+                        events = conn.receive_data(data)
+                    except h2.exceptions.ProtocolError as e:
+                        if conn.state_machine.state != h2.connection.ConnectionState.CLOSED:
+                            raise
+                        # Frames after a GOAWAY in the same read; h2 drops the GOAWAY event with them
+                        self._goaway(f"connection closed by server (GOAWAY, then {e})", None)
+                        break
+                    terminated = next((event for event in events
+                                       if isinstance(event, h2.events.ConnectionTerminated)), None)
+                    for event in events:
+                        if event is terminated:
+                            break
+                        self._dispatch(event)
+                    if terminated is not None:
+                        self._goaway(f"connection closed by server (GOAWAY, error code {terminated.error_code})",
+                                     terminated.last_stream_id)
+                        break
+                    self._flush()
+        except (OSError, h2.exceptions.ProtocolError) as e:
+            error = f"connection failed: {e}"
+        with self.lock:
+            if self.conn is conn:
+                self.open = False
+                self._fail(error)
+                self.slots.notify_all()
+        sock.close()
+
+    def _dispatch(self, event: "h2.events.Event") -> None:
+        # Called with self.lock held
+        now = perf_counter()
+        if isinstance(event, h2.events.RemoteSettingsChanged):
+            self.settings = True
+            self.server_max_streams = self.conn.remote_settings.max_concurrent_streams
+            self.slots.notify_all()
+            self.window.notify_all()
+            return
+        if isinstance(event, h2.events.WindowUpdated):
+            self.window.notify_all()
+            return
+        stream = self.streams.get(getattr(event, "stream_id", None))
+        if stream is None:
+            return
+        if isinstance(event, h2.events.ResponseReceived):
+            stream.result.ttfb = now - stream.started
+            for name, value in event.headers:
+                if name == ":status":
+                    stream.result.status = int(value)
+                elif not name.startswith(":"):
+                    stream.result.headers.append((name, value))
+        elif isinstance(event, h2.events.DataReceived):
+            stream.data.append(event.data)
+            self.conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+        elif isinstance(event, h2.events.StreamEnded):
+            self._close(stream, now)
+        elif isinstance(event, h2.events.StreamReset):
+            stream.error = H2Error(f"stream {event.stream_id} reset by server (error code {event.error_code})")
+            self._close(stream, now)
+
+    def _close(self, stream: _Stream, now: float) -> None:
+        # Called with self.lock held
+        stream.result.total = now - stream.started
+        stream.result.body = b"".join(stream.data)
+        del self.streams[stream.result.stream_id]
+        stream.done.set()
+        self.slots.notify_all()
+        self.window.notify_all()
+
+    def _fail(self, error: str, retry=lambda stream: False) -> None:
+        # Called with self.lock held
+        now = perf_counter()
+        for stream in list(self.streams.values()):
+            stream.error = H2Error(error, retry=retry(stream))
+            self._close(stream, now)
+
+    def _goaway(self, error: str, last_stream_id: Optional[int]) -> None:
+        # Called with self.lock held. h2 rejects every frame after a GOAWAY, so the streams the server
+        # still answers are lost as well; those it never processed (above last_stream_id) and idempotent
+        # ones are sent again on a new connection, as nginx closes after keepalive_requests streams.
+        self.open = False
+        self._fail(error, lambda stream: stream.replayable and (
+            stream.idempotent or (last_stream_id is not None and stream.result.stream_id > last_stream_id)))
+
+    def request(self, method: str, path: str, authority: str, headers: Iterable[Tuple[str, str]],
+                body: Optional[Union[bytes, Iterable[bytes]]] = None, scheme: Optional[str] = None) -> StreamResult:
+        """Send a request on a new stream and wait for its response"""
+        if isinstance(body, (bytes, bytearray)):
+            body = [body]
+        request_headers = [(":method", method), (":scheme", scheme or ("https" if self.tls else "http")),
+                           (":authority", authority), (":path", path)]
+        request_headers += [(name.lower(), str(value)) for name, value in headers
+                            if name.lower() not in CONNECTION_HEADERS]
+        try:
+            return self._request(request_headers, body)
+        except H2Error as e:
+            if not e.retry:
+                raise
+        # The server closed the connection without answering; once more on a new one
+        return self._request(request_headers, body)
+
+    def _request(self, headers: List[Tuple[str, str]], body: Optional[Iterable[bytes]]) -> StreamResult:
+        deadline = perf_counter() + self.timeout
+        # An iterator is consumed by sending it; other iterables can be sent again
+        replayable = not isinstance(body, Iterator)
+        timings = self._connect() if not self.open else None
+        with self.lock:
+            # SETTINGS carry the server's stream limit; opening streams before them could exceed it
+            while self.open and (not self.settings or len(self.streams) >= self.limit()):
+                if not self.slots.wait(deadline - perf_counter()) and perf_counter() >= deadline:
+                    raise TimeoutError(f"no free stream on {self.host}:{self.port} within {self.timeout}s")
+            if not self.open:
+                raise H2Error(f"connection to {self.host}:{self.port} closed", retry=replayable)
+            stream_id = self.conn.get_next_available_stream_id()
+            stream = _Stream(stream_id, perf_counter(), replayable, headers[0][1] in IDEMPOTENT_METHODS)
+            self.streams[stream_id] = stream
+            self.requests += 1
+            self.peak_streams = max(self.peak_streams, len(self.streams))
+            self.conn.send_headers(stream_id, headers, end_stream=body is None)
+            self._flush()
+        if body is not None:
+            self._send_body(stream, body, deadline)
+        if not stream.done.wait(max(deadline - perf_counter(), 0)):
+            with self.lock:
+                if stream_id in self.streams:
+                    self.conn.reset_stream(stream_id)
+                    self._close(stream, perf_counter())
+                    self._flush()
+            raise TimeoutError(f"no response on stream {stream_id} within {self.timeout}s")
+        if stream.error is not None:
+            raise stream.error
+        result = stream.result
+        result.new_connection = timings is not None
+        result.dns, result.connect = timings or (None, None)
+        return result
+
+    def _send_body(self, stream: _Stream, body: Iterable[bytes], deadline: float) -> None:
+        stream_id = stream.result.stream_id
+        for chunk in body:
+            view = memoryview(chunk)
+            while view:
+                with self.lock:
+                    while not stream.done.is_set():
+                        size = min(self.conn.local_flow_control_window(stream_id), self.conn.max_outbound_frame_size)
+                        if size > 0:
+                            break
+                        if not self.window.wait(deadline - perf_counter()) and perf_counter() >= deadline:
+                            # The window stayed closed; the caller times the stream out
+                            return
+                    if stream.done.is_set():
+                        # Answered or reset before the whole body was sent
+                        return
+                    self.conn.send_data(stream_id, bytes(view[:size]))
+                    self._flush()
+                view = view[size:]
+        with self.lock:
+            if not stream.done.is_set():
+                self.conn.end_stream(stream_id)
+                self._flush()
+
+    def close(self) -> None:
+        with self.lock:
+            if self.open:
+                self.open = False
+                try:
+                    self.conn.close_connection()
+                    self._flush()
+                except OSError:
+                    pass
+                self.sock.shutdown(socket.SHUT_RDWR)
@@ -1,198 +1,1567 @@
-from time import sleep, time
+from time import perf_counter, sleep, time
 import requests
 import json
+import re
 import unittest
 import argparse
-from os import urandom
+import codecs
+import hashlib
+import itertools
+import pickle
 import sys
+import shutil
 import subprocess
+import threading
+import os
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlsplit
 
+import baseline
+import h2client
+import nginxlogs
+import readiness
+from paths import PathSet
+from payload import PayloadSpec
+from pool import ConnectionPool, H2Pool, Timing, request_size, response_size, timing_state
+from report import RunReport, latency_histogram, latency_stats, percentile
+from scheduler import CaseScheduler
+from testfile import JsonStream, TestFile, TestFileError
 
-class IntegrationTests(unittest.TestCase):
-    collectionHeaders = []
-    totalAssertions = 0
-    test_file_path = 'example/.httptests/test.json'
 
-    @classmethod
-    def setResult(cls, totalAssertions):
-        cls.totalAssertions += totalAssertions
+# Marker in expectedRequestHeadersToUpstream that stands for the collectionHeaders
+COLLECTION_HEADERS_MARKER = "$collectionheaders"
 
-    def setUp(self):
-        self.totalAssertions = 0
 
-    def tearDown(self):
-        self.setResult(self.totalAssertions)
+class HeaderExpectation:
+    """An expected header, pre-normalized: present, equal to a value, or removed ($deleted)."""
+
+    __slots__ = ('key', 'value', 'deleted')
+
+    def __init__(self, header):
+        self.key = header[0].lower()
+        self.value = header[1] if len(header) > 1 else None
+        self.deleted = self.value == "$deleted"
+
+    def __repr__(self):
+        return 'HeaderExpectation(%r, %r)' % (self.key, self.value)
+
+
+def is_collection_marker(header):
+    if isinstance(header, str):
+        return header.lower() == COLLECTION_HEADERS_MARKER
+    return bool(header) and header[0].lower() == COLLECTION_HEADERS_MARKER
+
+
+def compile_headers(headers, collectionHeaders=()):
+    """Turn a list of expected headers into HeaderExpectations.
+
+    A "$collectionheaders" entry (or ["$collectionheaders"]) is replaced by
+    the collection headers, appended once after the endpoint's own headers.
+    Upstream entries with more than two elements were never checked and are
+    dropped.
+    """
+    headers = headers or []
+    expectations = [HeaderExpectation(h) for h in headers if not is_collection_marker(h) and 0 < len(h) <= 2]
+    if any(is_collection_marker(h) for h in headers):
+        expectations += [HeaderExpectation(h) for h in collectionHeaders if 0 < len(h) <= 2]
+    return tuple(expectations)
+
+
+def compile_latency_budgets(expectedLatency):
+    """(key, label, percentile or None for max, budget) per expectedLatency entry.
+
+    Unknown keys get a None label and fail when checked.
+    """
+    budgets = []
+    for budgetKey, budget in (expectedLatency or {}).items():
+        match = re.fullmatch(r'p(\d+(?:\.\d+)?)Ms', budgetKey)
+        if budgetKey == 'maxMs':
+            budgets.append((budgetKey, 'max', None, budget))
+        elif match:
+            budgets.append((budgetKey, f"p{match.group(1)}", float(match.group(1)), budget))
+        else:
+            budgets.append((budgetKey, None, None, budget))
+    return tuple(budgets)
+
+
+# Bytes of a response body that are inspected (JSON parsing) at most, see --max-inspect-bytes
+MAX_INSPECT_BYTES = 8 * 1024 * 1024
+
+# Unneeded response bodies up to this size are read so the connection can be reused
+MAX_DRAIN_BYTES = 1024 * 1024
+
+BODY_CHUNK_SIZE = 64 * 1024
+
+
+class BodyLimitExceeded(Exception):
+    pass
+
+
+class BodyPlan:
+    """What the assertions of an endpoint need from response bodies."""
+
+    __slots__ = ('echo_keys', 'hash_body', 'read_all', 'max_inspect')
+
+    def __init__(self, echo_keys=None, hash_body=False, read_all=False, max_inspect=None):
+        self.echo_keys = echo_keys or {}  # top-level keys of the echo JSON, see JsonStream.pick
+        self.hash_body = hash_body
+        self.read_all = read_all
+        self.max_inspect = max_inspect
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+# Warmup requests and load mode only need the response to complete
+DRAIN_BODY = BodyPlan(read_all=True)
+
+
+class BodySummary:
+    """What was learned from a response body, in place of the body itself."""
+
+    __slots__ = ('size', 'complete', 'sha256', 'echo', 'echo_error', 'preview', 'empty', 'truncated')
+
+    def __init__(self):
+        self.size = 0
+        self.complete = False
+        self.sha256 = None
+        self.echo = None
+        self.echo_error = None
+        self.preview = ''
+        self.empty = False
+        self.truncated = False  # the echo JSON was not parsed because of the inspect limit
 
     @classmethod
-    def tearDownClass(cls):
-        print("\n" + "="*60)
-        print(f"Total assertions passed: {cls.totalAssertions}")
-        print("="*60)
+    def from_text(cls, text):
+        """Summary of an already downloaded body, as parsed by the legacy checks."""
+        summary = cls()
+        raw = (text or '').encode('utf-8')
+        summary.size = len(raw)
+        summary.sha256 = hashlib.sha256(raw).hexdigest()
+        summary.complete = True
+        summary.preview = (text or '')[:500]
+        summary.empty = not text or not text.strip()
+        if not summary.empty:
+            try:
+                summary.echo = json.loads(text)
+            except json.JSONDecodeError as e:
+                summary.echo_error = str(e)
+        return summary
 
-    def check(self):
-        # Opening JSON file
-        f = open(self.test_file_path)
 
-        data = json.load(f)
+class BodyReader:
+    """File-like view of a streamed response for JsonStream that counts and hashes what passes."""
+
+    def __init__(self, response, digest=None, limit=None):
+        self.raw = response.raw
+        self.digest = digest
+        self.limit = limit
+        self.size = 0
+        self.eof = False
+        self.preview = []
+        self.preview_len = 0
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    def read_bytes(self, size=BODY_CHUNK_SIZE):
+        chunk = b'' if self.eof else self.raw.read(size, decode_content=True)
+        if not chunk:
+            self.eof = True
+            return b''
+        self.size += len(chunk)
+        if self.digest is not None:
+            self.digest.update(chunk)
+        return chunk
+
+    def read(self, size=BODY_CHUNK_SIZE):
+        """Decoded text for the JSON scanner, up to the inspect limit."""
+        if self.limit is not None and self.size >= self.limit:
+            if self.read_bytes(1):
+                raise BodyLimitExceeded()
+            return ''
+        chunk = self.read_bytes(size if self.limit is None else min(size, self.limit - self.size))
+        text = self.decoder.decode(chunk, final=not chunk)
+        if self.preview_len < 500:
+            self.preview.append(text[:500 - self.preview_len])
+            self.preview_len += len(self.preview[-1])
+        return text
+
+
+def read_body(response, plan):
+    """Consume a streamed response as far as the plan needs and summarize it.
+
+    The echo JSON is scanned only for the keys the assertions use, size and
+    SHA-256 are computed incrementally, and nothing beyond the inspect limit
+    is buffered. Bodies nobody needs are drained when small (so the
+    connection is reused) and the connection is closed otherwise.
+    """
+    summary = BodySummary()
+    limit = plan.max_inspect or MAX_INSPECT_BYTES
+    reader = BodyReader(response, hashlib.sha256() if plan.hash_body else None, limit)
+    if plan.echo_keys:
+        stream = JsonStream(reader, BODY_CHUNK_SIZE)
+        try:
+            if stream.peek() == '':
+                summary.empty = True
+            else:
+                summary.echo = stream.pick(plan.echo_keys)
+        except BodyLimitExceeded:
+            summary.truncated = True
+            summary.echo_error = f"response body is larger than the inspect limit of {limit} bytes"
+        except TestFileError as e:
+            summary.echo_error = str(e)
+        summary.preview = ''.join(reader.preview)
+        # Anything after the picked keys is only needed for size/hash
+        reader.limit = None
+    stop = None if plan.read_all else reader.size + MAX_DRAIN_BYTES
+    while not reader.eof and (stop is None or reader.size < stop):
+        reader.read_bytes()
+    summary.size = reader.size
+    summary.complete = reader.eof
+    if reader.eof:
+        response.raw.release_conn()
+    else:
+        response.close()  # Cheaper to reconnect than to download what nobody checks
+    if reader.digest is not None and reader.eof:
+        summary.sha256 = reader.digest.hexdigest()
+    return summary
+
+
+# Request header carrying a unique token per cache check request; the echo upstream
+# sends it back, so a response echoing another request's token came from the cache
+CACHE_PROBE_HEADER = 'X-HTTPTests-Cache-Probe'
+
+
+class CacheCheck:
+    """Validated ``cache`` settings of an endpoint: a request sequence and what to expect of it."""
+
+    __slots__ = ('header', 'sequence', 'expectedUpstreamRequests', 'maxHitLatencyRatio', 'unique')
+
+    def __init__(self, spec):
+        if not isinstance(spec, dict):
+            raise ValueError("'cache' must be an object")
+        self.header = spec.get('header', 'X-Cache-Status')
+        sequence = spec.get('sequence', ['MISS', 'HIT'])
+        if not isinstance(sequence, list) or not sequence:
+            raise ValueError("cache 'sequence' must be a non-empty list")
+        # Each entry is a status, a list of accepted statuses or null (not checked)
+        self.sequence = tuple(None if entry is None else
+                              tuple(str(value).upper() for value in (entry if isinstance(entry, list) else [entry]))
+                              for entry in sequence)
+        self.expectedUpstreamRequests = spec.get('expectedUpstreamRequests', None)
+        if self.expectedUpstreamRequests is not None and (not isinstance(self.expectedUpstreamRequests, int)
+                                                          or self.expectedUpstreamRequests < 0):
+            raise ValueError("cache 'expectedUpstreamRequests' must be a non-negative integer")
+        self.maxHitLatencyRatio = spec.get('maxHitLatencyRatio', None)
+        if self.maxHitLatencyRatio is not None:
+            self.maxHitLatencyRatio = float(self.maxHitLatencyRatio)
+        self.unique = bool(spec.get('unique', False))
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def path(self, path, token):
+        """Path of the sequence; with ``unique`` a query parameter makes the cache key new for every run."""
+        if not self.unique:
+            return path
+        return '%s%shttptests-cache=%s' % (path, '&' if '?' in path else '?', token)
+
+
+class CacheResult:
+    """One request of a cache sequence."""
+
+    __slots__ = ('status', 'status_code', 'seconds', 'upstream')
+
+    def __init__(self, response, header, probe):
+        self.status = response.headers.get(header)
+        self.status_code = response.status_code
+        self.seconds = response.timing.total
+        # None when the response is not echo JSON and upstream requests cannot be told apart
+        echo = response.body.echo if getattr(response, 'body', None) is not None else None
+        forwarded = echo.get('headers') if isinstance(echo, dict) else None
+        self.upstream = None
+        if isinstance(forwarded, dict):
+            lookup = {key.lower(): value for key, value in forwarded.items()}
+            self.upstream = lookup.get(CACHE_PROBE_HEADER.lower()) == probe
+
+    def as_dict(self):
+        return {'cacheStatus': self.status, 'status': self.status_code, 'totalMs': round(self.seconds * 1000, 3),
+                'upstream': self.upstream}
+
+
+def is_count(value):
+    """Whether value is a non-negative integer; JSON true/false are not counts."""
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+class BurstCheck:
+    """Validated ``burst`` settings of an endpoint: requests fired at fixed offsets and the outcome to expect."""
+
+    __slots__ = ('requests', 'withinMs', 'concurrent', 'expect', 'limitedStatus', 'recoverWithinMs',
+                 'recoverPollMs', 'maxJitterMs')
+
+    OUTCOMES = ('success', 'limited', 'other')
+
+    def __init__(self, spec):
+        if not isinstance(spec, dict):
+            raise ValueError("'burst' must be an object")
+        self.requests = spec.get('requests')
+        if not is_count(self.requests) or not 1 <= self.requests <= MAX_BURST_REQUESTS:
+            raise ValueError(f"burst 'requests' must be an integer from 1 to {MAX_BURST_REQUESTS}")
+        self.withinMs = float(spec.get('withinMs', 0))
+        if self.withinMs < 0:
+            raise ValueError("burst 'withinMs' must not be negative")
+        self.concurrent = bool(spec.get('concurrent', True))
+        expect = spec.get('expect') or {}
+        if not isinstance(expect, dict) or set(expect) - set(self.OUTCOMES):
+            raise ValueError(f"burst 'expect' must be an object with {', '.join(self.OUTCOMES)}")
+        # Outcome -> (min, max); a number is an exact count
+        self.expect = {outcome: self.expect_bounds(outcome, value) for outcome, value in expect.items()}
+        limited = spec.get('limitedStatus', [429, 503])
+        self.limitedStatus = tuple(limited if isinstance(limited, list) else [limited])
+        self.recoverWithinMs = spec.get('recoverWithinMs', None)
+        self.recoverPollMs = float(spec.get('recoverPollMs', 50))
+        self.maxJitterMs = spec.get('maxJitterMs', None)
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    @staticmethod
+    def expect_bounds(outcome, value):
+        """(min, max) of an ``expect`` entry: a count, or {"min": N, "max": N} where max None is unbounded."""
+        if is_count(value):
+            return value, value
+        usage = f"burst expect '{outcome}' must be a count or {{\"min\": N, \"max\": N}}"
+        if not isinstance(value, dict) or not value or set(value) - {'min', 'max'}:
+            raise ValueError(f"{usage}, got {value!r}")
+        low, high = value.get('min', 0), value.get('max')
+        if not is_count(low) or (high is not None and not is_count(high)):
+            raise ValueError(f"{usage} with non-negative integers, got {value!r}")
+        if high is not None and low > high:
+            raise ValueError(f"burst expect '{outcome}': 'min' {low} is greater than 'max' {high}")
+        return low, high
+
+    def allows(self, outcome, count):
+        """Whether ``count`` requests with ``outcome`` meet the expectation."""
+        low, high = self.expect.get(outcome, (0, None))
+        return low <= count and (high is None or count <= high)
+
+    def describe(self, outcome):
+        """The expected count of ``outcome`` as shown in failure messages."""
+        low, high = self.expect.get(outcome, (0, None))
+        return str(low) if low == high else f">= {low}" if high is None else f"{low}..{high}"
+
+    def offsets(self):
+        """Send time of each request in seconds after the burst starts, evenly spread over ``withinMs``."""
+        return [i * self.withinMs / self.requests / 1000 for i in range(self.requests)]
+
+    def outcome(self, status):
+        if status is not None and 200 <= status < 300:
+            return 'success'
+        if status in self.limitedStatus:
+            return 'limited'
+        return 'other'
+
+
+class BurstResult:
+    """Statuses, send jitter and recovery of one burst."""
+
+    def __init__(self, burst, statuses, errors, jitter_ms, seconds):
+        self.statuses = statuses  # None where the request failed, see errors
+        self.errors = errors
+        self.jitter_ms = jitter_ms  # how late each request was sent relative to its offset
+        self.seconds = seconds
+        self.counts = {outcome: 0 for outcome in BurstCheck.OUTCOMES}
+        for status in statuses:
+            self.counts[burst.outcome(status)] += 1
+        self.recovery_ms = None  # time from the end of the burst until a request succeeded again
+        self.recovery_polls = 0
+
+    def as_dict(self):
+        return {
+            'counts': self.counts,
+            'statuses': self.statuses,
+            'errors': {error: self.errors.count(error) for error in set(filter(None, self.errors))},
+            'jitterMs': latency_stats(self.jitter_ms),
+            'recoveryMs': round(self.recovery_ms, 3) if self.recovery_ms is not None else None,
+            'recoveryPolls': self.recovery_polls,
+        }
+
+
+class Endpoint:
+    """An endpoint entry of test.json, compiled once and shared by the cases of its paths."""
+
+    __slots__ = ('host', 'index', 'method', 'sleep', 'headers', '_data', 'payload', 'expectedStatus',
+                 'keepAlive', 'repeat', 'warmup', 'expectedLatency', 'latencyBudgets',
+                 'responseHeaders', 'upstreamHeaders', 'paths', 'expectedBodySize', 'expectedBodySha256',
+                 'cache', 'burst', 'bodyPlan')
+
+    def __init__(self, host, endpoint, index=0, collectionHeaders=(), base_dir='.'):
+        self.host = host
+        self.index = index
+        self.method = endpoint.get("method", "GET")
+        self.sleep = endpoint.get("sleep", 0)
+        self.headers = endpoint.get("additionalRequestHeaders", {})
+        self._data = endpoint.get("data", None)
+        self.payload = PayloadSpec.from_endpoint(endpoint, base_dir)
+        self.expectedStatus = endpoint.get("expectedStatus", 200)
+        self.keepAlive = endpoint.get("keepAlive", None)
+        self.repeat = max(1, endpoint.get("repeat", 1))
+        self.warmup = endpoint.get("warmup", 0)
+        self.expectedLatency = endpoint.get("expectedLatency", None)
+        self.latencyBudgets = compile_latency_budgets(self.expectedLatency)
+        if not isinstance(endpoint.get("paths"), list):
+            raise ValueError("'paths' must be a list of paths")
+        self.responseHeaders = compile_headers(endpoint.get("expectedResponseHeaders"))
+        self.upstreamHeaders = compile_headers(endpoint.get("expectedRequestHeadersToUpstream"), collectionHeaders)
+        self.paths = PathSet(endpoint.get("paths"))
+        self.expectedBodySize = endpoint.get("expectedBodySize", None)
+        self.expectedBodySha256 = endpoint.get("expectedBodySha256", None)
+        self.cache = CacheCheck(endpoint["cache"]) if endpoint.get("cache") is not None else None
+        self.burst = BurstCheck(endpoint["burst"]) if endpoint.get("burst") is not None else None
+        if self.cache is not None and self.burst is not None:
+            raise ValueError("'cache' and 'burst' cannot be combined")
+        self.bodyPlan = BodyPlan(
+            echo_keys=dict(([('headers', ())] if self.upstreamHeaders or self.cache is not None else []) +
+                           ([('bodySha256', ('body',)), ('body', ())]
+                            if self.payload is not None and self.payload.verifyChecksum else [])),
+            hash_body=self.expectedBodySha256 is not None,
+            read_all=self.expectedBodySize is not None or self.expectedBodySha256 is not None,
+            max_inspect=endpoint.get("maxInspectBytes"),
+        )
+
+    @property
+    def data(self):
+        """Request body; a payload gives a fresh streamed body for every request."""
+        if self.payload is not None:
+            return self.payload.body()
+        return self._data
+
+
+class Case:
+    """A single (host, endpoint, path) check."""
+
+    __slots__ = ('endpoint', 'path', 'position')
+
+    def __init__(self, endpoint, path, position=0):
+        self.endpoint = endpoint
+        self.path = path
+        self.position = position
+
+    host = property(lambda self: self.endpoint.host)
+    index = property(lambda self: self.endpoint.index)
+    method = property(lambda self: self.endpoint.method)
+    sleep = property(lambda self: self.endpoint.sleep)
+    headers = property(lambda self: self.endpoint.headers)
+    data = property(lambda self: self.endpoint.data)
+    expectedStatus = property(lambda self: self.endpoint.expectedStatus)
+    keepAlive = property(lambda self: self.endpoint.keepAlive)
+    repeat = property(lambda self: self.endpoint.repeat)
+    warmup = property(lambda self: self.endpoint.warmup)
+    expectedLatency = property(lambda self: self.endpoint.expectedLatency)
+
+    @property
+    def test_name(self):
+        return '%s %s %s (%s)' % (self.method, self.host, self.path, self.expectedStatus)
+
+    @property
+    def endpoint_name(self):
+        """Label of the endpoint entry this case came from, e.g. 'GET api.example.com [2]'."""
+        return '%s %s [%d]' % (self.method, self.host, self.index)
+
+    @property
+    def case_id(self):
+        """Stable identity of the case across runs, e.g. 'GET api.example.com [2] /health'."""
+        return '%s %s' % (self.endpoint_name, self.path)
+
+
+def endpoint_cases(host, endpoint, index=0, collectionHeaders=()):
+    """Expand an endpoint from test.json into one Case per path."""
+    compiled = endpoint if isinstance(endpoint, Endpoint) else Endpoint(host, endpoint, index, collectionHeaders)
+    for path in compiled.paths:
+        yield Case(compiled, path)
+
 
+class EndpointStream:
+    """Endpoints of a test file, compiled as they are read; iterable more than once."""
+
+    def __init__(self, test_file):
+        self.test_file = test_file
+        # Payload files are relative to the test file
+        self.base_dir = os.path.dirname(os.path.abspath(test_file.path))
+
+    def __iter__(self):
+        collectionHeaders = self.test_file.collection_headers
+        for host, index, endpoint, where in self.test_file.endpoints():
+            try:
+                yield Endpoint(host, endpoint, index, collectionHeaders, self.base_dir)
+            except (AttributeError, TypeError, ValueError) as e:
+                raise self.test_file.error(where, f"invalid endpoint: {e}") from None
+
+
+class HostProtocol:
+    """Validated ``protocol`` of a host in ``hostOptions``: HTTP/2 over TLS (h2) or cleartext (h2c)."""
+
+    __slots__ = ('protocol', 'url', 'maxStreams')
+
+    PROTOCOLS = ('http/1.1', 'h2', 'h2c')
+
+    def __init__(self, options):
+        self.protocol = str(options.get('protocol', 'http/1.1')).lower()
+        if self.protocol not in self.PROTOCOLS:
+            raise ValueError(f"'protocol' must be one of {', '.join(self.PROTOCOLS)}, got {self.protocol!r}")
+        if self.protocol != 'http/1.1' and not h2client.AVAILABLE:
+            raise ValueError(f"protocol {self.protocol!r} needs the h2 package (pip install h2)")
+        self.url = options.get('url')
+        if self.url is not None:
+            url = urlsplit(self.url)
+            scheme = 'https' if self.protocol == 'h2' else 'http'
+            if url.scheme != scheme or not url.hostname:
+                raise ValueError(f"'url' of protocol {self.protocol!r} must be a {scheme}:// URL, got {self.url!r}")
+        self.maxStreams = options.get('maxStreams')
+        if self.maxStreams is not None and (not isinstance(self.maxStreams, int) or self.maxStreams < 1):
+            raise ValueError("'maxStreams' must be a positive integer")
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def target(self, base_url):
+        """(address, port, tls) to connect to; h2c defaults to --base-url, h2 to port 443 of its host."""
+        tls = self.protocol == 'h2'
+        url = urlsplit(self.url or base_url)
+        port = url.port if self.url or not tls else None
+        return url.hostname, port or (443 if tls else 80), tls
+
+
+class TestPlan:
+    """A compiled test.json: endpoints in declaration order plus per-host options."""
+
+    __slots__ = ('endpoints', 'rateLimits', 'protocols')
+
+    def __init__(self, endpoints, rateLimits=None, protocols=None):
+        self.endpoints = endpoints
+        self.rateLimits = rateLimits or {}
+        self.protocols = protocols or {}
+
+    def __getstate__(self):
+        return {'endpoints': self.endpoints, 'rateLimits': self.rateLimits, 'protocols': self.protocols}
+
+    def __setstate__(self, state):
+        self.endpoints = state['endpoints']
+        self.rateLimits = state['rateLimits']
+        self.protocols = state['protocols']
+
+    @staticmethod
+    def rate_limits(hostOptions):
+        """Validated ``rateLimit`` token buckets of the hosts that declare one."""
+        limits = {}
+        for host, options in hostOptions.items():
+            limit = options.get("rateLimit") if isinstance(options, dict) else None
+            if not limit:
+                continue
+            if not isinstance(limit, dict):
+                raise ValueError(f"{host}: 'rateLimit' must be an object")
+            rps, burst = limit.get("rps"), limit.get("burst", 1)
+            if isinstance(rps, bool) or not isinstance(rps, (int, float)) or rps <= 0:
+                raise ValueError(f"{host}: 'rateLimit.rps' must be a number > 0, got {rps!r}")
+            if isinstance(burst, bool) or not isinstance(burst, (int, float)) or burst < 1:
+                raise ValueError(f"{host}: 'rateLimit.burst' must be a number >= 1, got {burst!r}")
+            limits[host] = {"rps": rps, "burst": burst}
+        return limits
+
+    @staticmethod
+    def host_protocols(hostOptions):
+        """HostProtocol of every host that is not tested over HTTP/1.1."""
+        protocols = {}
+        for host, options in hostOptions.items():
+            try:
+                protocol = HostProtocol(options)
+            except (AttributeError, TypeError, ValueError) as e:
+                raise ValueError(f"{host}: {e}") from None
+            if protocol.protocol != 'http/1.1':
+                protocols[host] = protocol
+        return protocols
+
+    @classmethod
+    def compile(cls, data):
+        """Compile parsed test.json content."""
+        collectionHeaders = data.get("collectionHeaders", [])
         hosts = data["hosts"]
-        self.collectionHeaders = data.get("collectionHeaders", [])
-        for host in hosts:
-            endpoints = hosts[host]
-            for endpoint in endpoints:
-                self.do_test_endpoint(host, endpoint)
+        endpoints = tuple(Endpoint(host, endpoint, index, collectionHeaders)
+                          for host in hosts for index, endpoint in enumerate(hosts[host]))
+        hostOptions = data.get("hostOptions", {})
+        return cls(endpoints, cls.rate_limits(hostOptions), cls.host_protocols(hostOptions))
+
+    @classmethod
+    def stream(cls, path):
+        """Plan whose endpoints are read from a test.json/test.jsonl file while cases are run."""
+        test_file = TestFile(path)
+        try:
+            rateLimits = cls.rate_limits(test_file.host_options)
+            protocols = cls.host_protocols(test_file.host_options)
+        except ValueError as e:
+            raise test_file.error('hostOptions', str(e)) from None
+        return cls(EndpointStream(test_file), rateLimits, protocols)
 
-        # Closing file
-        f.close()
+    def cases(self):
+        """Yield every case in declaration order."""
+        position = 0
+        for endpoint in self.endpoints:
+            for path in endpoint.paths:
+                yield Case(endpoint, path, position)
+                position += 1
 
-    # Test each endpoint
-    def do_test_endpoint(self, host, endpoint):
-        method = endpoint.get("method", "GET")
-        paths = endpoint.get("paths")
-        sleepReq = endpoint.get("sleep", 0)
-        data = endpoint.get("data", None)
-        generatePayloadSize = endpoint.get("generatePayloadSize", None)
-        if (generatePayloadSize):
-            data = urandom(generatePayloadSize)
-        expectedStatus = endpoint.get("expectedStatus", 200)
-        expectedResponseHeaders = endpoint.get("expectedResponseHeaders", [])
-        expectedRequestHeadersToUpstream = endpoint.get("expectedRequestHeadersToUpstream", [])
-        additionalRequestHeaders = endpoint.get("additionalRequestHeaders", {})
-
-        for path in paths:
-            # Throttle request to prevent limit_req
-            sleep(sleepReq)
-            print(f"\n  → Testing: {method} {host}{path}")
-            response = request(host, path, method, additionalRequestHeaders, data)
-
-            test_name = '%s %s %s (%s)' % (method, host, path, expectedStatus)
-            self.do_test_status_code(test_name, expectedStatus, response.status_code)
-            self.do_test_response_headers(test_name, expectedResponseHeaders, response.headers)
-            self.do_test_request_headers(test_name, expectedRequestHeadersToUpstream, response.text)
+
+# Bump when the compiled classes change so stale cached plans are recompiled
+PLAN_VERSION = 8
+
+
+def load_plan(path, cache_dir=None):
+    """Compile a whole test file, reusing a plan pickled in cache_dir for the same file content."""
+    cache_path = None
+    if cache_dir:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        digest.update(b'\0plan-v%d\0' % PLAN_VERSION)
+        # Relative payload file paths are resolved against the test file's directory
+        digest.update(os.path.dirname(os.path.abspath(path)).encode('utf-8'))
+        cache_path = os.path.join(cache_dir, f'{digest.hexdigest()}.plan.pickle')
+        if os.path.isfile(cache_path):
+            try:
+                with open(cache_path, 'rb') as f:
+                    return pickle.load(f)
+            except Exception:
+                pass  # Unreadable or from another version; compile again
+    streamed = TestPlan.stream(path)
+    plan = TestPlan(tuple(streamed.endpoints), streamed.rateLimits, streamed.protocols)
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(plan, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    return plan
+
+
+def open_plan(path, cache_dir=None):
+    """The test plan of a file: cached when a cache directory is given, streamed otherwise."""
+    return load_plan(path, cache_dir) if cache_dir else TestPlan.stream(path)
+
+
+def iter_cases(hosts, collectionHeaders=()):
+    """Yield every case of a test.json ``hosts`` mapping in declaration order."""
+    return TestPlan.compile({"hosts": hosts, "collectionHeaders": collectionHeaders}).cases()
+
+
+def parse_shard(value):
+    """Parse 'i/N' (1-based) into (i, N)."""
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d+)\s*', value or '')
+    if not match or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        raise argparse.ArgumentTypeError(f"invalid shard '{value}', expected i/N with 1 <= i <= N")
+    return int(match.group(1)), int(match.group(2))
+
+
+def load_case_durations(path):
+    """Per-case durations (ms) from a JSON report of an earlier run, keyed by case id."""
+    with open(path, encoding='utf-8') as f:
+        report = json.load(f)
+    durations = {}
+    for case in report.get('cases', []):
+        if case.get('id') and case.get('timing'):
+            durations[case['id']] = sum(case.get('samplesMs') or [case['timing']['totalMs']])
+    return durations
+
+
+def shard_cases(cases, shard, total, durations=None, throttled_hosts=()):
+    """Yield the cases of shard ``shard`` (1-based) out of ``total`` while ``cases`` is read.
+
+    Every case goes to the least loaded shard so far, in declaration order;
+    a case costs its duration from ``durations`` (unknown cases the median
+    known duration) or 1 without durations, which deals cases round-robin.
+    Throttled cases (``sleep`` or a host ``rateLimit``) of one host all go
+    to the shard of the first one, so the limit still holds across
+    processes. Only the shard loads and the shards of throttled hosts are
+    kept, so a streamed test file is never held in memory. The partition
+    is deterministic, so every shard computes the same split.
+    """
+    default = 1.0
+    if durations:
+        known = sorted(durations.values())
+        default = known[len(known) // 2]
+    loads = [0.0] * total
+    host_shards = {}
+    for case in cases:
+        cost = durations.get(case.case_id, default) if durations else 1.0
+        target = None
+        if case.sleep or case.host in throttled_hosts:
+            target = host_shards.get(case.host)
+        if target is None:
+            target = min(range(total), key=lambda i: (loads[i], i))
+            if case.sleep or case.host in throttled_hosts:
+                host_shards[case.host] = target
+        loads[target] += cost
+        if target == shard - 1:
+            yield case
+
+
+# Requests measured per case at least, see --min-repeat
+MIN_REPEAT = 1
+
+
+def select_cases(plan, shard=None, timings_path=None):
+    """Cases of a plan, limited to one shard when ``shard`` is (index, total)."""
+    cases = plan.cases()
+    if shard:
+        durations = load_case_durations(timings_path) if timings_path else None
+        cases = shard_cases(cases, *shard, durations=durations, throttled_hosts=plan.rateLimits)
+    return cases
+
+
+def fetch_case(case, throttle=None, report_errors=True):
+    """Send the request for a case and return the response.
+
+    With ``warmup``/``repeat`` the path is requested several times; the first
+    measured response is returned and carries the total time of every
+    measured request (seconds) in ``response.samples``. ``throttle`` is called
+    before every request and defaults to sleeping for the endpoint's ``sleep``.
+    Without ``report_errors`` failed requests raise without printing details.
+
+    With ``cache`` the endpoint's request sequence is sent instead, one request
+    after the other and without warmup; the first response is returned with
+    every request of the sequence in ``response.cache_results``. With
+    ``burst`` the burst is fired instead, see run_burst. The IDs of all
+    requests sent for the case are in ``response.request_ids``.
+    """
+    if throttle is None:
+        # Throttle request to prevent limit_req
+        throttle = lambda: sleep(case.sleep)
+
+    request_ids = []
+
+    def send(body_plan, path=None, headers=None):
+        throttle()
+        data = case.data
+        response = request(case.host, path or case.path, case.method, headers or case.headers, data,
+                           keep_alive=case.keepAlive, report_errors=report_errors, body_plan=body_plan)
+        # Streamed payloads know their checksum once sent
+        response.payload = data
+        request_ids.append(response.request_id)
+        response.request_ids = request_ids
+        return response
+
+    if case.endpoint.burst is not None:
+        throttle()
+        return run_burst(case)
+
+    cache = case.endpoint.cache
+    if cache is not None:
+        token = uuid.uuid4().hex[:16]
+        path = cache.path(case.path, token)
+        results = []
+        response = None
+        for i in range(len(cache.sequence)):
+            probe = '%s-%d' % (token, i + 1)
+            sent = send(case.endpoint.bodyPlan, path, {**case.headers, CACHE_PROBE_HEADER: probe})
+            results.append(CacheResult(sent, cache.header, probe))
+            response = response or sent
+        response.cache_results = results
+        response.samples = [result.seconds for result in results]
+        return response
+
+    for _ in range(case.warmup):
+        send(DRAIN_BODY)
+    response = send(case.endpoint.bodyPlan)
+    response.samples = [response.timing.total]
+    for _ in range(max(case.repeat, MIN_REPEAT) - 1):
+        response.samples.append(send(case.endpoint.bodyPlan).timing.total)
+    return response
+
+
+# Sleeping wakes up to a millisecond or two late; the rest of a wait is spun
+SPIN_SECONDS = 0.002
+
+# Largest burst; every request of a concurrent burst gets its own thread
+MAX_BURST_REQUESTS = 1000
+
+
+def wait_until(due, spin=SPIN_SECONDS):
+    """Block until perf_counter() reaches ``due``; returns how late (ms) it returned.
+
+    Sleeps until shortly before ``due`` and spins the rest, yielding the GIL
+    on every turn so other threads keep running.
+    """
+    remaining = due - perf_counter()
+    if remaining > spin:
+        sleep(remaining - spin)
+    while perf_counter() < due:
+        sleep(0)
+    return (perf_counter() - due) * 1000
+
+
+def fire_schedule(offsets, send, concurrent=True, lead=0.02):
+    """Call ``send(i)`` at ``offsets[i]`` seconds after a common start; returns the lateness (ms) of each call.
+
+    Concurrent calls each run on a thread of their own, started and parked
+    before the schedule begins, so no call waits for a worker to pick it up.
+    Otherwise calls are made one after the other and a slow call delays the
+    next one, which shows up as lateness.
+    """
+    lateness = [0.0] * len(offsets)
+    if not concurrent:
+        start = perf_counter() + lead
+        for i, offset in enumerate(offsets):
+            lateness[i] = wait_until(start + offset)
+            send(i)
+        return lateness
+
+    go = threading.Event()
+    begin = []
+
+    def fire(i):
+        go.wait()
+        lateness[i] = wait_until(begin[0] + offsets[i])
+        send(i)
+
+    threads = [threading.Thread(target=fire, args=(i,), name=f'httptests-burst-{i}', daemon=True)
+               for i in range(len(offsets))]
+    for thread in threads:
+        thread.start()
+    begin.append(perf_counter() + lead)
+    go.set()
+    for thread in threads:
+        thread.join()
+    return lateness
+
+
+def run_burst(case):
+    """Fire the burst of a case and, with ``recoverWithinMs``, wait for the limit to recover.
+
+    Returns the first response with the expected status (or else the first
+    response), with the outcome in ``response.burst_result`` and the time of
+    every completed request in ``response.samples``; raises the first error
+    when no request got a response.
+    """
+    burst = case.endpoint.burst
+    body_plan = case.endpoint.bodyPlan
+    responses = [None] * burst.requests
+    errors = [None] * burst.requests
+
+    def send(i):
+        try:
+            responses[i] = request(case.host, case.path, case.method, case.headers, case.data,
+                                   keep_alive=case.keepAlive, report_errors=False, body_plan=body_plan)
+        except Exception as e:
+            errors[i] = e
+
+    start = perf_counter()
+    jitter = fire_schedule(burst.offsets(), send, burst.concurrent)
+    end = perf_counter()
+    received = [response for response in responses if response is not None]
+    if not received:
+        raise next(error for error in errors if error is not None)
+
+    request_ids = [response.request_id if response is not None else errors[i].request_id
+                   for i, response in enumerate(responses)]
+    result = BurstResult(burst, [response.status_code if response is not None else None for response in responses],
+                         [type(error).__name__ if error is not None else None for error in errors], jitter, end - start)
+    if burst.recoverWithinMs is not None:
+        deadline = end + burst.recoverWithinMs / 1000
+        due = end
+        while due <= deadline:
+            wait_until(due)
+            sent = perf_counter()
+            result.recovery_polls += 1
+            try:
+                polled = request(case.host, case.path, case.method, case.headers, case.data,
+                                 keep_alive=case.keepAlive, report_errors=False, body_plan=DRAIN_BODY)
+                status = polled.status_code
+                request_ids.append(polled.request_id)
+            except Exception as e:
+                status = None
+                request_ids.append(e.request_id)
+            if burst.outcome(status) == 'success':
+                result.recovery_ms = (sent - end) * 1000
+                break
+            due = max(due + burst.recoverPollMs / 1000, perf_counter())
+
+    # Which requests get through is up to the limiter; the other checks look at one that did
+    first = next((response for response in received if response.status_code == case.expectedStatus), received[0])
+    first.burst_result = result
+    first.samples = [response.timing.total for response in received]
+    first.request_ids = request_ids
+    return first
+
+
+def execute_cases(cases, concurrency=1, rate_limits=None, return_errors=False):
+    """Fetch cases with a CaseScheduler and yield (case, response) in declaration order."""
+    return CaseScheduler(fetch_case, concurrency, rate_limits).run(cases, return_errors)
+
+
+class CaseAssertions:
+    """Assertions of a case against its response, shared by both runners.
+
+    Subclasses provide ``subTest``, ``fail`` and ``log`` and count passed
+    checks in ``totalAssertions``.
+    """
+    collectionHeaders = []
+    regression_baseline = None  # baseline.Baseline to compare latencies with, see --baseline-compare
+
+    def log(self, text):
+        print(text)
+
+    # Run all assertions of a case against its response
+    def do_test_case(self, case, response, announce=True):
+        if announce:
+            self.log(f"\n  → Testing: {case.method} {case.host}{case.path}")
+        samples = getattr(response, 'samples', None)
+        self.report.start_case(case, getattr(response, 'timing', None), samples,
+                               getattr(response, 'request_ids', None))
+        endpoint = case.endpoint
+
+        test_name = case.test_name
+        self.do_test_status_code(test_name, endpoint.expectedStatus, response.status_code)
+        self.do_test_response_headers(test_name, endpoint.responseHeaders, response.headers)
+        body = getattr(response, 'body', None) or BodySummary.from_text(response.text)
+        self.do_test_request_headers(test_name, endpoint.upstreamHeaders, body)
+        if endpoint.expectedBodySize is not None or endpoint.expectedBodySha256 is not None:
+            self.do_test_body(test_name, endpoint.expectedBodySize, endpoint.expectedBodySha256, body)
+        if endpoint.latencyBudgets:
+            self.do_test_latency(test_name, endpoint.latencyBudgets, [sample * 1000 for sample in samples])
+        if self.regression_baseline is not None and samples:
+            self.do_test_regression(test_name, case.case_id, [sample * 1000 for sample in samples])
+        if endpoint.payload is not None and endpoint.payload.verifyChecksum:
+            self.do_test_payload_checksum(test_name, getattr(response, 'payload', None), body)
+        if endpoint.cache is not None:
+            self.do_test_cache(test_name, endpoint.cache, getattr(response, 'cache_results', None) or [])
+        if endpoint.burst is not None and getattr(response, 'burst_result', None) is not None:
+            self.do_test_burst(test_name, endpoint.burst, response.burst_result)
 
     # Status Code
     def do_test_status_code(self, test_name, expectedStatus, status_code):
         with self.subTest(msg='%s => Test Status Code' % test_name):
             if expectedStatus != status_code:
-                print(f"    ❌ Status code mismatch!")
-                print(f"      Expected: {expectedStatus}")
-                print(f"      Got: {status_code}")
+                self.log(f"    ❌ Status code mismatch!")
+                self.log(f"      Expected: {expectedStatus}")
+                self.log(f"      Got: {status_code}")
                 self.fail(f"Status code {status_code} does not match expected {expectedStatus}")
-            print(f"    ✓ Status code: {status_code} (expected {expectedStatus})")
+            self.log(f"    ✓ Status code: {status_code} (expected {expectedStatus})")
             self.totalAssertions += 1
 
     # Response Headers
     def do_test_response_headers(self, test_name, expectedResponseHeaders, headers):
         with self.subTest(msg='%s => Response Headers' % test_name):
+            if not isinstance(expectedResponseHeaders, tuple):
+                expectedResponseHeaders = compile_headers(expectedResponseHeaders)
+            if not expectedResponseHeaders:
+                return
+            # Case-insensitive lookup table, built once per response
+            lookup = {key.lower(): value for key, value in headers.items()}
             for header in expectedResponseHeaders:
-                headerKey = header[0].lower()
-                if (len(header) == 1):
-                    if headerKey not in headers:
-                        print(f"    ❌ Response header missing: {headerKey}")
-                        print(f"      Available headers: {', '.join(headers.keys())}")
+                headerKey = header.key
+                if header.value is None:
+                    if headerKey not in lookup:
+                        self.log(f"    ❌ Response header missing: {headerKey}")
+                        self.log(f"      Available headers: {', '.join(headers.keys())}")
                         self.fail(f"Response header '{headerKey}' not found in response")
-                    print(f"    ✓ Response header present: {headerKey}")
+                    self.log(f"    ✓ Response header present: {headerKey}")
                     self.totalAssertions += 1
                 else:
-                    expectedValue = header[1]
-                    if headerKey not in headers:
-                        print(f"    ❌ Response header missing: {headerKey}")
-                        print(f"      Expected value: {expectedValue}")
-                        print(f"      Available headers: {', '.join(headers.keys())}")
+                    expectedValue = header.value
+                    if headerKey not in lookup:
+                        self.log(f"    ❌ Response header missing: {headerKey}")
+                        self.log(f"      Expected value: {expectedValue}")
+                        self.log(f"      Available headers: {', '.join(headers.keys())}")
                         self.fail(f"Response header '{headerKey}' not found in response")
-                    elif headers[headerKey] != expectedValue:
-                        print(f"    ❌ Response header mismatch: {headerKey}")
-                        print(f"      Expected: {expectedValue}")
-                        print(f"      Got: {headers[headerKey]}")
-                        self.fail(f"Response header '{headerKey}' has value '{headers[headerKey]}', expected '{expectedValue}'")
-                    print(f"    ✓ Response header: {headerKey} = {headers[headerKey]}")
+                    elif lookup[headerKey] != expectedValue:
+                        self.log(f"    ❌ Response header mismatch: {headerKey}")
+                        self.log(f"      Expected: {expectedValue}")
+                        self.log(f"      Got: {lookup[headerKey]}")
+                        self.fail(f"Response header '{headerKey}' has value '{lookup[headerKey]}', expected '{expectedValue}'")
+                    self.log(f"    ✓ Response header: {headerKey} = {lookup[headerKey]}")
                     self.totalAssertions += 1
 
     # Request Headers to Upstream
-    def do_test_request_headers(self, test_name, expectedRequestHeadersToUpstream, text):
+    def do_test_request_headers(self, test_name, expectedRequestHeadersToUpstream, body):
         with self.subTest(msg='%s => Request Headers' % test_name):
-            if "$collectionheaders" in expectedRequestHeadersToUpstream:
-                expectedRequestHeadersToUpstream += self.collectionHeaders
-            
+            if not isinstance(expectedRequestHeadersToUpstream, tuple):
+                expectedRequestHeadersToUpstream = compile_headers(expectedRequestHeadersToUpstream,
+                                                                   self.collectionHeaders)
+
             # Skip if no headers to check
             if not expectedRequestHeadersToUpstream:
                 return
             
+            if not isinstance(body, BodySummary):
+                body = BodySummary.from_text(body)
+
             # Skip if response is empty (e.g., 204 No Content)
-            if not text or not text.strip():
+            if body.empty:
                 return
             
-            # Try to parse JSON once before processing headers
-            try:
-                body = json.loads(text)
-            except json.JSONDecodeError as e:
-                print(f"    ❌ Failed to parse response as JSON")
-                print(f"      Error: {e}")
-                print(f"      Response text (first 500 chars): {text[:500]}")
-                self.fail(f"Response body is not valid JSON: {str(e)}")
+            # The echo JSON was parsed while the response was read
+            if body.truncated:
+                self.log(f"    ❌ Response body too large to inspect")
+                self.log(f"      Error: {body.echo_error}")
+                self.fail(f"Response body not inspected: {body.echo_error} (see --max-inspect-bytes)")
+            if body.echo_error is not None or not isinstance(body.echo, dict):
+                self.log(f"    ❌ Failed to parse response as JSON")
+                self.log(f"      Error: {body.echo_error or 'expected a JSON object'}")
+                self.log(f"      Response text (first 500 chars): {body.preview}")
+                self.fail(f"Response body is not valid JSON: {body.echo_error or 'expected a JSON object'}")
                 return
-            
+
+            forwarded = body.echo.get('headers') or {}
+            # Case-insensitive lookup table of the headers the echo upstream received
+            lookup = {key.lower(): value for key, value in forwarded.items()}
             for header in expectedRequestHeadersToUpstream:
-                headerKey = header[0].lower()
-                if headerKey == "$collectionheaders":
-                    continue
+                headerKey = header.key
 
-                if (len(header) == 1):
-                    if headerKey not in body.get('headers', {}):
-                        print(f"    ❌ Request header not forwarded: {headerKey}")
-                        print(f"      Forwarded headers: {', '.join(body.get('headers', {}).keys())}")
+                if header.value is None:
+                    if headerKey not in lookup:
+                        self.log(f"    ❌ Request header not forwarded: {headerKey}")
+                        self.log(f"      Forwarded headers: {', '.join(forwarded.keys())}")
                         self.fail(f"Request header '{headerKey}' was not forwarded to upstream")
-                    print(f"    ✓ Request header forwarded: {headerKey}")
+                    self.log(f"    ✓ Request header forwarded: {headerKey}")
                     self.totalAssertions += 1
-                elif (len(header) == 2):
-                    expectedValue = header[1]
-
+                elif header.deleted:
                     # Check for deleted headers
-                    if expectedValue == "$deleted":
-                        if headerKey in body.get('headers', {}):
-                            print(f"    ❌ Request header should be removed but was found: {headerKey}")
-                            print(f"      Value: {body['headers'][headerKey]}")
-                            self.fail(f"Request header '{headerKey}' should be removed but was present with value '{body['headers'][headerKey]}'")
-                        print(f"    ✓ Request header removed: {headerKey}")
-                        self.totalAssertions += 1
-                    else:
-                        if headerKey not in body.get('headers', {}):
-                            print(f"    ❌ Request header missing: {headerKey}")
-                            print(f"      Expected value: {expectedValue}")
-                            print(f"      Forwarded headers: {', '.join(body.get('headers', {}).keys())}")
-                            self.fail(f"Request header '{headerKey}' not found in forwarded headers")
-                        elif body['headers'][headerKey] != expectedValue:
-                            print(f"    ❌ Request header mismatch: {headerKey}")
-                            print(f"      Expected: {expectedValue}")
-                            print(f"      Got: {body['headers'][headerKey]}")
-                            self.fail(f"Request header '{headerKey}' has value '{body['headers'][headerKey]}', expected '{expectedValue}'")
-                        print(f"    ✓ Request header: {headerKey} = {body['headers'][headerKey]}")
-                        self.totalAssertions += 1
-
-def wait_for_service(max_wait=60, check_interval=2):
-    """Wait for the service to be ready by checking health"""
-    base_url = "http://localhost"
+                    if headerKey in lookup:
+                        self.log(f"    ❌ Request header should be removed but was found: {headerKey}")
+                        self.log(f"      Value: {lookup[headerKey]}")
+                        self.fail(f"Request header '{headerKey}' should be removed but was present with value '{lookup[headerKey]}'")
+                    self.log(f"    ✓ Request header removed: {headerKey}")
+                    self.totalAssertions += 1
+                else:
+                    expectedValue = header.value
+                    if headerKey not in lookup:
+                        self.log(f"    ❌ Request header missing: {headerKey}")
+                        self.log(f"      Expected value: {expectedValue}")
+                        self.log(f"      Forwarded headers: {', '.join(forwarded.keys())}")
+                        self.fail(f"Request header '{headerKey}' not found in forwarded headers")
+                    elif lookup[headerKey] != expectedValue:
+                        self.log(f"    ❌ Request header mismatch: {headerKey}")
+                        self.log(f"      Expected: {expectedValue}")
+                        self.log(f"      Got: {lookup[headerKey]}")
+                        self.fail(f"Request header '{headerKey}' has value '{lookup[headerKey]}', expected '{expectedValue}'")
+                    self.log(f"    ✓ Request header: {headerKey} = {lookup[headerKey]}")
+                    self.totalAssertions += 1
+
+    # Payload received by the upstream
+    def do_test_payload_checksum(self, test_name, payload, body):
+        with self.subTest(msg='%s => Payload Checksum' % test_name):
+            sent = payload.sha256 if hasattr(payload, 'sha256') else hashlib.sha256(payload or b'').hexdigest()
+            if not isinstance(body, BodySummary):
+                body = BodySummary.from_text(body)
+            if body.echo_error is not None or not isinstance(body.echo, dict):
+                self.log(f"    ❌ Failed to parse response as JSON")
+                self.log(f"      Error: {body.echo_error or 'expected a JSON object'}")
+                self.fail(f"Response body is not valid JSON: {body.echo_error or 'expected a JSON object'}")
+            body = body.echo
+            # Prefer a checksum reported by the echo upstream over hashing the echoed body
+            if isinstance(body.get('bodySha256'), str):
+                received = body['bodySha256']
+            elif isinstance(body.get('body'), str):
+                received = hashlib.sha256(body['body'].encode('utf-8')).hexdigest()
+            else:
+                self.log(f"    ❌ Upstream did not echo the request body")
+                self.fail("Response has neither 'bodySha256' nor 'body' to verify the payload against")
+            if received != sent:
+                self.log(f"    ❌ Payload checksum mismatch!")
+                self.log(f"      Sent:     {sent}")
+                self.log(f"      Received: {received}")
+                self.fail(f"Upstream received a payload with SHA-256 {received}, sent {sent}")
+            self.log(f"    ✓ Payload checksum: {sent[:16]}… ({payload.sent if hasattr(payload, 'sent') else len(payload or b'')} bytes)")
+            self.totalAssertions += 1
+
+    # Size and SHA-256 of the response body
+    def do_test_body(self, test_name, expectedSize, expectedSha256, body):
+        with self.subTest(msg='%s => Response Body' % test_name):
+            if not isinstance(body, BodySummary):
+                body = BodySummary.from_text(body)
+            if not body.complete:
+                self.log(f"    ❌ Response body was not read completely ({body.size} bytes received)")
+                self.fail("Response body was not read completely")
+            if expectedSize is not None:
+                if body.size != expectedSize:
+                    self.log(f"    ❌ Response body size mismatch!")
+                    self.log(f"      Expected: {expectedSize} bytes")
+                    self.log(f"      Got: {body.size} bytes")
+                    self.fail(f"Response body has {body.size} bytes, expected {expectedSize}")
+                self.log(f"    ✓ Response body size: {body.size} bytes")
+                self.totalAssertions += 1
+            if expectedSha256 is not None:
+                if body.sha256 != expectedSha256.lower():
+                    self.log(f"    ❌ Response body checksum mismatch!")
+                    self.log(f"      Expected: {expectedSha256}")
+                    self.log(f"      Got: {body.sha256}")
+                    self.fail(f"Response body has SHA-256 {body.sha256}, expected {expectedSha256}")
+                self.log(f"    ✓ Response body checksum: {body.sha256[:16]}…")
+                self.totalAssertions += 1
+
+    # Cache statuses, upstream requests and hit latency over a request sequence
+    def do_test_cache(self, test_name, cache, results):
+        with self.subTest(msg='%s => Cache' % test_name):
+            if self.report.current is not None:
+                self.report.current['cache'] = [result.as_dict() for result in results]
+            for number, (expected, result) in enumerate(zip(cache.sequence, results), 1):
+                if expected is None:
+                    continue
+                if (result.status or '').upper() not in expected:
+                    self.log(f"    ❌ Cache status mismatch on request {number} of {len(results)}!")
+                    self.log(f"      Expected: {cache.header} = {' or '.join(expected)}")
+                    self.log(f"      Got: {result.status if result.status is not None else '(header missing)'}")
+                    self.log(f"      Sequence: {', '.join(str(r.status) for r in results)}")
+                    self.fail(f"Request {number}: {cache.header} is {result.status!r}, expected {' or '.join(expected)}")
+                self.log(f"    ✓ Cache request {number}: {cache.header} = {result.status}")
+                self.totalAssertions += 1
+
+            if cache.expectedUpstreamRequests is not None:
+                if any(result.upstream is None for result in results):
+                    self.log(f"    ❌ Cannot count upstream requests: response is not echo JSON with 'headers'")
+                    self.fail("Upstream requests cannot be counted without echo JSON responses")
+                reached = sum(result.upstream for result in results)
+                if reached != cache.expectedUpstreamRequests:
+                    self.log(f"    ❌ Upstream request count mismatch!")
+                    self.log(f"      Expected: {cache.expectedUpstreamRequests} of {len(results)} request(s)")
+                    self.log(f"      Got: {reached} ({', '.join('upstream' if r.upstream else 'cache' for r in results)})")
+                    self.fail(f"{reached} of {len(results)} request(s) reached the upstream, "
+                              f"expected {cache.expectedUpstreamRequests}")
+                self.log(f"    ✓ Upstream requests: {reached} of {len(results)}")
+                self.totalAssertions += 1
+
+            if cache.maxHitLatencyRatio is not None:
+                # Requests are told apart by the status expected at their position
+                hits = [r.seconds for e, r in zip(cache.sequence, results) if e and 'HIT' in e]
+                misses = [r.seconds for e, r in zip(cache.sequence, results) if e and 'MISS' in e]
+                if not hits or not misses:
+                    self.log(f"    ❌ Cache sequence needs both HIT and MISS requests for a latency ratio")
+                    self.fail("maxHitLatencyRatio needs HIT and MISS entries in the cache sequence")
+                hit_ms = percentile(hits, 50) * 1000
+                miss_ms = percentile(misses, 50) * 1000
+                ratio = hit_ms / miss_ms if miss_ms > 0 else float('inf')
+                if ratio > cache.maxHitLatencyRatio:
+                    self.log(f"    ❌ Cache hits are not fast enough!")
+                    self.log(f"      HIT p50: {hit_ms:.1f}ms, MISS p50: {miss_ms:.1f}ms")
+                    self.log(f"      Ratio: {ratio:.2f} (max {cache.maxHitLatencyRatio})")
+                    self.fail(f"HIT/MISS latency ratio {ratio:.2f} exceeds {cache.maxHitLatencyRatio}")
+                self.log(f"    ✓ Cache hit latency: {hit_ms:.1f}ms vs {miss_ms:.1f}ms miss "
+                         f"(ratio {ratio:.2f}, max {cache.maxHitLatencyRatio})")
+                self.totalAssertions += 1
+
+    # Outcome of a timed burst and recovery of the limit
+    def do_test_burst(self, test_name, burst, result):
+        with self.subTest(msg='%s => Burst' % test_name):
+            if self.report.current is not None:
+                self.report.current['burst'] = result.as_dict()
+            jitter = result.as_dict()['jitterMs']
+            mode = 'concurrent' if burst.concurrent else 'sequential'
+            self.log(f"    Burst: {burst.requests} {mode} request(s) over {burst.withinMs:g}ms in "
+                     f"{result.seconds * 1000:.1f}ms; send jitter p50 {jitter['p50']:.2f}ms, "
+                     f"p99 {jitter['p99']:.2f}ms, max {jitter['max']:.2f}ms")
+            if burst.maxJitterMs is not None:
+                if jitter['max'] > burst.maxJitterMs:
+                    self.log(f"    ❌ Burst timing not reliable: requests were sent up to {jitter['max']:.2f}ms late")
+                    self.log(f"      Allowed: {burst.maxJitterMs}ms (maxJitterMs)")
+                    self.fail(f"Burst send jitter {jitter['max']:.2f}ms exceeds maxJitterMs {burst.maxJitterMs}")
+                self.log(f"    ✓ Burst send jitter: max {jitter['max']:.2f}ms (allowed {burst.maxJitterMs}ms)")
+                self.totalAssertions += 1
+
+            counts = ', '.join(f"{count} {outcome}" for outcome, count in result.counts.items())
+            for outcome in burst.expect:
+                count = result.counts[outcome]
+                expected = burst.describe(outcome)
+                if not burst.allows(outcome, count):
+                    self.log(f"    ❌ Burst {outcome} count mismatch!")
+                    self.log(f"      Expected: {expected} of {burst.requests}")
+                    self.log(f"      Got: {count} ({counts})")
+                    self.log(f"      Statuses: {' '.join(str(status) for status in result.statuses)}")
+                    self.fail(f"{count} of {burst.requests} burst request(s) were {outcome}, expected {expected}")
+                self.log(f"    ✓ Burst {outcome}: {count} of {burst.requests} (expected {expected})")
+                self.totalAssertions += 1
+
+            if burst.recoverWithinMs is not None:
+                if result.recovery_ms is None:
+                    self.log(f"    ❌ Limit did not recover within {burst.recoverWithinMs}ms "
+                             f"({result.recovery_polls} poll(s))")
+                    self.fail(f"No successful response within {burst.recoverWithinMs}ms after the burst")
+                self.log(f"    ✓ Limit recovered after {result.recovery_ms:.0f}ms "
+                         f"(within {burst.recoverWithinMs}ms, {result.recovery_polls} poll(s))")
+                self.totalAssertions += 1
+
+    # Latency compared with a recorded baseline
+    def do_test_regression(self, test_name, case_id, samples):
+        with self.subTest(msg='%s => Latency Regression' % test_name):
+            result = self.regression_baseline.compare(case_id, samples)
+            if result is None:
+                return
+            if result.regressed:
+                shift = f"{result.shift_pct:+.1f}%" if result.shift_pct != float('inf') else "new latency"
+                self.log(f"    ❌ Latency regression against baseline!")
+                self.log(f"      Baseline p50: {result.baseline_p50:.1f}ms ({result.baseline_n} samples)")
+                self.log(f"      Current p50: {result.current_p50:.1f}ms ({result.current_n} samples)")
+                self.log(f"      Shift: {result.shift_ms:+.1f}ms ({shift}), p={result.p_value:.4f}")
+                self.fail(f"Latency regressed by {result.shift_ms:.1f}ms ({shift}, p={result.p_value:.4f})")
+            self.log(f"    ✓ Latency vs baseline: {result.shift_ms:+.1f}ms (p={result.p_value:.3f})")
+            self.totalAssertions += 1
+
+    # Latency budget over repeated requests
+    def do_test_latency(self, test_name, expectedLatency, samples):
+        with self.subTest(msg='%s => Latency' % test_name):
+            if isinstance(expectedLatency, dict):
+                expectedLatency = compile_latency_budgets(expectedLatency)
+            for budgetKey, label, pct, budget in expectedLatency:
+                if label is None:
+                    self.log(f"    ❌ Unknown latency budget: {budgetKey}")
+                    self.fail(f"Unknown expectedLatency key '{budgetKey}', use 'pNNMs' or 'maxMs'")
+                measured = max(samples) if pct is None else percentile(samples, pct)
+                if measured > budget:
+                    self.log(f"    ❌ Latency budget exceeded: {label}")
+                    self.log(f"      Budget: {budget}ms")
+                    self.log(f"      Measured: {measured:.1f}ms over {len(samples)} request(s)")
+                    self.fail(f"Latency {label} {measured:.1f}ms exceeds budget of {budget}ms")
+                self.log(f"    ✓ Latency {label}: {measured:.1f}ms (budget {budget}ms, {len(samples)} request(s))")
+                self.totalAssertions += 1
+
+
+class IntegrationTests(CaseAssertions, unittest.TestCase):
+    totalAssertions = 0
+    test_file_path = 'example/.httptests/test.json'
+    concurrency = 1
+    shard = None
+    timings_path = None
+    plan_cache = None
+    report = RunReport()
+    report_json_path = None
+    junit_xml_path = None
+
+    @classmethod
+    def setResult(cls, totalAssertions):
+        cls.totalAssertions += totalAssertions
+
+    def setUp(self):
+        self.totalAssertions = 0
+
+    def tearDown(self):
+        self.setResult(self.totalAssertions)
+
+    @classmethod
+    def tearDownClass(cls):
+        print("\n" + "="*60)
+        print(f"Total assertions passed: {cls.totalAssertions}")
+        print("="*60)
+        cls.report.print_summary()
+        print_h2_summary()
+        attach_nginx_logs(cls.report)
+        cls.report.write_reports(cls.totalAssertions, cls.report_json_path, cls.junit_xml_path, cls.test_file_path)
+
+    @contextmanager
+    def subTest(self, msg=unittest.case._subtest_msg_sentinel, **params):
+        """subTest that also records its outcome in the run report"""
+        with super().subTest(msg=msg, **params):
+            record = self.report.add_assertion(msg)
+            try:
+                yield
+            except self.failureException as e:
+                record['outcome'] = 'failed'
+                record['message'] = str(e)
+                raise
+            except Exception as e:
+                record['outcome'] = 'error'
+                record['message'] = f"{type(e).__name__}: {e}"
+                raise
+
+    def check(self):
+        try:
+            plan = open_plan(self.test_file_path, self.plan_cache)
+            configure_h2(plan.protocols)
+            cases = select_cases(plan, self.shard, self.timings_path)
+            for case, response in execute_cases(cases, self.concurrency, plan.rateLimits):
+                self.do_test_case(case, response)
+        except TestFileError as e:
+            print(f"\n❌ Invalid test file")
+            print(f"  {e}")
+            self.fail(str(e))
+
+    # Test each endpoint
+    def do_test_endpoint(self, host, endpoint, index=0):
+        for case in endpoint_cases(host, endpoint, index, self.collectionHeaders):
+            print(f"\n  → Testing: {case.method} {host}{case.path}")
+            response = fetch_case(case)
+            self.do_test_case(case, response, announce=False)
+
+
+class EventLog:
+    """Writes run events as JSON lines through a large write buffer."""
+
+    def __init__(self, path, buffer_size=1 << 20):
+        self.path = path
+        self.f = open(path, 'w', encoding='utf-8', buffering=buffer_size)
+
+    def handle(self, event):
+        self.f.write(json.dumps(event, separators=(',', ':')) + '\n')
+
+    def close(self):
+        self.f.close()
+
+
+class ConsoleRenderer:
+    """Renders run events as human readable output.
+
+    ``verbose`` prints every case and check, ``fail-only`` only the cases
+    with a failing check, and ``quiet`` nothing but the final summary.
+    """
+
+    MODES = ('verbose', 'fail-only', 'quiet')
+
+    def __init__(self, mode='verbose', stream=None):
+        self.mode = mode
+        self.stream = stream or sys.stdout
+        self.latency = RunReport()
+        self.failures = []
+        self.header = None
+
+    def write(self, text):
+        self.stream.write(text + '\n')
+
+    def handle(self, event):
+        kind = event['event']
+        if kind == 'case_start':
+            self.header = f"\n  → Testing: {event['method']} {event['host']}{event['path']}"
+            if self.mode == 'verbose':
+                self.write(self.header)
+                self.header = None
+        elif kind == 'assertion':
+            failed = event['outcome'] != 'passed'
+            if self.mode == 'verbose' or (failed and self.mode == 'fail-only'):
+                if self.header is not None:
+                    self.write(self.header)
+                    self.header = None
+                for line in event['lines']:
+                    self.write(line)
+                if failed and not event['lines']:
+                    self.write(f"    ❌ {event.get('message', event['outcome'])}")
+        elif kind == 'timing':
+            self.latency.cases.append(event)
+        elif kind == 'case_result':
+            if event['outcome'] != 'passed':
+                self.failures.append(event)
+        elif kind == 'error':
+            self.write(f"\n❌ {event['title']}")
+            self.write(f"  {event['message']}")
+        elif kind == 'run_end':
+            self.write("\n" + "="*60)
+            self.write(f"Total assertions passed: {event['totalAssertions']}")
+            self.write(f"Cases: {event['passedCases']} passed, {event['failedCases']} failed "
+                       f"in {event['elapsedMs'] / 1000:.2f}s")
+            self.write("="*60)
+            if self.mode != 'quiet':
+                self.stream.flush()
+                self.latency.print_summary()
+            if self.failures:
+                self.write("\nFailed cases:")
+                for failure in self.failures:
+                    self.write(f"  ✗ {failure['case']}: {', '.join(failure['failedAssertions'])}")
+
+    def close(self):
+        self.stream.flush()
+
+
+class NativeRunner(CaseAssertions):
+    """Runs the cases of a test file without unittest.
+
+    Every case passes or fails on its own. Progress is published as events
+    (``run_start``, ``case_start``, ``timing``, ``assertion``,
+    ``case_result``, ``run_end`` and ``error``) to sinks such as EventLog and
+    ConsoleRenderer instead of being printed by the checks.
+    """
+
+    failureException = AssertionError
+
+    def __init__(self, test_file, sinks, concurrency=1, shard=None, timings_path=None, plan_cache=None):
+        self.test_file = test_file
+        self.sinks = list(sinks)
+        self.concurrency = max(1, concurrency)
+        self.shard = shard
+        self.timings_path = timings_path
+        self.plan_cache = plan_cache
+        self.report = RunReport()
+        self.totalAssertions = 0
+        self.counts = None
+        self._lines = None
+
+    def emit(self, event, **fields):
+        fields = {'event': event, **fields}
+        for sink in self.sinks:
+            sink.handle(fields)
+
+    def log(self, text):
+        if self._lines is not None:
+            self._lines.append(text)
+
+    def fail(self, msg=None):
+        raise self.failureException(msg)
+
+    @contextmanager
+    def subTest(self, msg=None, **params):
+        """Record one check; a failure ends the check but not the case"""
+        record = self.report.add_assertion(msg)
+        checks = self.totalAssertions
+        self._lines = lines = []
+        try:
+            yield
+        except self.failureException as e:
+            record['outcome'] = 'failed'
+            record['message'] = str(e)
+        except Exception as e:
+            record['outcome'] = 'error'
+            record['message'] = f"{type(e).__name__}: {e}"
+        finally:
+            self._lines = None
+        if record['outcome'] != 'passed':
+            self.counts['failed'].append(msg.rsplit(' => ', 1)[-1])
+        self.counts['checks'] += self.totalAssertions - checks
+        event = {'case': self.counts['case'], 'name': msg, 'outcome': record['outcome'],
+                 'checks': self.totalAssertions - checks, 'lines': lines}
+        if 'message' in record:
+            event['message'] = record['message']
+        self.emit('assertion', **event)
+
+    def run_case(self, case, response):
+        """Check one case; True when all of its checks passed"""
+        case_id = case.case_id
+        self.counts = {'case': case_id, 'checks': 0, 'failed': []}
+        self.emit('case_start', case=case_id, position=case.position, host=case.host,
+                  method=case.method, path=case.path)
+        if isinstance(response, Exception):
+            # The request itself failed; the case fails without checking anything
+            request_id = getattr(response, 'request_id', None)
+            self.report.start_case(case, None, request_ids=[request_id] if request_id else None)
+            with self.subTest(msg=f'{case.test_name} => Request'):
+                raise response
+        else:
+            timing = {'case': case_id, 'host': case.host, 'endpoint': case.endpoint_name,
+                      'timing': response.timing.as_dict()}
+            samples = getattr(response, 'samples', None)
+            if samples and len(samples) > 1:
+                timing['samplesMs'] = [round(sample * 1000, 3) for sample in samples]
+            self.emit('timing', **timing)
+            self.do_test_case(case, response, announce=False)
+        failed = self.counts['failed']
+        self.emit('case_result', case=case_id, outcome='failed' if failed else 'passed',
+                  checks=self.counts['checks'], failedAssertions=failed)
+        return not failed
+
+    def run(self):
+        """Run every case; True when all of them passed"""
+        start = perf_counter()
+        self.emit('run_start', testFile=self.test_file, concurrency=self.concurrency,
+                  shard=f'{self.shard[0]}/{self.shard[1]}' if self.shard else None)
+        passed = failed = 0
+        ok = True
+        try:
+            plan = open_plan(self.test_file, self.plan_cache)
+            configure_h2(plan.protocols)
+            cases = select_cases(plan, self.shard, self.timings_path)
+            for case, response in execute_cases(cases, self.concurrency, plan.rateLimits, return_errors=True):
+                if self.run_case(case, response):
+                    passed += 1
+                else:
+                    failed += 1
+        except TestFileError as e:
+            self.emit('error', title='Invalid test file', message=str(e))
+            ok = False
+        finally:
+            self.emit('run_end', passedCases=passed, failedCases=failed, totalAssertions=self.totalAssertions,
+                      failedAssertions=self.report.failed(), elapsedMs=round((perf_counter() - start) * 1000, 3))
+            for sink in self.sinks:
+                sink.close()
+        return ok and failed == 0
+
+
+# Shared connections of the run, replaced by configure_pool() and configure_h2()
+connection_pool = ConnectionPool()
+h2_pool = H2Pool()
+
+
+def configure_h2(protocols):
+    """Route the hosts of a plan's ``protocols`` over HTTP/2, closing earlier connections."""
+    global h2_pool
+    h2_pool.close()
+    h2_pool = H2Pool(protocols, BASE_URL)
+    return h2_pool
+
+
+def print_h2_summary():
+    """Print the HTTP/2 connections of the run, if any host used one."""
+    lines = h2_pool.summary()
+    if lines:
+        print("\nHTTP/2 streams:")
+        print("\n".join(lines))
+
+
+def configure_pool(pool_size=10, per_host=False, keep_alive=True):
+    """Replace the shared connection pool, closing the previous one."""
+    global connection_pool
+    connection_pool.close()
+    connection_pool = ConnectionPool(pool_size=pool_size, per_host=per_host, keep_alive=keep_alive)
+    return connection_pool
+
+
+# Where the proxy under test listens, see --base-url
+BASE_URL = "http://localhost"
+
+# Request IDs are <RUN_ID>-<n>, unique within the run and across the shards of a suite
+RUN_ID = uuid.uuid4().hex[:8]
+_request_numbers = itertools.count(1)
+
+# nginxlogs.LogCapture following the nginx container while tests run, see --nginx-logs
+nginx_logs = None
+
+# Container name prefixes of the suite's nginx and mock, see --container-prefix
+CONTAINER_PREFIX = "httptests"
+MOCK_PREFIX = "httptests"
+
+
+def wait_for_service(max_wait=60, check_interval=2, suite_dir=None):
+    """Wait for the proxy, declared hosts and upstream aliases to be ready
+
+    Components are probed concurrently with exponential backoff capped at
+    check_interval; see readiness.py for what is probed.
+    """
+    base_url = BASE_URL
     start_time = time()
-    attempt = 0
     
     print(f"🔍 Waiting for service to be ready (max {max_wait}s)...")
     sys.stdout.flush()
     
-    while time() - start_time < max_wait:
-        attempt += 1
-        try:
-            # Try a simple connection to the service
-            response = requests.get(f"{base_url}/", timeout=2)
-            print(f"✅ Service is ready! (took {time() - start_time:.1f}s)\n")
-            sys.stdout.flush()
-            return True
-        except requests.exceptions.ConnectionError:
-            elapsed = time() - start_time
-            print(f"  Attempt {attempt}: Service not ready yet ({elapsed:.1f}s elapsed)...")
-            sleep(check_interval)
-        except Exception as e:
-            print(f"  Attempt {attempt}: Unexpected error: {e}")
-            sleep(check_interval)
+    config = readiness.load_suite_config(suite_dir) if suite_dir else {}
+    components = readiness.build_components(base_url, connection_pool.request, config,
+                                            mock_container=f"{MOCK_PREFIX}_mock",
+                                            forwarder_container=f"{MOCK_PREFIX}_forwarder_{{port}}")
+    if readiness.wait_until_ready(components, max_wait=max_wait, max_interval=check_interval):
+        print(f"✅ Service is ready! (took {time() - start_time:.1f}s)\n")
+        sys.stdout.flush()
+        return True
     
     print(f"\n❌ ERROR: Service failed to become ready after {max_wait}s")
     
@@ -201,7 +1570,7 @@ def wait_for_service(max_wait=60, check_interval=2):
     sys.stdout.flush()
     try:
         result = subprocess.run(
-            ['docker', 'logs', 'httptests_nginx'],
+            ['docker', 'logs', f'{CONTAINER_PREFIX}_nginx'],
             capture_output=True,
             text=True,
             timeout=10
@@ -242,30 +1611,268 @@ def wait_for_service(max_wait=60, check_interval=2):
     
     return False
 
-def request(host, path, method, additionalRequestHeaders, data):
-    headers = {**{'Host': host}, **additionalRequestHeaders}
-    base = "http://localhost"
-    url = '%s%s' % (base, path)
+def request(host, path, method, additionalRequestHeaders, data, keep_alive=None, report_errors=True, body_plan=None):
+    """Send a request through the shared pool.
+
+    Without ``body_plan`` the whole body is downloaded into ``r.text``. With
+    one it is streamed and only summarized into ``r.body``, see read_body.
+    Every request gets a unique ID, returned in ``r.request_id`` (or on the
+    exception) to find its nginx log lines. It is only sent, in the
+    X-HTTPTests-Request-Id header, while nginx logs are captured.
+    """
+    request_id = '%s-%d' % (RUN_ID, next(_request_numbers))
+    headers = {'Host': host}
+    if nginx_logs is not None:
+        headers[nginxlogs.REQUEST_ID_HEADER] = request_id
+    headers.update(additionalRequestHeaders)
+    url = '%s%s' % (BASE_URL, path)
     
+    timing = Timing()
+    timing_state.current = timing
     try:
-        r = requests.request(method, url, headers=headers, data=data, timeout=10)
+        start = perf_counter()
+        pool = h2_pool if host in h2_pool.protocols else connection_pool
+        r = pool.request(method, url, host=host, keep_alive=keep_alive,
+                         headers=headers, data=data, timeout=10, stream=body_plan is not None)
+        if body_plan is not None:
+            r.body = read_body(r, body_plan)
+        timing.total = perf_counter() - start
+        timing.ttfb = r.elapsed.total_seconds()
+        timing.status = r.status_code
+        timing.request_bytes = request_size(r.request)
+        timing.response_bytes = response_size(r)
+        r.timing = timing
+        r.request_id = request_id
         return r
     except requests.exceptions.ConnectionError as e:
+        e.request_id = request_id
+        if not report_errors:
+            raise
         print(f"\n❌ CONNECTION ERROR")
         print(f"  Target: {method} {url}")
         print(f"  Host header: {host}")
-        print(f"  Error: Failed to connect to localhost:80")
+        print(f"  Error: Failed to connect to {BASE_URL}")
         raise
     except requests.exceptions.Timeout as e:
+        e.request_id = request_id
+        if not report_errors:
+            raise
         print(f"\n❌ TIMEOUT ERROR")
         print(f"  Target: {method} {url}")
         print(f"  The service took too long to respond (>10s)")
         raise
     except Exception as e:
+        e.request_id = request_id
+        if not report_errors:
+            raise
         print(f"\n❌ UNEXPECTED ERROR")
         print(f"  Target: {method} {url}")
         print(f"  Error: {type(e).__name__}: {e}")
         raise
+    finally:
+        timing_state.current = None
+
+def run_load(cases, rate, duration, workers=64):
+    """Drive cases at a fixed request rate with an open-loop scheduler.
+
+    Request ``i`` is due at ``start + i / rate`` regardless of how earlier
+    requests are doing, so a stalled server cannot slow the offered load
+    down. Latency is measured from the time a request was due rather than
+    from when a worker picked it up, which accounts for coordinated
+    omission: time spent queued behind slow requests counts as latency.
+    Cases are cycled in declaration order: ``cases`` is called for a fresh
+    iterator each round, so a streamed test file is never held in memory.
+    """
+    def cycle():
+        while True:
+            empty = True
+            for case in cases():
+                empty = False
+                yield case
+            if empty:
+                raise ValueError("No test cases to drive load against")
+
+    next_case = cycle().__next__
+    total = int(rate * duration)
+    results = []
+    results_lock = threading.Lock()
+
+    def send(case, due):
+        started = perf_counter()
+        status, error = None, None
+        try:
+            response = request(case.host, case.path, case.method, case.headers, case.data,
+                               keep_alive=case.keepAlive, report_errors=False, body_plan=DRAIN_BODY)
+            status = response.status_code
+        except Exception as e:
+            error = type(e).__name__
+        finished = perf_counter()
+        with results_lock:
+            results.append((case.expectedStatus, status, error, (finished - due) * 1000, (finished - started) * 1000))
+
+    lag = []
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='httptests-load')
+    first = next_case() if total else None
+    start = perf_counter()
+    try:
+        for i in range(total):
+            case = first if i == 0 else next_case()
+            due = start + i / rate
+            lag.append(wait_until(due))
+            pool.submit(send, case, due)
+    finally:
+        pool.shutdown(wait=True)
+    elapsed = perf_counter() - start
+
+    latencies = [result[3] for result in results]
+    by_status = {}
+    for expectedStatus, status, error, _, _ in results:
+        entry = by_status.setdefault(str(expectedStatus), {'requests': 0, 'matched': 0, 'mismatched': {}, 'errors': {}})
+        entry['requests'] += 1
+        if error:
+            entry['errors'][error] = entry['errors'].get(error, 0) + 1
+        elif status == expectedStatus:
+            entry['matched'] += 1
+        else:
+            entry['mismatched'][str(status)] = entry['mismatched'].get(str(status), 0) + 1
+    for entry in by_status.values():
+        entry['errorRate'] = round(1 - entry['matched'] / entry['requests'], 6)
+    failed = sum(entry['requests'] - entry['matched'] for entry in by_status.values())
+
+    return {
+        'targetRate': rate,
+        'duration': duration,
+        'requests': len(results),
+        'elapsed': round(elapsed, 3),
+        'throughput': round(len(results) / elapsed, 3) if elapsed else 0,
+        'errorRate': round(failed / len(results), 6) if results else 0,
+        'schedulerLagMs': latency_stats(lag) if lag else None,
+        'latencyMs': latency_stats(latencies) if latencies else None,
+        'serviceTimeMs': latency_stats([result[4] for result in results]) if results else None,
+        'histogramMs': latency_histogram(latencies),
+        'expectedStatus': by_status,
+    }
+
+
+def print_load_report(report):
+    print("\n" + "="*60)
+    print(f"Load test: {report['requests']} requests in {report['elapsed']:.1f}s")
+    print(f"  Target rate: {report['targetRate']:.1f} req/s")
+    print(f"  Throughput:  {report['throughput']:.1f} req/s")
+    print(f"  Error rate:  {report['errorRate'] * 100:.2f}%")
+    for title, key in (('Latency (ms)', 'latencyMs'), ('Service time (ms)', 'serviceTimeMs')):
+        stats = report[key]
+        if stats:
+            print(f"  {title}: min {stats['min']:.1f}  p50 {stats['p50']:.1f}  p95 {stats['p95']:.1f}  "
+                  f"p99 {stats['p99']:.1f}  max {stats['max']:.1f}")
+    print("\n  Expected status breakdown:")
+    for expected, entry in report['expectedStatus'].items():
+        print(f"    {expected}: {entry['matched']}/{entry['requests']} matched ({entry['errorRate'] * 100:.2f}% errors)")
+        for status, count in entry['mismatched'].items():
+            print(f"      got {status}: {count}")
+        for error, count in entry['errors'].items():
+            print(f"      {error}: {count}")
+    print("\n  Latency histogram (ms):")
+    peak = max(report['histogramMs'].values()) or 1
+    for bucket, count in report['histogramMs'].items():
+        if count:
+            print(f"    {bucket:>8} {count:>8} {'#' * max(1, round(40 * count / peak))}")
+    print("="*60)
+
+
+def start_nginx_logs():
+    """Follow the suite's nginx logs while the tests run; see nginxlogs.py."""
+    global nginx_logs
+    capture = nginxlogs.LogCapture(f'{CONTAINER_PREFIX}_nginx', RUN_ID)
+    if capture.start():
+        nginx_logs = capture
+    else:
+        print("⚠️  Docker command not found, nginx logs are not captured")
+
+
+def attach_nginx_logs(report):
+    """Stop following the nginx logs and attach them to the report's cases."""
+    if nginx_logs is None:
+        return
+    nginx_logs.settle()
+    nginx_logs.stop()
+    report.attach_logs(nginx_logs)
+    report.print_logs(nginx_logs)
+
+
+def strip_options(argv, options):
+    """Remove options (with their value) from an argument list."""
+    stripped = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg in options:
+            skip = True
+        elif not any(arg.startswith(option + '=') for option in options):
+            stripped.append(arg)
+    return stripped
+
+
+def run_workers(workers, argv, report_json=None, junit_xml=None, test_file=None, events=None, baseline_record=None):
+    """Run every shard of the suite in its own process and merge their reports.
+
+    Each worker is this script with ``--shard i/N`` and its own partial
+    report and event log. Output of each worker is printed once it finishes,
+    so shards do not interleave; event logs are concatenated in shard order.
+    Returns True when all shards passed.
+    """
+    base = strip_options(argv, ('--workers', '--shard', '--report-json', '--junit-xml', '--events', '--baseline-record'))
+    with tempfile.TemporaryDirectory(prefix='httptests-shards-') as tmp:
+        reports = [os.path.join(tmp, f'shard-{i}.json') for i in range(1, workers + 1)]
+        event_logs = [os.path.join(tmp, f'shard-{i}.jsonl') for i in range(1, workers + 1)]
+        processes = [
+            subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), *base, '--skip-health-check',
+                 '--shard', f'{i}/{workers}', '--report-json', reports[i - 1],
+                 *(['--events', event_logs[i - 1]] if events else [])],
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+            )
+            for i in range(1, workers + 1)
+        ]
+        succeeded = True
+        for i, process in enumerate(processes, 1):
+            output, _ = process.communicate()
+            print(f"\n{'='*60}\nShard {i}/{workers}\n{'='*60}")
+            print(output)
+            succeeded = succeeded and process.returncode == 0
+        if events:
+            with open(events, 'wb') as out:
+                for path in event_logs:
+                    if os.path.isfile(path):
+                        with open(path, 'rb') as f:
+                            shutil.copyfileobj(f, out)
+        return merge_reports([path for path in reports if os.path.isfile(path)], report_json, junit_xml, test_file,
+                             baseline_record if succeeded else None) and succeeded
+
+
+def record_baseline(path, report, test_file=None):
+    """Store the latency samples of a run as baseline for later --baseline-compare runs."""
+    count = baseline.record(path, report.cases, test_file)
+    print(f"Wrote latency baseline of {count} case(s) to: {path}")
+
+
+def merge_reports(paths, report_json=None, junit_xml=None, test_file=None, baseline_record=None):
+    """Merge partial JSON reports, print the combined totals and write merged reports."""
+    report, totalAssertions = RunReport.merge(paths)
+    failed = report.failed()
+    print("\n" + "="*60)
+    print(f"Merged {len(paths)} report(s): {len(report.cases)} case(s)")
+    print(f"Total assertions passed: {totalAssertions}")
+    if failed:
+        print(f"Failed assertions: {failed}")
+    print("="*60)
+    report.print_summary()
+    report.write_reports(totalAssertions, report_json, junit_xml, test_file)
+    if baseline_record and not failed:
+        record_baseline(baseline_record, report, test_file)
+    return failed == 0
+
 
 # Custom test result class that suppresses tracebacks
 class CleanTestResult(unittest.TextTestResult):
@@ -299,7 +1906,29 @@ if __name__ == '__main__':
         '--test-file',
         type=str,
         default='example/.httptests/test.json',
-        help='Path to test.json file (default: example/.httptests/test.json)'
+        help='Path to test.json or test.jsonl file (default: example/.httptests/test.json)'
+    )
+    parser.add_argument(
+        '--base-url',
+        type=str,
+        default=BASE_URL,
+        help='URL of the proxy under test; requests carry the test host in the Host header (default: http://localhost)'
+    )
+    parser.add_argument(
+        '--container-prefix',
+        default=CONTAINER_PREFIX,
+        help='Prefix of the suite\'s container names, <prefix>_nginx (default: httptests)'
+    )
+    parser.add_argument(
+        '--mock-prefix',
+        help='Prefix of the mock\'s container names, <prefix>_mock and <prefix>_forwarder_<port> '
+             '(default: --container-prefix)'
+    )
+    parser.add_argument(
+        '--nginx-logs',
+        action='store_true',
+        help='Follow the nginx container\'s logs during the run and attach the lines and timings of each '
+             'request to its case; sends an X-HTTPTests-Request-Id header with every request'
     )
     parser.add_argument(
         '--wait-timeout',
@@ -312,22 +1941,255 @@ if __name__ == '__main__':
         action='store_true',
         help='Skip waiting for service health check'
     )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=1,
+        help='Number of requests to send in parallel (default: 1, sequential)'
+    )
+    parser.add_argument(
+        '--pool-size',
+        type=int,
+        default=10,
+        help='Maximum number of keep-alive connections kept open (default: 10)'
+    )
+    parser.add_argument(
+        '--pool-per-host',
+        action='store_true',
+        help='Only reuse connections between requests for the same Host header'
+    )
+    parser.add_argument(
+        '--no-keep-alive',
+        action='store_true',
+        help='Send "Connection: close" with every request'
+    )
+    parser.add_argument(
+        '--report-json',
+        type=str,
+        help='Write a JSON report with per-request timings and latency summary to this path'
+    )
+    parser.add_argument(
+        '--junit-xml',
+        type=str,
+        help='Write a JUnit XML report with timings attached to each subTest to this path'
+    )
+    parser.add_argument(
+        '--load',
+        action='store_true',
+        help='Drive the endpoints of the test file at a fixed rate instead of running assertions'
+    )
+    parser.add_argument(
+        '--rate',
+        type=float,
+        default=50,
+        help='Load mode: requests per second to offer (default: 50)'
+    )
+    parser.add_argument(
+        '--duration',
+        type=float,
+        default=10,
+        help='Load mode: seconds to generate load for (default: 10)'
+    )
+    parser.add_argument(
+        '--load-workers',
+        type=int,
+        default=64,
+        help='Load mode: maximum requests in flight (default: 64)'
+    )
+    parser.add_argument(
+        '--max-error-rate',
+        type=float,
+        help='Load mode: fail when the share of unexpected responses exceeds this fraction'
+    )
+    parser.add_argument(
+        '--shard',
+        type=parse_shard,
+        help='Only run shard i of N of the test cases, e.g. 2/4'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Split the test cases across N worker processes and merge their reports'
+    )
+    parser.add_argument(
+        '--timings',
+        type=str,
+        help='JSON report of an earlier run used to balance shards by case duration'
+    )
+    parser.add_argument(
+        '--merge-reports',
+        nargs='+',
+        metavar='REPORT',
+        help='Merge JSON reports of shards into --report-json/--junit-xml and exit'
+    )
+    parser.add_argument(
+        '--plan-cache',
+        type=str,
+        help='Directory to cache the compiled test plan in; reused while the test file is unchanged'
+    )
+    parser.add_argument(
+        '--runner',
+        choices=['native', 'unittest'],
+        default='native',
+        help='Run cases with the native runner (default) or as subTests of a single unittest test'
+    )
+    parser.add_argument(
+        '--events',
+        type=str,
+        help='Write run events (case start, timing, assertions, case results) as JSON lines to this path'
+    )
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument(
+        '--quiet',
+        action='store_true',
+        help='Native runner: only print the final summary'
+    )
+    output.add_argument(
+        '--fail-only',
+        action='store_true',
+        help='Native runner: only print cases with failing checks'
+    )
+    parser.add_argument(
+        '--baseline-record',
+        type=str,
+        metavar='PATH',
+        help='After a passing run, store the latency samples of every case as baseline in PATH'
+    )
+    parser.add_argument(
+        '--baseline-compare',
+        type=str,
+        metavar='PATH',
+        help='Fail cases whose latency regressed significantly against the baseline in PATH'
+    )
+    parser.add_argument(
+        '--regression-alpha',
+        type=float,
+        default=0.01,
+        help='Significance level of the baseline comparison (default: 0.01)'
+    )
+    parser.add_argument(
+        '--regression-threshold-ms',
+        type=float,
+        default=5.0,
+        help='Smallest latency increase in ms that counts as regression (default: 5)'
+    )
+    parser.add_argument(
+        '--regression-threshold-pct',
+        type=float,
+        default=10.0,
+        help='Smallest latency increase in percent of the baseline median that counts as regression (default: 10)'
+    )
+    parser.add_argument(
+        '--min-repeat',
+        type=int,
+        default=1,
+        help='Measure every case at least this many times, e.g. for baselines (default: 1)'
+    )
+    parser.add_argument(
+        '--max-inspect-bytes',
+        type=int,
+        default=MAX_INSPECT_BYTES,
+        help='Largest response body parsed as echo JSON for request header checks (default: 8MB)'
+    )
     args, unittest_args = parser.parse_known_args()
+
+    # read_body, fetch_case and request look these up at call time
+    MAX_INSPECT_BYTES = args.max_inspect_bytes
+    BASE_URL = args.base_url.rstrip('/')
+    CONTAINER_PREFIX = args.container_prefix
+    MOCK_PREFIX = args.mock_prefix or args.container_prefix
+    MIN_REPEAT = max(1, args.min_repeat)
+
+    if args.baseline_compare:
+        try:
+            CaseAssertions.regression_baseline = baseline.Baseline.load(
+                args.baseline_compare, alpha=args.regression_alpha, threshold_ms=args.regression_threshold_ms,
+                threshold_pct=args.regression_threshold_pct)
+        except baseline.BaselineError as e:
+            print(f"❌ Invalid baseline: {e}")
+            sys.exit(1)
+
+    def finish_baseline(report, succeeded):
+        """Print the worst offenders against the baseline and record a new one."""
+        if CaseAssertions.regression_baseline is not None:
+            lines = CaseAssertions.regression_baseline.table()
+            print("\n" + "\n".join(lines) if lines else
+                  f"\nNo case has {baseline.MIN_SAMPLES}+ samples here and in the baseline; use repeat or --min-repeat")
+        if args.baseline_record and succeeded:
+            record_baseline(args.baseline_record, report, args.test_file)
+
+    if args.merge_reports:
+        sys.exit(0 if merge_reports(args.merge_reports, args.report_json, args.junit_xml) else 1)
+
+    # Keep enough idle connections around for every concurrent worker
+    configure_pool(
+        pool_size=max(args.pool_size, args.load_workers if args.load else args.concurrency),
+        per_host=args.pool_per_host,
+        keep_alive=not args.no_keep_alive,
+    )
     
     # Wait for service to be ready
     if not args.skip_health_check:
-        if not wait_for_service(max_wait=args.wait_timeout):
+        if not wait_for_service(max_wait=args.wait_timeout, suite_dir=os.path.dirname(os.path.abspath(args.test_file))):
             print("\n❌ Aborting tests - service is not ready")
             sys.exit(1)
     
+    if args.load:
+        plan = open_plan(args.test_file, args.plan_cache)
+        configure_h2(plan.protocols)
+        print(f"🚀 Generating load: {args.rate:g} req/s for {args.duration:g}s")
+        sys.stdout.flush()
+        load_report = run_load(plan.cases, args.rate, args.duration, args.load_workers)
+        print_load_report(load_report)
+        print_h2_summary()
+        if args.report_json:
+            with open(args.report_json, 'w', encoding='utf-8') as f:
+                json.dump(load_report, f, indent=2)
+            print(f"Wrote JSON report to: {args.report_json}")
+        if args.max_error_rate is not None and load_report['errorRate'] > args.max_error_rate:
+            print(f"\n❌ Error rate {load_report['errorRate'] * 100:.2f}% exceeds {args.max_error_rate * 100:.2f}%")
+            sys.exit(1)
+        sys.exit(0)
+
+    if args.workers > 1:
+        succeeded = run_workers(args.workers, sys.argv[1:], args.report_json, args.junit_xml, args.test_file,
+                                args.events, args.baseline_record)
+        sys.exit(0 if succeeded else 1)
+
+    if args.nginx_logs:
+        start_nginx_logs()
+
+    if args.runner == 'native':
+        sinks = [ConsoleRenderer('quiet' if args.quiet else 'fail-only' if args.fail_only else 'verbose')]
+        if args.events:
+            sinks.append(EventLog(args.events))
+        runner = NativeRunner(args.test_file, sinks, concurrency=args.concurrency, shard=args.shard,
+                              timings_path=args.timings, plan_cache=args.plan_cache)
+        succeeded = runner.run()
+        print_h2_summary()
+        attach_nginx_logs(runner.report)
+        runner.report.write_reports(runner.totalAssertions, args.report_json, args.junit_xml, args.test_file)
+        finish_baseline(runner.report, succeeded)
+        sys.exit(0 if succeeded else 1)
+    if args.events or args.quiet or args.fail_only:
+        parser.error('--events, --quiet and --fail-only need --runner native')
+
     # Set the test file path before running tests
     IntegrationTests.test_file_path = args.test_file
+    IntegrationTests.concurrency = max(1, args.concurrency)
+    IntegrationTests.report_json_path = args.report_json
+    IntegrationTests.junit_xml_path = args.junit_xml
+    IntegrationTests.shard = args.shard
+    IntegrationTests.timings_path = args.timings
+    IntegrationTests.plan_cache = args.plan_cache
     
     # Run tests with custom runner that suppresses tracebacks
     loader = unittest.TestLoader()
     suite = loader.loadTestsFromTestCase(IntegrationTests)
     runner = CleanTestRunner(verbosity=2)
     result = runner.run(suite)
+    finish_baseline(IntegrationTests.report, result.wasSuccessful())
     
     # Exit with appropriate code
     sys.exit(0 if result.wasSuccessful() else 1)
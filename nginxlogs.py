@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""nginx logs of a test run, matched to the requests that caused them.
+
+While logs are captured, every request of a run carries a unique ID
+(``<run>-<n>``) in the ``X-HTTPTests-Request-Id`` header. nginx's default
+``combined`` format does not record it; a ``log_format`` with
+``$http_x_httptests_request_id`` (see below) does. ``docker logs -f`` of
+the nginx container is read while the tests run and access log lines are
+indexed by request ID. Error log lines carry no headers; they are matched
+by the method, host and path in their ``request:`` and ``host:`` fields.
+
+With a log format that records ``$request_time`` and
+``$upstream_response_time`` the time nginx spent on a request is split
+into proxy and upstream time. Key/value formats (``rt=$request_time
+urt="$upstream_response_time"``) and JSON formats (``"request_time"``,
+``"upstream_response_time"``) are understood, e.g.:
+
+    log_format httptests '$remote_addr "$request" $status "$http_user_agent" '
+                         'rid=$http_x_httptests_request_id rt=$request_time urt="$upstream_response_time"';
+    access_log /dev/stdout httptests;
+"""
+import re
+import subprocess
+import threading
+from time import monotonic, sleep
+from typing import Any, Dict, List, Optional, Tuple
+
+REQUEST_ID_HEADER = "X-HTTPTests-Request-Id"
+
+# Log lines kept per request and per (method, host, path) of error lines
+MAX_LINES = 50
+
+REQUEST_TIME = re.compile(r'(?:\brt|\brequest_time)"?\s*[=:]\s*"?(\d+(?:\.\d+)?)')
+UPSTREAM_TIME = re.compile(r'(?:\burt|\bupstream_response_time)"?\s*[=:]\s*"?([\d.]+(?:\s*[,:]\s*[\d.]+)*)')
+ERROR_REQUEST = re.compile(r'request: "(\S+) (\S+)[^"]*"')
+ERROR_HOST = re.compile(r'host: "([^"]+)"')
+
+
+def upstream_seconds(value: str) -> float:
+    """Total of an $upstream_response_time value; one entry per upstream tried (', ') or redirect (' : ')"""
+    return sum(float(part) for part in re.split(r"\s*[,:]\s*", value) if part)
+
+
+class LogEntry:
+    """An access log line of one request, with the timings found in it"""
+
+    __slots__ = ("line", "request_time", "upstream_time")
+
+    def __init__(self, line: str):
+        self.line = line
+        match = REQUEST_TIME.search(line)
+        self.request_time: Optional[float] = float(match.group(1)) if match else None
+        match = UPSTREAM_TIME.search(line)
+        self.upstream_time: Optional[float] = upstream_seconds(match.group(1)) if match else None
+
+
+class LogCapture:
+    """Follows a container's logs in the background and indexes them by request ID"""
+
+    def __init__(self, container: str, run_id: str):
+        self.container = container
+        self.id_pattern = re.compile(re.escape(run_id) + r"-\d+")
+        self.access: Dict[str, List[LogEntry]] = {}
+        self.errors: Dict[Tuple[str, str, str], List[str]] = {}
+        self.lines = 0
+        self.last_line = monotonic()
+        self.lock = threading.Lock()
+        self.process: Optional[subprocess.Popen] = None
+        self.threads: List[threading.Thread] = []
+
+    def start(self) -> bool:
+        """Start following the logs; False when docker is not available"""
+        try:
+            # --tail 0: only lines written from now on
+            self.process = subprocess.Popen(["docker", "logs", "-f", "--tail", "0", self.container],
+                                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=1,
+                                            text=True, errors="replace")
+        except OSError:
+            return False
+        # The nginx image logs access lines to stdout and error lines to stderr; either may carry both
+        for stream in (self.process.stdout, self.process.stderr):
+            thread = threading.Thread(target=self._read, args=(stream,), name="httptests-nginx-logs", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return True
+
+    def _read(self, stream) -> None:
+        for line in stream:
+            self.add(line.rstrip("\n"))
+
+    def add(self, line: str) -> None:
+        match = self.id_pattern.search(line)
+        with self.lock:
+            self.lines += 1
+            self.last_line = monotonic()
+            if match:
+                entries = self.access.setdefault(match.group(0), [])
+                if len(entries) < MAX_LINES:
+                    entries.append(LogEntry(line))
+                return
+            request = ERROR_REQUEST.search(line)
+            host = ERROR_HOST.search(line)
+            if request:
+                key = (request.group(1), host.group(1) if host else "", request.group(2))
+                lines = self.errors.setdefault(key, [])
+                if len(lines) < MAX_LINES:
+                    lines.append(line)
+
+    def settle(self, quiet: float = 0.3, timeout: float = 3.0) -> None:
+        """Wait until no line arrived for ``quiet`` seconds, so lines of the last requests are in"""
+        deadline = monotonic() + timeout
+        while monotonic() < deadline and self.process is not None and self.process.poll() is None:
+            with self.lock:
+                idle = monotonic() - self.last_line
+            if idle >= quiet:
+                return
+            sleep(quiet - idle)
+
+    def stop(self) -> None:
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        for thread in self.threads:
+            thread.join(timeout=1)
+
+    def lookup(self, request_ids: List[str], method: str, host: str, path: str) -> Dict[str, Any]:
+        """Log lines and nginx timings of a case's requests"""
+        requests = []
+        lines: List[str] = []
+        with self.lock:
+            for request_id in request_ids:
+                entries = self.access.get(request_id, [])
+                lines.extend(entry.line for entry in entries)
+                timed = next((entry for entry in entries if entry.request_time is not None), None)
+                requests.append({
+                    "id": request_id,
+                    "logged": bool(entries),
+                    "requestTimeMs": round(timed.request_time * 1000, 3) if timed else None,
+                    "upstreamTimeMs": (round(timed.upstream_time * 1000, 3)
+                                       if timed and timed.upstream_time is not None else None),
+                })
+            errors = list(self.errors.get((method, host, path), []))
+        return {"requests": requests, "accessLines": lines[:MAX_LINES], "errorLines": errors}
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Path templates of test.json, expanded lazily while a suite runs.
+
+Entries of an endpoint's ``paths`` can hold groups that expand into many
+concrete paths:
+
+    "/api/v1/items/{1..5000}"                 # numeric range
+    "/pages/{001..100..10}"                   # range with step, zero-padded
+    "/{en,de,fr}/{home,about,contact}"        # lists, cartesian product
+    {"expand": "/users/{1..1000000}", "sample": 200, "seed": 42}
+
+Braces that hold neither ``..`` nor ``,`` (e.g. ``/items/{id}``) stay
+literal. No expansion is materialized: any concrete path is computed from
+its index in the product, so sampling a huge template stays cheap.
+"""
+import itertools
+import random
+import re
+from typing import Any, Iterator, List, Optional, Sequence, Union
+
+# {start..end[..step]} numeric ranges and {a,b,c} lists inside a path
+PATH_GROUP = re.compile(r"\{([^{}]*)\}")
+PATH_RANGE = re.compile(r"(-?\d+)\.\.(-?\d+)(?:\.\.(-?\d+))?")
+
+
+class NumberRange:
+    """Numbers of a {start..end..step} group as strings, zero-padded like {001..100}"""
+
+    __slots__ = ("numbers", "width")
+
+    def __init__(self, start: int, end: int, step: Optional[int] = None, width: int = 0):
+        step = abs(step or 1) * (1 if end >= start else -1)
+        self.numbers = range(start, end + (1 if step > 0 else -1), step)
+        self.width = width
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def __getitem__(self, index: int) -> str:
+        return str(self.numbers[index]).zfill(self.width)
+
+
+def parse_path_group(text: str) -> Optional[Sequence[str]]:
+    """Choices of a {...} group, or None when it is a literal (no range and no comma)"""
+    match = PATH_RANGE.fullmatch(text)
+    if match:
+        start, end, step = match.group(1), match.group(2), match.group(3)
+        padded = any(len(n.lstrip("-")) > 1 and n.lstrip("-").startswith("0") for n in (start, end))
+        width = max(len(start), len(end)) if padded else 0
+        if step is not None and int(step) == 0:
+            raise ValueError(f"range step must not be 0 in '{{{text}}}'")
+        return NumberRange(int(start), int(end), int(step) if step else None, width)
+    if "," in text:
+        return tuple(text.split(","))
+    return None
+
+
+class PathTemplate:
+    """A path with {a..b} ranges and {x,y} lists, expanded lazily into the cartesian product.
+
+    Any concrete path can be computed from its index, so a seeded ``sample``
+    draws indexes without enumerating the whole product.
+    """
+
+    __slots__ = ("template", "parts", "choices", "size", "sample", "seed")
+
+    def __init__(self, template: str, sample: Optional[int] = None, seed: Any = 0):
+        self.template = template
+        self.parts: List[str] = []  # literal text around the groups, len(choices) + 1 entries
+        self.choices: List[Sequence[str]] = []
+        literal = ""
+        position = 0
+        for match in PATH_GROUP.finditer(template):
+            choices = parse_path_group(match.group(1))
+            if choices is None:
+                continue
+            literal += template[position:match.start()]
+            self.parts.append(literal)
+            self.choices.append(choices)
+            literal = ""
+            position = match.end()
+        self.parts.append(literal + template[position:])
+        self.size = 1
+        for choices in self.choices:
+            self.size *= len(choices)
+        self.sample = min(sample, self.size) if sample is not None else None
+        self.seed = seed
+
+    @classmethod
+    def compile(cls, entry: Any) -> Union[str, "PathTemplate"]:
+        """A path entry of test.json: a string, or {"expand": ..., "sample": N, "seed": S}"""
+        if isinstance(entry, str):
+            if "{" not in entry:
+                return entry
+            template = cls(entry)
+            return template if template.choices else entry
+        if isinstance(entry, dict) and isinstance(entry.get("expand"), str):
+            sample = entry.get("sample")
+            if sample is not None and (not isinstance(sample, int) or sample < 0):
+                raise ValueError("'sample' must be a non-negative integer")
+            return cls(entry["expand"], sample, entry.get("seed", 0))
+        raise ValueError(f"invalid path {entry!r}, expected a string or an object with 'expand'")
+
+    def __len__(self) -> int:
+        return self.size if self.sample is None else self.sample
+
+    def __getitem__(self, index: int) -> str:
+        """The concrete path at an index of the full product; the last group varies fastest"""
+        values = []
+        for choices in reversed(self.choices):
+            index, remainder = divmod(index, len(choices))
+            values.append(choices[remainder])
+        values.reverse()
+        return "".join(part + value for part, value in zip(self.parts, values)) + self.parts[-1]
+
+    def __iter__(self) -> Iterator[str]:
+        if self.sample is None:
+            for values in itertools.product(*self.choices):
+                yield "".join(part + value for part, value in zip(self.parts, values)) + self.parts[-1]
+        else:
+            for index in sorted(random.Random(self.seed).sample(range(self.size), self.sample)):
+                yield self[index]
+
+
+class PathSet:
+    """The paths of an endpoint: plain strings and templates expanded on iteration"""
+
+    __slots__ = ("entries",)
+
+    def __init__(self, paths: Sequence[Any]):
+        self.entries = tuple(PathTemplate.compile(entry) for entry in paths)
+
+    def __len__(self) -> int:
+        return sum(1 if isinstance(entry, str) else len(entry) for entry in self.entries)
+
+    def __iter__(self) -> Iterator[str]:
+        for entry in self.entries:
+            if isinstance(entry, str):
+                yield entry
+            else:
+                yield from entry
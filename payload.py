@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Request bodies generated in chunks instead of held in memory.
+
+An endpoint's ``payload`` describes where the body comes from:
+
+    "payload": {
+      "size": 1073741824,
+      "source": "seeded",      # random | seeded | zero | file
+      "seed": 42,              # seeded only
+      "path": "fixtures/big",  # file only (memory-mapped; size defaults to the file size)
+      "chunked": false,        # Transfer-Encoding: chunked instead of Content-Length
+      "chunkSize": 1048576,
+      "cache": false,          # build the body once and reuse it for every request
+      "verifyChecksum": true   # compare the body's SHA-256 with what the echo upstream received
+    }
+
+The seeded source produces printable ASCII so the body survives the echo
+upstream's JSON round trip unchanged.
+"""
+import hashlib
+import mmap
+import os
+import random
+import threading
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+SOURCES = ("random", "seeded", "zero", "file")
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# generatePayloadSize bodies up to this size are built once and reused
+LEGACY_CACHE_LIMIT = 16 * 1024 * 1024
+
+# Maps every byte onto 64 URL-safe characters
+ASCII_TABLE = bytes.maketrans(bytes(range(256)),
+                              b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_" * 4)
+
+_cache: Dict[Tuple[Any, ...], Tuple[bytes, str]] = {}
+_cache_lock = threading.Lock()
+
+
+class PayloadSpec:
+    """Validated ``payload`` settings of an endpoint"""
+
+    __slots__ = ("size", "source", "seed", "path", "chunked", "chunkSize", "cache", "verifyChecksum")
+
+    def __init__(self, spec: Dict[str, Any], base_dir: str = "."):
+        self.source = spec.get("source", "random")
+        if self.source not in SOURCES:
+            raise ValueError(f"payload source must be one of {', '.join(SOURCES)}, got {self.source!r}")
+        self.path = None
+        if self.source == "file":
+            if not spec.get("path"):
+                raise ValueError("payload source 'file' needs a 'path'")
+            self.path = os.path.join(base_dir, spec["path"])
+        self.size = spec.get("size")
+        if self.size is None and self.path and os.path.isfile(self.path):
+            self.size = os.path.getsize(self.path)
+        if not isinstance(self.size, int) or self.size < 0:
+            raise ValueError("payload 'size' must be a non-negative integer")
+        self.seed = spec.get("seed", 0)
+        self.chunked = bool(spec.get("chunked", False))
+        self.chunkSize = int(spec.get("chunkSize", DEFAULT_CHUNK_SIZE))
+        if self.chunkSize <= 0:
+            raise ValueError("payload 'chunkSize' must be positive")
+        self.cache = bool(spec.get("cache", False))
+        self.verifyChecksum = bool(spec.get("verifyChecksum", False))
+
+    @classmethod
+    def from_endpoint(cls, endpoint: Dict[str, Any], base_dir: str = ".") -> Optional["PayloadSpec"]:
+        """The payload of an endpoint; generatePayloadSize is a random payload"""
+        if endpoint.get("payload") is not None:
+            if not isinstance(endpoint["payload"], dict):
+                raise ValueError("'payload' must be an object")
+            return cls(endpoint["payload"], base_dir)
+        size = endpoint.get("generatePayloadSize")
+        if size:
+            return cls({"size": size, "source": "random", "cache": size <= LEGACY_CACHE_LIMIT})
+        return None
+
+    def key(self) -> Tuple[Any, ...]:
+        return (self.source, self.size, self.seed, self.path, self.chunkSize)
+
+    def chunks(self) -> Iterator[Union[bytes, memoryview]]:
+        """Generate the body chunk by chunk"""
+        remaining = self.size
+        if self.source == "file":
+            if remaining == 0:
+                return
+            with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if len(mapped) < self.size:
+                    raise ValueError(f"payload file {self.path} has {len(mapped)} bytes, {self.size} requested")
+                for offset in range(0, self.size, self.chunkSize):
+                    yield mapped[offset:min(offset + self.chunkSize, self.size)]
+            return
+        if self.source == "zero":
+            block = bytes(min(self.chunkSize, remaining))
+            while remaining > 0:
+                n = min(len(block), remaining)
+                yield block if n == len(block) else block[:n]
+                remaining -= n
+            return
+        rng = random.Random(self.seed) if self.source == "seeded" else None
+        while remaining > 0:
+            n = min(self.chunkSize, remaining)
+            yield rng.randbytes(n).translate(ASCII_TABLE) if rng else os.urandom(n)
+            remaining -= n
+
+    def cached(self) -> Tuple[bytes, str]:
+        """The whole body and its SHA-256, built once per process"""
+        key = self.key()
+        with _cache_lock:
+            if key not in _cache:
+                body = b"".join(self.chunks())
+                _cache[key] = (body, hashlib.sha256(body).hexdigest())
+            return _cache[key]
+
+    def body(self) -> Union[bytes, "PayloadBody"]:
+        """A fresh body for one request"""
+        if self.size == 0:
+            return b""
+        if self.chunked:
+            return PayloadBody(self)
+        return SizedPayloadBody(self)
+
+
+class PayloadBody:
+    """Body of one request, streamed with chunked transfer encoding.
+
+    Counts the bytes sent and, with verifyChecksum, hashes them on the way.
+    """
+
+    def __init__(self, spec: PayloadSpec):
+        self.spec = spec
+        self.sent = 0
+        self._sha256: Optional[str] = None
+        self._digest = None
+
+    def __iter__(self) -> Iterator[Union[bytes, memoryview]]:
+        self.sent = 0
+        if self.spec.cache:
+            body, self._sha256 = self.spec.cached()
+            view = memoryview(body)
+            chunks = (view[offset:offset + self.spec.chunkSize] for offset in range(0, len(body), self.spec.chunkSize))
+        else:
+            self._digest = hashlib.sha256() if self.spec.verifyChecksum else None
+            chunks = self.spec.chunks()
+        for chunk in chunks:
+            self.sent += len(chunk)
+            if self._digest is not None:
+                self._digest.update(chunk)
+            yield chunk
+
+    @property
+    def sha256(self) -> Optional[str]:
+        """SHA-256 of what was sent, once the body has been streamed"""
+        if self._sha256 is None and self._digest is not None:
+            self._sha256 = self._digest.hexdigest()
+        return self._sha256
+
+
+class SizedPayloadBody(PayloadBody):
+    """Body streamed with a Content-Length (requests sends a Content-Length for sized iterables)"""
+
+    def __len__(self) -> int:
+        return self.spec.size
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""Connections the runner sends requests over, and what each request cost.
+
+- ConnectionPool: keep-alive ``requests`` sessions shared by every request
+  of a run, whose connections record DNS and connect time
+- H2Pool: one multiplexed HTTP/2 connection per host (see h2client.py)
+  for hosts with an h2/h2c ``protocol`` in ``hostOptions``
+
+Both fill in the Timing that the sending thread put in ``timing_state``.
+"""
+import io
+import socket
+import threading
+from datetime import timedelta
+from http import HTTPStatus
+from http.cookiejar import DefaultCookiePolicy
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.response import HTTPResponse
+
+import h2client
+
+# Request bodies given as files are sent in chunks of this size over HTTP/2
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Timing of the request currently being sent by this thread
+timing_state = threading.local()
+
+
+class Timing:
+    """Timings (seconds) and sizes of a single request/response exchange.
+
+    ``dns`` and ``connect`` are only set when the request had to open a new
+    connection; requests on a reused keep-alive connection report zero.
+    Requests of HTTP/2 hosts also record the protocol and their stream ID.
+    """
+
+    __slots__ = ("dns", "connect", "ttfb", "total", "request_bytes", "response_bytes", "status", "new_connection",
+                 "protocol", "stream_id")
+
+    def __init__(self) -> None:
+        self.dns = 0.0
+        self.connect = 0.0
+        self.ttfb = 0.0
+        self.total = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.status = None
+        self.new_connection = False
+        self.protocol = None
+        self.stream_id = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        timing = {
+            "dnsMs": round(self.dns * 1000, 3),
+            "connectMs": round(self.connect * 1000, 3),
+            "ttfbMs": round(self.ttfb * 1000, 3),
+            "totalMs": round(self.total * 1000, 3),
+            "requestBytes": self.request_bytes,
+            "responseBytes": self.response_bytes,
+            "status": self.status,
+            "newConnection": self.new_connection,
+        }
+        if self.protocol:
+            timing["protocol"] = self.protocol
+            timing["streamId"] = self.stream_id
+        return timing
+
+
+class TimedConnectionMixin:
+    """Records DNS and TCP connect time of new connections into the current Timing"""
+
+    def _new_conn(self) -> socket.socket:
+        timing = getattr(timing_state, "current", None)
+        if timing is None:
+            return super()._new_conn()
+        start = perf_counter()
+        try:
+            socket.getaddrinfo(self._dns_host, self.port, 0, socket.SOCK_STREAM)
+        except OSError:
+            pass  # Let the real connect attempt raise the proper error
+        resolved = perf_counter()
+        sock = super()._new_conn()
+        timing.dns = resolved - start
+        timing.connect = perf_counter() - resolved
+        timing.new_connection = True
+        return sock
+
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections report their setup time"""
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+def request_size(prepared: requests.PreparedRequest) -> int:
+    """Approximate bytes on the wire for a prepared request"""
+    size = len(f"{prepared.method} {prepared.path_url} HTTP/1.1\r\n\r\n")
+    size += sum(len(k) + len(str(v)) + 4 for k, v in prepared.headers.items())
+    body = prepared.body
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if isinstance(body, (bytes, bytearray)):
+        size += len(body)
+    elif hasattr(body, "sent"):
+        size += body.sent
+    return size
+
+
+def response_size(response: requests.Response) -> int:
+    """Approximate bytes on the wire for a received response"""
+    size = len(f"HTTP/1.1 {response.status_code} {response.reason}\r\n\r\n")
+    size += sum(len(k) + len(v) + 4 for k, v in response.headers.items())
+    body = getattr(response, "body", None)
+    return size + (body.size if body is not None else len(response.content))
+
+
+class ConnectionPool:
+    """Keep-alive HTTP sessions shared by every request of a run.
+
+    By default all Host headers share one session, so connections to the
+    proxy are reused across virtual hosts. With ``per_host`` each Host header
+    gets its own session and connections are only reused within that host.
+    """
+
+    def __init__(self, pool_size: int = 10, per_host: bool = False, keep_alive: bool = True):
+        self.pool_size = pool_size
+        self.per_host = per_host
+        self.keep_alive = keep_alive
+        self._sessions: Dict[Optional[str], requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def session(self, host: Optional[str] = None) -> requests.Session:
+        key = host if self.per_host else None
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                # Every check must stand on its own, never replay cookies from earlier responses
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                adapter = TimedHTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[key] = session
+            return session
+
+    def request(self, method: str, url: str, host: Optional[str] = None, keep_alive: Optional[bool] = None,
+                headers: Optional[Dict[str, str]] = None, **kwargs: Any) -> requests.Response:
+        headers = dict(headers or {})
+        if keep_alive is None:
+            keep_alive = self.keep_alive
+        if not keep_alive:
+            headers["Connection"] = "close"
+        return self.session(host).request(method, url, headers=headers, **kwargs)
+
+    def close(self) -> None:
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+class H2Pool:
+    """HTTP/2 connections of the hosts with an h2/h2c ``protocol`` in ``hostOptions``, one per host.
+
+    Requests of a host run as concurrent streams on its connection, see
+    h2client.py. Responses are returned as ``requests.Response`` objects, so
+    body reading, checks and timings work as over HTTP/1.1. Connections go to
+    the address of ``base_url`` unless a host's protocol names its own.
+    """
+
+    def __init__(self, protocols: Optional[Dict[str, Any]] = None, base_url: str = "http://localhost"):
+        self.protocols = protocols or {}
+        self.base_url = base_url
+        self._connections: Dict[str, h2client.H2Connection] = {}
+        self._latencies: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def connection(self, host: str) -> h2client.H2Connection:
+        with self._lock:
+            connection = self._connections.get(host)
+            if connection is None:
+                protocol = self.protocols[host]
+                address, port, tls = protocol.target(self.base_url)
+                connection = h2client.H2Connection(address, port, tls=tls, max_streams=protocol.maxStreams,
+                                                   timeout=10)
+                self._connections[host] = connection
+                self._latencies[host] = []
+            return connection
+
+    def request(self, method: str, url: str, host: Optional[str] = None, headers: Optional[Dict[str, str]] = None,
+                data: Any = None, timeout: float = 10, **kwargs: Any) -> requests.Response:
+        prepared = requests.Request(method, url, headers=headers, data=data).prepare()
+        body = prepared.body.encode("utf-8") if isinstance(prepared.body, str) else prepared.body
+        if hasattr(body, "read"):
+            body = iter(lambda: body.read(UPLOAD_CHUNK_SIZE), b"")
+        try:
+            result = self.connection(host).request(method, prepared.path_url, prepared.headers.get("Host", host),
+                                                   prepared.headers.items(), body)
+        except TimeoutError as e:
+            raise requests.exceptions.Timeout(str(e), request=prepared) from None
+        except (h2client.H2Error, OSError) as e:
+            raise requests.exceptions.ConnectionError(str(e), request=prepared) from None
+        with self._lock:
+            self._latencies[host].append(result.total)
+
+        timing = getattr(timing_state, "current", None)
+        if timing is not None:
+            timing.protocol = self.protocols[host].protocol
+            timing.stream_id = result.stream_id
+            if result.new_connection:
+                timing.new_connection = True
+                timing.dns, timing.connect = result.dns, result.connect
+        response = requests.Response()
+        response.status_code = result.status
+        response.headers = requests.structures.CaseInsensitiveDict()
+        for name, value in result.headers:
+            response.headers[name] = f"{response.headers[name]}, {value}" if name in response.headers else value
+        try:
+            response.reason = HTTPStatus(result.status).phrase
+        except ValueError:
+            response.reason = ""
+        # Bodies are buffered by the stream; a urllib3 response decodes Content-Encoding when read
+        response.raw = HTTPResponse(body=io.BytesIO(result.body), headers=response.headers, status=result.status,
+                                    preload_content=False, decode_content=True)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.url = url
+        response.request = prepared
+        response.elapsed = timedelta(seconds=result.ttfb)
+        return response
+
+    def summary(self) -> List[str]:
+        """Lines describing every HTTP/2 connection and the latency of its streams"""
+        lines = []
+        with self._lock:
+            for host, connection in self._connections.items():
+                latencies = sorted(self._latencies[host])
+                p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+                p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000 if latencies else 0
+                limit = connection.server_max_streams
+                lines.append(
+                    f"  {host} ({self.protocols[host].protocol} {connection.host}:{connection.port}): "
+                    f"{connection.requests} stream(s) on {connection.connections} connection(s), "
+                    f"peak {connection.peak_streams} concurrent (server max "
+                    f"{limit if limit is not None and limit < 2 ** 31 else 'unlimited'}"
+                    f"{f', client max {connection.max_streams}' if connection.max_streams else ''}), "
+                    f"stream p50 {p50:.1f}ms p95 {p95:.1f}ms")
+        return lines
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._connections.values():
+                connection.close()
+            self._connections.clear()
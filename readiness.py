@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""Readiness probes for the environment of a test suite.
+
+Each component (the proxy port, hosts declared under ``readiness`` in
+config.yml and the mock's upstream aliases) is probed in its own thread with
+exponential backoff. Probes run in stages: a cheap TCP connect first, then
+the HTTP request once the port accepts connections.
+
+Example config.yml:
+
+    readiness:
+      upstreams: true
+      hosts:
+        api.example.com:
+          path: /health
+          status: [200, 204]
+"""
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+from time import perf_counter, sleep
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+try:
+    import yaml  # type: ignore
+except ImportError:
+    yaml = None
+
+# Statuses nginx returns while an upstream is not reachable yet
+GATEWAY_ERRORS = (502, 503, 504)
+
+ProbeResult = Tuple[bool, str]
+
+
+def load_suite_config(suite_dir: str) -> Dict[str, Any]:
+    """Load config.yml next to test.json, or return empty dict when unavailable"""
+    config_path = os.path.join(suite_dir, "config.yml")
+    if not os.path.isfile(config_path):
+        return {}
+    if yaml is None:
+        print("  ⚠️  PyYAML not installed, ignoring readiness settings in config.yml")
+        return {}
+    with open(config_path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def to_list(value: Any) -> List[Any]:
+    """Convert value to list, handling None and single values"""
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def backoff(initial: float = 0.05, maximum: float = 2.0, factor: float = 2.0):
+    """Yield exponentially growing intervals, capped at maximum"""
+    interval = initial
+    while True:
+        yield interval
+        interval = min(maximum, interval * factor)
+
+
+def tcp_probe(host: str, port: int, timeout: float = 1.0) -> ProbeResult:
+    """Check that a TCP connection can be opened"""
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True, f"tcp {host}:{port} open"
+    except OSError as e:
+        return False, f"tcp {host}:{port}: {e}"
+
+
+def http_probe(send: Callable, url: str, host: Optional[str] = None,
+               statuses: Optional[List[int]] = None, timeout: float = 2.0) -> ProbeResult:
+    """Send a GET request and check its status.
+
+    Without explicit statuses any response except a gateway error counts as
+    ready, since 502/503/504 mean nginx is up but its upstream is not.
+    """
+    headers = {"Host": host} if host else {}
+    try:
+        response = send("GET", url, headers=headers, timeout=timeout)
+    except Exception as e:
+        return False, f"{type(e).__name__}"
+    if statuses:
+        ready = response.status_code in statuses
+    else:
+        ready = response.status_code not in GATEWAY_ERRORS
+    return ready, f"HTTP {response.status_code}"
+
+
+def container_ip(container: str) -> Optional[str]:
+    """IP address of a running container, or None"""
+    try:
+        result = subprocess.run(
+            ["docker", "inspect", "-f",
+             "{{if .State.Running}}{{range .NetworkSettings.Networks}}{{.IPAddress}} {{end}}{{end}}",
+             container],
+            capture_output=True, text=True, timeout=5,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    addresses = result.stdout.split()
+    return addresses[0] if result.returncode == 0 and addresses else None
+
+
+class Component:
+    """Something that has to be ready before tests start, checked in stages"""
+
+    def __init__(self, name: str, stages: List[Callable[[], ProbeResult]]):
+        self.name = name
+        self.stages = stages
+        self.ready_after: Optional[float] = None
+        self.attempts = 0
+        self.detail = "not probed yet"
+
+    def probe(self) -> bool:
+        """Run the current stage and advance when it passes"""
+        self.attempts += 1
+        while self.stages:
+            ready, self.detail = self.stages[0]()
+            if not ready:
+                return False
+            self.stages.pop(0)
+        return True
+
+
+def upstream_stage(container: str, port: int) -> Callable[[], ProbeResult]:
+    def probe() -> ProbeResult:
+        ip = container_ip(container)
+        if ip is None:
+            return False, f"container {container} not running"
+        return tcp_probe(ip, port)
+    return probe
+
+
+def build_components(base_url: str, send: Callable, config: Dict[str, Any],
+                     mock_container: str = "httptests_mock",
+                     forwarder_container: str = "httptests_forwarder_{port}") -> List[Component]:
+    """Components to probe for a suite, based on its config.yml"""
+    parts = urlsplit(base_url)
+    proxy_host = parts.hostname or "localhost"
+    proxy_port = parts.port or (443 if parts.scheme == "https" else 80)
+
+    def proxy_tcp() -> ProbeResult:
+        return tcp_probe(proxy_host, proxy_port)
+
+    components = [Component(f"proxy {proxy_host}:{proxy_port}", [
+        proxy_tcp,
+        # Any HTTP answer from the default server means the proxy is up
+        lambda: http_probe(send, f"{base_url}/", statuses=list(range(100, 600))),
+    ])]
+
+    readiness_cfg = config.get("readiness", {}) or {}
+    hosts = readiness_cfg.get("hosts") or {}
+    if isinstance(hosts, list):
+        hosts = {host: {} for host in hosts}
+    for host, host_cfg in hosts.items():
+        host_cfg = host_cfg or {}
+        path = host_cfg.get("path", "/")
+        statuses = [int(status) for status in to_list(host_cfg.get("status"))]
+        components.append(Component(f"host {host}{path}", [
+            proxy_tcp,
+            lambda host=host, path=path, statuses=statuses: http_probe(send, f"{base_url}{path}", host, statuses),
+        ]))
+
+    # Container IPs are only routable from the runner on Linux hosts
+    mock_cfg = config.get("mock", {}) or {}
+    aliases = to_list(mock_cfg.get("network_aliases"))
+    check_upstreams = readiness_cfg.get("upstreams", sys.platform.startswith("linux"))
+    if aliases and check_upstreams and shutil.which("docker") is None:
+        print("  ⚠️  Docker command not found, skipping upstream readiness probes")
+    elif aliases and check_upstreams:
+        http_port = mock_cfg.get("http_port") or mock_cfg.get("port", 80)
+        ports = [(mock_container, http_port)]
+        # The builtin mock listens on every port itself; other mocks get a forwarder per extra port
+        ports += [(mock_container if mock_cfg.get("builtin") else forwarder_container.format(port=port), port)
+                  for port in to_list(mock_cfg.get("additional_ports"))]
+        for alias in aliases:
+            for container, port in ports:
+                components.append(Component(f"upstream {alias}:{port}", [upstream_stage(container, port)]))
+
+    return components
+
+
+def wait_until_ready(components: List[Component], max_wait: float = 60, max_interval: float = 2.0) -> bool:
+    """Probe all components concurrently until they are ready or max_wait passes"""
+    start = perf_counter()
+    deadline = start + max_wait
+    output_lock = threading.Lock()
+
+    def run(component: Component) -> None:
+        for interval in backoff(maximum=max_interval):
+            if component.probe():
+                component.ready_after = perf_counter() - start
+                with output_lock:
+                    print(f"  ✓ {component.name} ready after {component.ready_after:.2f}s "
+                          f"({component.attempts} attempt(s))")
+                    sys.stdout.flush()
+                return
+            remaining = deadline - perf_counter()
+            if remaining <= 0:
+                return
+            sleep(min(interval, remaining))
+
+    threads = [threading.Thread(target=run, args=(component,), daemon=True) for component in components]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(max(0.0, deadline - perf_counter()) + 5)
+
+    not_ready = [component for component in components if component.ready_after is None]
+    for component in not_ready:
+        print(f"  ❌ {component.name} not ready after {component.attempts} attempt(s): {component.detail}")
+    return not not_ready
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""Run results: the per-case report of a run and latency statistics.
+
+RunReport collects every case with its timing, samples and assertion
+outcomes while the runner goes, and writes it as JSON (``--report-json``)
+or JUnit XML (``--junit-xml``). Shards and worker processes each write
+their own JSON report; ``RunReport.merge`` puts them back together in
+declaration order.
+"""
+import json
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Upper bounds (ms) of the load test latency histogram buckets
+HISTOGRAM_BOUNDS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+
+def percentile(values: Sequence[float], pct: float) -> Optional[float]:
+    """Linearly interpolated percentile of a list of numbers"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def latency_stats(values: Sequence[float]) -> Dict[str, float]:
+    """min/p50/p95/p99/max summary of latencies in milliseconds"""
+    return {
+        "count": len(values),
+        "min": round(min(values), 3),
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "max": round(max(values), 3),
+    }
+
+
+class RunReport:
+    """Collects every case of a run with its timing and subTest outcomes"""
+
+    def __init__(self):
+        self.cases: List[Dict[str, Any]] = []
+        self.current: Optional[Dict[str, Any]] = None
+
+    def start_case(self, case: Any, timing: Any, samples: Optional[Sequence[float]] = None,
+                   request_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        self.current = {
+            "id": case.case_id,
+            "position": case.position,
+            "host": case.host,
+            "endpoint": case.endpoint_name,
+            "method": case.method,
+            "path": case.path,
+            "expectedStatus": case.expectedStatus,
+            "timing": timing.as_dict() if timing else None,
+            "assertions": [],
+        }
+        if samples and len(samples) > 1:
+            self.current["samplesMs"] = [round(sample * 1000, 3) for sample in samples]
+        if request_ids:
+            self.current["requestIds"] = request_ids
+        self.cases.append(self.current)
+        return self.current
+
+    def add_assertion(self, name: str) -> Dict[str, Any]:
+        record = {"name": name, "outcome": "passed"}
+        if self.current is not None:
+            self.current["assertions"].append(record)
+        return record
+
+    @classmethod
+    def merge(cls, paths: Iterable[str]) -> Tuple["RunReport", int]:
+        """Combine JSON reports of several shards into one report and total assertion count"""
+        merged = cls()
+        totalAssertions = 0
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                report = json.load(f)
+            merged.cases.extend(report.get("cases", []))
+            totalAssertions += report.get("totalAssertions", 0)
+        merged.cases.sort(key=lambda case: case.get("position", 0))
+        return merged, totalAssertions
+
+    def failed(self) -> int:
+        """Number of assertions that failed or errored"""
+        return sum(a["outcome"] != "passed" for case in self.cases for a in case["assertions"])
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """Latency statistics grouped per host and per endpoint"""
+        groups: Dict[str, Dict[str, List[float]]] = {"hosts": {}, "endpoints": {}}
+        for case in self.cases:
+            if not case["timing"]:
+                continue
+            totals = case.get("samplesMs") or [case["timing"]["totalMs"]]
+            groups["hosts"].setdefault(case["host"], []).extend(totals)
+            groups["endpoints"].setdefault(case["endpoint"], []).extend(totals)
+        return {
+            group: {key: latency_stats(values) for key, values in entries.items()}
+            for group, entries in groups.items()
+        }
+
+    def print_summary(self) -> None:
+        summary = self.summary()
+        if not summary["hosts"]:
+            return
+        print("\nLatency summary (ms)")
+        for group, title in (("hosts", "Host"), ("endpoints", "Endpoint")):
+            print(f"  {title:<48} {'count':>6} {'min':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+            for key, stats in summary[group].items():
+                print(f"  {key[:48]:<48} {stats['count']:>6} {stats['min']:>8.1f} {stats['p50']:>8.1f} "
+                      f"{stats['p95']:>8.1f} {stats['p99']:>8.1f} {stats['max']:>8.1f}")
+
+    def attach_logs(self, capture: Any) -> None:
+        """Add the nginx log lines and timings of each case's requests under 'nginx'"""
+        for case in self.cases:
+            if case.get("requestIds"):
+                case["nginx"] = capture.lookup(case["requestIds"], case["method"], case["host"], case["path"])
+
+    def print_logs(self, capture: Any) -> None:
+        """Summarize the captured nginx logs and show the lines of failed cases"""
+        logged = [request for case in self.cases for request in (case.get("nginx") or {}).get("requests", [])]
+        timed = [request for request in logged if request["requestTimeMs"] is not None]
+        print(f"\nnginx logs: {capture.lines} line(s), {sum(r['logged'] for r in logged)} of {len(logged)} "
+              f"request(s) found")
+        if logged and capture.lines and not any(r["logged"] for r in logged):
+            print("  No access log line names a request ID; log $http_x_httptests_request_id in nginx's "
+                  "log_format (see nginxlogs.py)")
+        if timed:
+            total = [request["requestTimeMs"] for request in timed]
+            upstream = [request["upstreamTimeMs"] or 0 for request in timed]
+            print(f"  request_time p50 {percentile(total, 50):.1f}ms, upstream_response_time p50 "
+                  f"{percentile(upstream, 50):.1f}ms, proxy p50 "
+                  f"{percentile([t - u for t, u in zip(total, upstream)], 50):.1f}ms")
+        for case in self.cases:
+            if not case.get("nginx") or all(a["outcome"] == "passed" for a in case["assertions"]):
+                continue
+            nginx = case["nginx"]
+            print(f"\n  ✗ {case['id']}")
+            for request in nginx["requests"]:
+                if request["requestTimeMs"] is not None:
+                    upstream = request["upstreamTimeMs"]
+                    print(f"    {request['id']}: request_time {request['requestTimeMs']:.1f}ms"
+                          + (f", upstream {upstream:.1f}ms" if upstream is not None else ""))
+            for line in nginx["accessLines"] + nginx["errorLines"]:
+                print(f"    | {line}")
+            if not nginx["accessLines"] and not nginx["errorLines"]:
+                print("    (no log lines)")
+
+    def write_reports(self, totalAssertions: int, report_json: Optional[str] = None, junit_xml: Optional[str] = None,
+                      test_file: Optional[str] = None) -> None:
+        """Write the requested JSON and JUnit reports and say where they went"""
+        if report_json:
+            self.write_json(report_json, totalAssertions, test_file)
+            print(f"Wrote JSON report to: {report_json}")
+        if junit_xml:
+            self.write_junit(junit_xml, test_file)
+            print(f"Wrote JUnit report to: {junit_xml}")
+
+    def write_json(self, path: str, totalAssertions: int, test_file: Optional[str] = None) -> None:
+        report = {
+            "testFile": test_file,
+            "totalAssertions": totalAssertions,
+            "summary": self.summary(),
+            "cases": self.cases,
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    def write_junit(self, path: str, test_file: Optional[str] = None) -> None:
+        assertions = [(case, a) for case in self.cases for a in case["assertions"]]
+        suite = ET.Element("testsuite", {
+            "name": test_file or "httptests",
+            "tests": str(len(assertions)),
+            "failures": str(sum(a["outcome"] == "failed" for _, a in assertions)),
+            "errors": str(sum(a["outcome"] == "error" for _, a in assertions)),
+        })
+        for case, assertion in assertions:
+            timing = case["timing"] or {}
+            testcase = ET.SubElement(suite, "testcase", {
+                "classname": case["host"],
+                "name": assertion["name"],
+                "time": "%.6f" % (timing.get("totalMs", 0) / 1000.0),
+            })
+            if timing:
+                properties = ET.SubElement(testcase, "properties")
+                for key, value in timing.items():
+                    ET.SubElement(properties, "property", {"name": key, "value": str(value)})
+            if assertion["outcome"] != "passed":
+                ET.SubElement(testcase, "failure" if assertion["outcome"] == "failed" else "error",
+                              {"message": assertion.get("message", "")})
+        ET.ElementTree(suite).write(path, encoding="utf-8", xml_declaration=True)
+
+
+def latency_histogram(values: Iterable[float], bounds: Sequence[int] = HISTOGRAM_BOUNDS_MS) -> Dict[str, int]:
+    """Count latencies (ms) per bucket, keyed by the bucket's upper bound"""
+    counts = {f"<={bound}": 0 for bound in bounds}
+    counts[f">{bounds[-1]}"] = 0
+    for value in values:
+        for bound in bounds:
+            if value <= bound:
+                counts[f"<={bound}"] += 1
+                break
+        else:
+            counts[f">{bounds[-1]}"] += 1
+    return counts
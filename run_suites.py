@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""Run every .httptests suite under a directory against one Docker environment.
+
+All suites found under the root share a single compose project: each suite
+gets its own nginx (containers ``<project>_<suite>_nginx``) published on its
+own host port, starting at ``--base-port``. Suites whose config.yml starts
+the mock the same way (builtin, ports, image) share one mock on a network of
+their own that carries the network aliases of all of them; suites with a
+different mock get another one, so aliases never resolve to the wrong ports.
+
+The environment is built and started with a single ``docker compose up``,
+then main.py runs for every suite at the same time against its own nginx.
+Each suite's output is printed once it finishes, followed by a table of all
+suites; the per-suite reports are combined into one JSON and one JUnit
+report.
+
+Usage:
+    python run_suites.py --root .
+    python run_suites.py --root services --report-json all.json --junit-xml all.xml -- --concurrency 4 --quiet
+    python run_suites.py --root services --generate-only --compose-file suites.yml
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+from generate_docker_compose import load_config, mock_services, mock_settings, nginx_service, to_list
+
+try:
+    import yaml  # type: ignore
+except ImportError as exc:
+    print("PyYAML is required. Install with: pip install PyYAML", file=sys.stderr)
+    sys.exit(1)
+
+ACTION_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Directories never searched for suites
+SKIP_DIRS = {".git", "node_modules", "__pycache__", ".venv", "venv", ".tox"}
+
+
+class Suite:
+    """One .httptests directory and where its nginx runs in the shared environment"""
+
+    def __init__(self, suite_dir: str, name: str, slug: str, port: int, project: str):
+        self.suite_dir = suite_dir
+        self.name = name
+        self.slug = slug
+        self.port = port
+        self.prefix = f"{project}_{slug}"
+        self.config = load_config(os.path.join(suite_dir, "config.yml"))
+        self.mock_prefix = ""  # set when mocks are grouped
+        test_file = os.path.join(suite_dir, "test.json")
+        if not os.path.isfile(test_file) and os.path.isfile(os.path.join(suite_dir, "test.jsonl")):
+            test_file = os.path.join(suite_dir, "test.jsonl")
+        self.test_file = test_file
+
+    @property
+    def base_url(self) -> str:
+        return f"http://localhost:{self.port}"
+
+
+class SuiteResult:
+    """Outcome of running main.py for one suite"""
+
+    def __init__(self, suite: Suite, exit_code: int, output: str, duration: float, report: Optional[str],
+                 junit: Optional[str]):
+        self.suite = suite
+        self.exit_code = exit_code
+        self.output = output
+        self.duration = duration
+        self.report = report
+        self.junit = junit
+
+    def load_report(self) -> Dict[str, Any]:
+        if self.report and os.path.isfile(self.report):
+            with open(self.report, encoding="utf-8") as f:
+                return json.load(f)
+        return {}
+
+
+def discover(root: str) -> List[str]:
+    """Every .httptests directory with a test file under root, in path order"""
+    found = []
+    for current, dirs, _ in os.walk(root):
+        if ".httptests" in dirs:
+            suite_dir = os.path.join(current, ".httptests")
+            if any(os.path.isfile(os.path.join(suite_dir, name)) for name in ("test.json", "test.jsonl")):
+                found.append(suite_dir)
+        dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS and d != ".httptests")
+    return sorted(found)
+
+
+def slugify(name: str) -> str:
+    """Lowercase service-name-safe form of a suite's relative path"""
+    slug = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+    return slug or "root"
+
+
+def host_port(mapping: Any) -> str:
+    """Host side of a compose port mapping ("8443:443" -> "8443", 443 -> "443")"""
+    parts = str(mapping).split(":")
+    return ":".join(parts[:-1]) if len(parts) > 1 else parts[0]
+
+
+def plan_suites(root: str, suite_dirs: List[str], project: str, base_port: int) -> List[Suite]:
+    """Suites with their names and nginx ports; ValueError when two suites publish the same host port"""
+    suites = []
+    slugs: Dict[str, int] = {}
+    for index, suite_dir in enumerate(suite_dirs):
+        name = os.path.relpath(os.path.dirname(suite_dir), root)
+        slug = slugify(name if name != "." else os.path.basename(os.path.abspath(root)))
+        slugs[slug] = slugs.get(slug, 0) + 1
+        if slugs[slug] > 1:
+            slug = f"{slug}-{slugs[slug]}"
+        suites.append(Suite(suite_dir, name, slug, base_port + index, project))
+
+    # docker compose would only fail on the second nginx, after building everything
+    owners: Dict[str, str] = {}
+    for suite in suites:
+        extra_ports = to_list((suite.config.get("nginx", {}) or {}).get("ports"))
+        for port in [str(suite.port), *(host_port(mapping) for mapping in extra_ports)]:
+            if port in owners:
+                raise ValueError(f"{suite.name}: host port {port} is already published by {owners[port]}; "
+                                 f"give each suite its own host ports in nginx.ports of config.yml")
+            owners[port] = suite.name
+    return suites
+
+
+def generate_compose(suites: List[Suite], project: str) -> Dict[str, Any]:
+    """One compose project for all suites, with a shared mock per kind of mock settings"""
+    groups: Dict[str, Dict[str, Any]] = {}
+    for suite in suites:
+        settings = mock_settings(suite.config)
+        key = json.dumps(settings, sort_keys=True, default=str)
+        if key not in groups:
+            number = len(groups) + 1
+            groups[key] = {"settings": settings, "aliases": [], "suites": [], "number": number}
+        group = groups[key]
+        for alias in to_list((suite.config.get("mock", {}) or {}).get("network_aliases")):
+            if alias not in group["aliases"]:
+                group["aliases"].append(alias)
+        group["suites"].append(suite)
+
+    services: Dict[str, Any] = {}
+    networks: Dict[str, Any] = {}
+    for group in groups.values():
+        network = f"mocks-{group['number']}"
+        mock_prefix = f"{project}_mocks{group['number']}"
+        mocks = mock_services(group["settings"], group["aliases"], prefix=mock_prefix,
+                              service=f"mock-{group['number']}", network=network)
+        services.update(mocks)
+        networks[network] = {}
+        for suite in group["suites"]:
+            suite.mock_prefix = mock_prefix
+            services[f"{suite.slug}-nginx"] = nginx_service(suite.suite_dir, suite.config, prefix=suite.prefix,
+                                                            host_port=suite.port, network=network,
+                                                            depends_on=list(mocks))
+    return {
+        "version": "3.9",
+        "services": services,
+        "networks": networks,
+    }
+
+
+def compose(compose_file: str, project: str, *command: str) -> subprocess.CompletedProcess:
+    return subprocess.run(["docker", "compose", "-f", compose_file, "-p", project, *command],
+                          capture_output=True, text=True)
+
+
+def nginx_logs(suite: Suite) -> str:
+    """Logs of a suite's nginx without the image's entrypoint noise"""
+    try:
+        result = subprocess.run(["docker", "logs", f"{suite.prefix}_nginx"], capture_output=True, text=True,
+                                timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+    lines = (result.stdout + result.stderr).splitlines()
+    return "\n".join(line for line in lines
+                     if "docker-entrypoint.sh" not in line and "10-listen-on-ipv6-by-default.sh" not in line)
+
+
+def run_suite(suite: Suite, runner_args: List[str], out_dir: str) -> SuiteResult:
+    """Run main.py for one suite against its own nginx"""
+    report = os.path.join(out_dir, f"{suite.slug}.json")
+    junit = os.path.join(out_dir, f"{suite.slug}.xml")
+    command = [sys.executable, os.path.join(ACTION_DIR, "main.py"), "--test-file", suite.test_file,
+               "--base-url", suite.base_url, "--container-prefix", suite.prefix, "--mock-prefix", suite.mock_prefix,
+               "--report-json", report, "--junit-xml", junit, *runner_args]
+    start = perf_counter()
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    output = process.stdout
+    if process.returncode != 0:
+        logs = nginx_logs(suite)
+        if logs:
+            output += f"\n=== Nginx Logs ({suite.name}) ===\n{logs}\n"
+    return SuiteResult(suite, process.returncode, output, perf_counter() - start, report, junit)
+
+
+def failed_assertions(report: Dict[str, Any]) -> int:
+    return sum(a.get("outcome") != "passed" for case in report.get("cases", []) for a in case.get("assertions", []))
+
+
+def write_json(path: str, root: str, results: List[SuiteResult]) -> None:
+    """All suites' cases in one report, each case tagged with its suite"""
+    suites = []
+    cases = []
+    for result in results:
+        report = result.load_report()
+        suites.append({
+            "name": result.suite.name,
+            "testFile": result.suite.test_file,
+            "baseUrl": result.suite.base_url,
+            "exitCode": result.exit_code,
+            "durationS": round(result.duration, 3),
+            "totalAssertions": report.get("totalAssertions", 0),
+            "failedAssertions": failed_assertions(report),
+            "cases": len(report.get("cases", [])),
+        })
+        cases.extend({"suite": result.suite.name, **case} for case in report.get("cases", []))
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "root": root,
+            "totalAssertions": sum(suite["totalAssertions"] for suite in suites),
+            "failedAssertions": sum(suite["failedAssertions"] for suite in suites),
+            "suites": suites,
+            "cases": cases,
+        }, f, indent=2)
+
+
+def write_junit(path: str, results: List[SuiteResult]) -> None:
+    """One <testsuite> per suite under a <testsuites> root"""
+    root = ET.Element("testsuites")
+    totals = {"tests": 0, "failures": 0, "errors": 0}
+    for result in results:
+        if result.junit and os.path.isfile(result.junit):
+            suite = ET.parse(result.junit).getroot()
+        else:
+            # main.py stopped before writing a report (service not ready, invalid test file)
+            suite = ET.Element("testsuite", {"tests": "1", "failures": "0", "errors": "1"})
+            testcase = ET.SubElement(suite, "testcase", {"classname": result.suite.name, "name": "Run"})
+            ET.SubElement(testcase, "error", {"message": f"main.py exited with {result.exit_code}"})
+        suite.set("name", result.suite.name)
+        suite.set("time", "%.3f" % result.duration)
+        for key in totals:
+            totals[key] += int(suite.get(key, 0))
+        root.append(suite)
+    for key, value in totals.items():
+        root.set(key, str(value))
+    ET.ElementTree(root).write(path, encoding="utf-8", xml_declaration=True)
+
+
+def print_table(results: List[SuiteResult]) -> None:
+    print(f"\n{'='*60}\n{len(results)} suite(s)\n{'='*60}")
+    print(f"  {'Suite':<40} {'cases':>6} {'assertions':>11} {'failed':>7} {'time':>8}")
+    for result in results:
+        report = result.load_report()
+        ok = result.exit_code == 0
+        print(f"{'✓' if ok else '✗'} {result.suite.name[:40]:<40} {len(report.get('cases', [])):>6} "
+              f"{report.get('totalAssertions', 0):>11} {failed_assertions(report):>7} {result.duration:>7.1f}s"
+              f"{'' if ok or report else f'  (exit {result.exit_code})'}")
+
+
+def main() -> None:
+    """Main entry point"""
+    argv = sys.argv[1:]
+    runner_args: List[str] = []
+    if "--" in argv:
+        runner_args = argv[argv.index("--") + 1:]
+        argv = argv[:argv.index("--")]
+
+    parser = argparse.ArgumentParser(description="Run every HTTPTests suite under a directory in one environment")
+    parser.add_argument("--root", required=True, help="Directory searched for .httptests directories")
+    parser.add_argument("--project", default="httptests-suites",
+                        help="Compose project name, also prefixes container names (default: httptests-suites)")
+    parser.add_argument("--base-port", type=int, default=18080,
+                        help="Host port of the first suite's nginx; the others follow (default: 18080)")
+    parser.add_argument("--parallel", type=int, default=0,
+                        help="Suites tested at the same time (default: all)")
+    parser.add_argument("--compose-file", help="Where to write the generated compose file (default: temporary)")
+    parser.add_argument("--generate-only", action="store_true",
+                        help="Write the compose file and exit without starting anything")
+    parser.add_argument("--report-json", help="Write one JSON report of all suites to this path")
+    parser.add_argument("--junit-xml", help="Write one JUnit XML report of all suites to this path")
+    args = parser.parse_args(argv)
+
+    root = os.path.abspath(args.root)
+    if not os.path.isdir(root):
+        print(f"❌ ERROR: Directory not found: {root}")
+        sys.exit(1)
+    suite_dirs = discover(root)
+    if not suite_dirs:
+        print(f"❌ ERROR: No .httptests directory with a test.json (or test.jsonl) found under {root}")
+        sys.exit(1)
+
+    try:
+        suites = plan_suites(root, suite_dirs, args.project, args.base_port)
+        compose_config = generate_compose(suites, args.project)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"❌ ERROR: {e}")
+        sys.exit(1)
+    print(f"Found {len(suites)} suite(s) under {root}:")
+    for suite in suites:
+        print(f"  {suite.name:<40} → {suite.base_url}")
+
+    with tempfile.TemporaryDirectory(prefix="httptests-suites-") as tmp:
+        compose_file = args.compose_file or os.path.join(tmp, "docker-compose.yml")
+        os.makedirs(os.path.dirname(os.path.abspath(compose_file)), exist_ok=True)
+        with open(compose_file, "w", encoding="utf-8") as f:
+            yaml.safe_dump(compose_config, f, sort_keys=False)
+        if args.generate_only:
+            print(f"Wrote docker compose to: {compose_file}")
+            return
+
+        print("🚀 Starting environment...")
+        started = compose(compose_file, args.project, "up", "-d", "--build")
+        if started.returncode != 0:
+            print(f"❌ ERROR: Failed to start test environment\n{started.stdout}{started.stderr}")
+            compose(compose_file, args.project, "down", "-v")
+            sys.exit(1)
+
+        results: List[SuiteResult] = []
+        output_lock = threading.Lock()
+
+        def run(suite: Suite) -> SuiteResult:
+            result = run_suite(suite, runner_args, tmp)
+            # Print each suite in one piece, in the order they finish
+            with output_lock:
+                print(f"\n{'='*60}\n🧪 {suite.name}\n{'='*60}")
+                print(result.output, flush=True)
+            return result
+
+        try:
+            with ThreadPoolExecutor(max_workers=args.parallel or len(suites)) as executor:
+                results = list(executor.map(run, suites))
+        finally:
+            compose(compose_file, args.project, "down", "-v")
+
+        print_table(results)
+        if args.report_json:
+            write_json(args.report_json, root, results)
+            print(f"Wrote JSON report to: {args.report_json}")
+        if args.junit_xml:
+            write_junit(args.junit_xml, results)
+            print(f"Wrote JUnit report to: {args.junit_xml}")
+
+    sys.exit(0 if all(result.exit_code == 0 for result in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""Concurrent execution of test cases with per-host throttling.
+
+Cases go to a thread pool; results come back in declaration order so the
+assertions that follow stay deterministic. A host's throttling comes from
+two places:
+
+- ``rateLimit`` in ``hostOptions`` (``{"rps": 5, "burst": 2}``): a token
+  bucket paces every request to the host
+- ``sleep`` of an endpoint: its requests go out one at a time, ``sleep``
+  seconds after the previous one on the host completed
+
+The scheduler only needs ``host`` and ``sleep`` from a case; sending it is
+up to the ``fetch`` callable it is given.
+"""
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from time import perf_counter, sleep
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, Optional, Tuple
+
+# fetch(case, throttle, report_errors=...) sends a case and returns its response
+Fetch = Callable[..., Any]
+
+
+class TokenBucket:
+    """Token bucket refilled at ``rps`` tokens per second holding at most ``burst`` tokens"""
+
+    def __init__(self, rps: float, burst: float = 1):
+        if rps <= 0:
+            raise ValueError(f"rps must be > 0, got {rps!r}")
+        self.rps = float(rps)
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self.updated = perf_counter()
+        self._lock = threading.Lock()
+
+    def try_take(self, now: Optional[float] = None) -> float:
+        """Take a token and return 0, or return the seconds until one is available"""
+        with self._lock:
+            now = perf_counter() if now is None else now
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rps)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rps
+
+    def acquire(self) -> None:
+        """Block until a token is available and take it"""
+        while True:
+            delay = self.try_take()
+            if not delay:
+                return
+            sleep(delay)
+
+
+class HostLane:
+    """Pending throttled cases of one host and the state needed to pace them"""
+
+    def __init__(self, bucket: Optional[TokenBucket] = None):
+        self.bucket = bucket
+        self.queue: Deque[Any] = deque()
+        self.inflight = 0
+        self.serialized = False
+        self.last_done = float("-inf")
+
+    def delay(self, case: Any, now: float) -> Optional[float]:
+        """Seconds until ``case`` may be sent, not counting its host's token bucket"""
+        if self.serialized or (case.sleep and self.inflight):
+            return None  # Wait for the request in flight to complete
+        if case.sleep:
+            return max(0.0, self.last_done + case.sleep - now)
+        return 0.0
+
+
+class CaseScheduler:
+    """Fetch cases on a thread pool and yield (case, response) in declaration order.
+
+    Cases of hosts without throttling are sent as soon as a worker is free.
+    Hosts with a ``rateLimit`` are paced by a token bucket, and endpoints with
+    ``sleep`` are sent one at a time, ``sleep`` seconds after the previous one
+    on their host completed. While a host waits for its next slot, the
+    dispatcher keeps sending requests for other hosts, so throttling only
+    slows down the host it applies to.
+
+    Only the network round trips run out of order. Results are handed back in
+    declaration order, so assertions and their output stay deterministic. At
+    most ``look_ahead`` cases per worker (and at least ``min_outstanding``)
+    that are sent or ready to be sent are held ahead of the one being
+    consumed, and a response is dropped once its case has been asserted, so
+    memory stays bounded for streamed suites. Throttled cases waiting for
+    their slot hold no response and do not count against that window, so a
+    throttled host at the start of a file does not keep the cases of other
+    hosts from being read; at most ``max_waiting`` of them are read ahead.
+    """
+
+    look_ahead = 8
+    min_outstanding = 64
+    max_waiting = 4096
+
+    def __init__(self, fetch: Fetch, concurrency: int = 1,
+                 rate_limits: Optional[Dict[str, Dict[str, float]]] = None):
+        self.fetch = fetch
+        self.concurrency = max(1, concurrency)
+        self.max_outstanding = max(self.min_outstanding, self.look_ahead * self.concurrency)
+        self.rate_limits = rate_limits or {}
+        self._cond = threading.Condition()
+        self._ordered: "queue.Queue[Optional[Tuple[Any, Future]]]" = queue.Queue()
+        self._free: Deque[Any] = deque()
+        self._lanes: Dict[str, HostLane] = {}
+        self._inflight = 0
+        self._outstanding = 0  # read and not consumed, except throttled cases waiting in a lane
+        self._waiting = 0
+        self._stopped = False
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self.return_errors = False
+
+    def _lane(self, host: str) -> HostLane:
+        lane = self._lanes.get(host)
+        if lane is None:
+            limit = self.rate_limits.get(host)
+            bucket = TokenBucket(limit["rps"], limit.get("burst", 1)) if limit else None
+            lane = self._lanes[host] = HostLane(bucket)
+        return lane
+
+    def _enqueue(self, case: Any) -> None:
+        if case.sleep or case.host in self.rate_limits:
+            self._lane(case.host).queue.append(case)
+            self._waiting += 1
+        else:
+            self._free.append(case)
+            self._outstanding += 1
+
+    def _pick(self, now: float) -> Tuple[Any, Any]:
+        """Return (case, lane) ready to send, or (None, seconds to wait or None).
+
+        Throttled hosts take the slot whenever they are allowed to send, since
+        they are the long pole of the run; free cases fill the gaps.
+        """
+        wait = None
+        for lane in list(self._lanes.values()):
+            if not lane.queue:
+                continue
+            case = lane.queue[0]
+            delay = lane.delay(case, now)
+            if delay == 0 and lane.bucket:
+                delay = lane.bucket.try_take(now)
+            if delay == 0:
+                lane.queue.popleft()
+                # Round-robin: the next pick starts with the following host
+                self._lanes[case.host] = self._lanes.pop(case.host)
+                return case, lane
+            if delay is not None:
+                wait = delay if wait is None else min(wait, delay)
+        if self._free:
+            return self._free.popleft(), None
+        return None, wait
+
+    def _throttle(self, case: Any, lane: Optional[HostLane]) -> Callable[[], None]:
+        """Pace repeated requests of a case after its first, scheduled one"""
+        first = [True]
+
+        def throttle() -> None:
+            if first[0]:
+                first[0] = False
+                return
+            sleep(case.sleep)
+            if lane is not None and lane.bucket:
+                lane.bucket.acquire()
+        return throttle
+
+    def _fetch(self, case: Any, lane: Optional[HostLane], future: Future) -> None:
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(self.fetch(case, self._throttle(case, lane), report_errors=not self.return_errors))
+            except BaseException as e:
+                future.set_exception(e)
+        with self._cond:
+            self._inflight -= 1
+            if lane is not None:
+                lane.inflight -= 1
+                if case.sleep:
+                    lane.serialized = False
+                    lane.last_done = perf_counter()
+            self._cond.notify_all()
+
+    def _send_ready(self, futures: Dict[int, Future]) -> Optional[float]:
+        """Submit cases while workers are free; returns seconds until a throttled case may go, or None"""
+        while self._inflight < self.concurrency:
+            case, lane = self._pick(perf_counter())
+            if case is None:
+                return lane
+            self._inflight += 1
+            if lane is not None:
+                lane.inflight += 1
+                lane.serialized = bool(case.sleep)
+                # Its response will be held until consumed
+                self._waiting -= 1
+                self._outstanding += 1
+            assert self._pool is not None
+            self._pool.submit(self._fetch, case, lane, futures.pop(id(case)))
+        return None
+
+    def _may_read(self, exhausted: bool) -> bool:
+        return not exhausted and self._outstanding < self.max_outstanding and self._waiting < self.max_waiting
+
+    def _dispatch(self, cases: Iterator[Any]) -> None:
+        futures: Dict[int, Future] = {}
+        exhausted = False
+        read_error: Optional[BaseException] = None
+        try:
+            while True:
+                with self._cond:
+                    if self._stopped:
+                        break
+                    if not self._may_read(exhausted):
+                        wait = self._send_ready(futures)
+                        if exhausted and not (self._free or self._waiting):
+                            break
+                        if not self._may_read(exhausted):
+                            self._cond.wait(wait)
+                        continue
+                # Outside the lock: a slow stream must not hold up workers reporting completions
+                try:
+                    case = next(cases, None)
+                except Exception as e:
+                    # Cases read so far still run; the error follows them
+                    read_error = e
+                    case = None
+                with self._cond:
+                    if case is None:
+                        exhausted = True
+                    else:
+                        futures[id(case)] = future = Future()
+                        self._ordered.put((case, future))
+                        self._enqueue(case)
+                    self._send_ready(futures)
+        except BaseException as e:
+            # Cases that were never sent fail with the dispatcher's error
+            for future in futures.values():
+                future.set_exception(e)
+            read_error = e
+        if read_error is not None:
+            # Surface errors while reading cases to the consumer, in order
+            future = Future()
+            future.set_exception(read_error)
+            self._ordered.put((None, future))
+        self._ordered.put(None)
+
+    def run(self, cases: Iterable[Any], return_errors: bool = False) -> Iterator[Tuple[Any, Any]]:
+        """Yield (case, response); with ``return_errors`` a failed request yields its exception instead of raising"""
+        self.return_errors = return_errors
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="httptests")
+        dispatcher = threading.Thread(target=self._dispatch, args=(iter(cases),), daemon=True)
+        dispatcher.start()
+        try:
+            while True:
+                item = self._ordered.get()
+                if item is None:
+                    break
+                case, future = item
+                if return_errors and case is not None and future.exception() is not None:
+                    response = future.exception()
+                else:
+                    response = future.result()
+                yield case, response
+                # The case has been asserted; its response and future are no longer referenced
+                item = future = response = None
+                with self._cond:
+                    self._outstanding -= 1
+                    self._cond.notify_all()
+        finally:
+            with self._cond:
+                self._stopped = True
+                self._cond.notify_all()
+            self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""Streaming reader for test.json and test.jsonl.
+
+Endpoints are decoded one at a time with ``json.JSONDecoder.raw_decode`` over
+a sliding buffer, so memory stays bounded by the largest single endpoint and
+the first request can go out before the whole file has been read.
+
+test.json keeps its usual layout. ``collectionHeaders`` and ``hostOptions``
+are needed before the first endpoint; unless both come before ``hosts`` the
+file is scanned once for them first (without keeping endpoints in memory).
+
+test.jsonl has one JSON object per line: settings lines holding
+``collectionHeaders`` and/or ``hostOptions`` first, then one endpoint per
+line with its host in ``host``:
+
+    {"collectionHeaders": [["X-Request-Id"]]}
+    {"host": "api.example.com", "paths": ["/health"], "expectedStatus": 200}
+    {"host": "api.example.com", "paths": ["/users"], "method": "POST"}
+"""
+import json
+import re
+from typing import IO, Any, Dict, Iterable, Iterator, Optional, Tuple
+
+SETTINGS_KEYS = ("collectionHeaders", "hostOptions")
+
+# (host, index of the endpoint within its host, endpoint, location for errors)
+EndpointEntry = Tuple[str, int, Dict[str, Any], str]
+
+
+# Inside a string: everything up to the closing quote or a trailing backslash
+STRING_BODY = re.compile(r'(?:[^"\\]|\\.)*')
+# Inside an array or object: anything but strings and brackets
+STRUCTURE_FILLER = re.compile(r'[^"\[\]{}]+')
+
+
+class TestFileError(ValueError):
+    """A test file that cannot be read, pointing at the offending entry"""
+
+
+class JsonStream:
+    """Incremental JSON reader over a text file.
+
+    Containers can be walked item by item with ``object_keys`` and
+    ``array_items``; the value of each item must be consumed (``value`` or
+    a nested walk) before advancing.
+    """
+
+    def __init__(self, f: IO[str], chunk_size: int = 1 << 20):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.line = 1  # line number of buffer[0]
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, size: Optional[int] = None) -> bool:
+        """Append the next chunk, dropping what was consumed; False at end of file"""
+        if self.eof:
+            return False
+        chunk = self.f.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.line += self.buffer.count("\n", 0, self.pos)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def position(self, pos: Optional[int] = None) -> int:
+        """Line number of a buffer position (default: the current one)"""
+        return self.line + self.buffer.count("\n", 0, self.pos if pos is None else pos)
+
+    def peek(self) -> str:
+        """Next non-whitespace character without consuming it, '' at end of file"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise TestFileError(f"line {self.position()}: expected '{char}', found {found!r}" if found
+                                else f"line {self.position()}: expected '{char}', found end of file")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Decode the next complete value"""
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number at the very end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise TestFileError(f"line {self.position(e.pos)}: {e.msg}") from None
+            # Grow reads geometrically so a large value is not re-decoded per chunk
+            if not self._fill(size):
+                continue
+            size *= 2
+
+    def _skip_string(self) -> None:
+        self.pos += 1  # opening quote
+        while True:
+            self.pos = STRING_BODY.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) and self.buffer[self.pos] == '"':
+                self.pos += 1
+                return
+            if not self._fill():
+                raise TestFileError(f"line {self.position()}: unterminated string")
+
+    def skip(self) -> None:
+        """Skip the next value without decoding it; memory stays bounded even for huge strings"""
+        if self.peek() not in '"[{':
+            self.value()
+            return
+        depth = 0
+        while True:
+            char = self.peek()
+            if char == "":
+                raise TestFileError(f"line {self.position()}: unexpected end of input")
+            if char == '"':
+                self._skip_string()
+            elif char in "[{":
+                depth += 1
+                self.pos += 1
+            elif char in "]}":
+                depth -= 1
+                self.pos += 1
+            else:
+                self.pos = STRUCTURE_FILLER.match(self.buffer, self.pos).end()
+            if depth == 0:
+                return
+
+    def pick(self, wanted: Dict[str, Iterable[str]]) -> Dict[str, Any]:
+        """Decode only some keys of an object, skipping the others.
+
+        ``wanted`` maps each key to keys it makes unnecessary once found
+        (e.g. a checksum that replaces a large field). Stops reading as soon
+        as nothing more is needed.
+        """
+        found: Dict[str, Any] = {}
+        obsolete = set()
+        for key in self.object_keys():
+            if key in wanted and key not in obsolete and key not in found:
+                found[key] = self.value()
+                obsolete.update(wanted[key])
+            else:
+                self.skip()
+            if all(k in found or k in obsolete for k in wanted):
+                break
+        return found
+
+    def object_keys(self) -> Iterator[str]:
+        """Yield the keys of an object; the caller consumes each value"""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            line = self.position()
+            key = self.value()
+            if not isinstance(key, str):
+                raise TestFileError(f"line {line}: expected an object key")
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("}")
+            return
+
+    def array_items(self) -> Iterator[int]:
+        """Yield the index of each array item; the caller consumes each item"""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        index = 0
+        while True:
+            yield index
+            index += 1
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("]")
+            return
+
+
+class TestFile:
+    """Settings of a test file, read up front, and a re-iterable stream of its endpoints"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.jsonl = path.endswith(".jsonl")
+        self.settings: Dict[str, Any] = {}
+        try:
+            if self.jsonl:
+                self._read_jsonl_settings()
+            else:
+                self._read_json_settings()
+        except OSError as e:
+            raise TestFileError(f"{path}: {e.strerror or e}") from None
+
+    @property
+    def collection_headers(self):
+        return self.settings.get("collectionHeaders") or []
+
+    @property
+    def host_options(self) -> Dict[str, Any]:
+        return self.settings.get("hostOptions") or {}
+
+    def error(self, where: str, message: str) -> TestFileError:
+        return TestFileError(f"{self.path}: {where}: {message}")
+
+    def located(self, e: TestFileError) -> TestFileError:
+        """Prefix an error of the JSON stream with the file name, once"""
+        return e if str(e).startswith(f"{self.path}: ") else TestFileError(f"{self.path}: {e}")
+
+    def _read_json_settings(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as f:
+            stream = JsonStream(f)
+            try:
+                for key in stream.object_keys():
+                    if all(k in self.settings for k in SETTINGS_KEYS):
+                        break
+                    if key == "hosts":
+                        # Settings may follow; walk past the endpoints without keeping them
+                        for _ in self._walk_hosts(stream, decode=False):
+                            pass
+                    elif key in SETTINGS_KEYS:
+                        self.settings[key] = stream.value()
+                    else:
+                        stream.value()
+            except TestFileError as e:
+                raise self.located(e) from None
+
+    def _read_jsonl_settings(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                entry = self._jsonl_entry(line, number)
+                if entry is None:
+                    continue
+                if "host" in entry:
+                    return
+                self.settings.update(entry)
+
+    def _jsonl_entry(self, line: str, number: int) -> Optional[Dict[str, Any]]:
+        if not line.strip():
+            return None
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise self.error(f"line {number}", e.msg) from None
+        if not isinstance(entry, dict):
+            raise self.error(f"line {number}", "expected a JSON object")
+        return entry
+
+    def _walk_hosts(self, stream: JsonStream, decode: bool = True) -> Iterator[EndpointEntry]:
+        if stream.peek() != "{":
+            raise TestFileError(f"line {stream.position()}: 'hosts' must be an object")
+        for host in stream.object_keys():
+            if stream.peek() != "[":
+                raise self.error(f"hosts[{host!r}]", "expected a list of endpoints")
+            for index in stream.array_items():
+                where = f"hosts[{host!r}][{index}]"
+                try:
+                    endpoint = stream.value()
+                except TestFileError as e:
+                    raise self.error(where, str(e)) from None
+                if not isinstance(endpoint, dict):
+                    raise self.error(where, "expected an endpoint object")
+                if decode:
+                    yield host, index, endpoint, where
+
+    def endpoints(self) -> Iterator[EndpointEntry]:
+        """Yield (host, index, endpoint, location) in declaration order"""
+        with open(self.path, "r", encoding="utf-8") as f:
+            if self.jsonl:
+                indexes: Dict[str, int] = {}
+                for number, line in enumerate(f, 1):
+                    entry = self._jsonl_entry(line, number)
+                    if entry is None:
+                        continue
+                    if "host" not in entry:
+                        if indexes:
+                            raise self.error(f"line {number}", "settings lines must come before the first endpoint")
+                        continue
+                    host = entry.pop("host")
+                    index = indexes.get(host, 0)
+                    indexes[host] = index + 1
+                    yield host, index, entry, f"line {number}"
+                return
+
+            stream = JsonStream(f)
+            try:
+                for key in stream.object_keys():
+                    if key == "hosts":
+                        yield from self._walk_hosts(stream)
+                        return
+                    stream.value()
+            except TestFileError as e:
+                raise self.located(e) from None
+            raise self.error("hosts", "missing 'hosts'")
+
+    def __iter__(self) -> Iterator[EndpointEntry]:
+        return self.endpoints()
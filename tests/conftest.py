@@ -0,0 +1,13 @@
+"""Shared fixtures of the test suite"""
+import pytest
+
+from echo_server import EchoServer
+
+
+@pytest.fixture(scope="session")
+def echo_server():
+    """Echo server on a free port, serving from a thread for the whole session"""
+    server = EchoServer()
+    server.start_in_thread()
+    yield server
+    server.stop()
@@ -0,0 +1,159 @@
+"""Tests for add_upstream_headers.py"""
+import json
+import os
+
+import pytest
+
+from add_upstream_headers import (NginxSyntaxError, parse, process_files, rewrite, rewrite_lines, tokenize,
+                                  upstream_target)
+
+HEADER = "proxy_set_header X-Upstream-Target"
+
+
+def words(text):
+    return [token.value for token in tokenize(text)]
+
+
+def test_tokenizer_skips_comments_and_keeps_quoted_strings():
+    text = 'add_header X "a;b {c}"; # comment ; {\nreturn 200 \'x\\\'y\';'
+    assert words(text) == ["add_header", "X", "a;b {c}", ";", "return", "200", "x'y", ";"]
+
+
+def test_tokenizer_keeps_variables_with_braces():
+    assert words("proxy_pass http://${backend}:80;") == ["proxy_pass", "http://${backend}:80", ";"]
+
+
+def test_tokenizer_tracks_lines():
+    tokens = list(tokenize('a\n"multi\nline"\nb;'))
+    assert [(token.value, token.line) for token in tokens] == [("a", 1), ("multi\nline", 2), ("b", 4), (";", 4)]
+
+
+@pytest.mark.parametrize("text, message", [
+    ('return "open;', "line 1: unterminated quoted string"),
+    ("server {\n listen 80;\n", "line 1: unclosed 'server' block"),
+    ("listen 80", "line 1: missing ';' after 'listen'"),
+    ("}\n", "line 1: unexpected '}'"),
+])
+def test_syntax_errors(text, message):
+    with pytest.raises(NginxSyntaxError, match=message):
+        parse(text)
+
+
+def test_parse_builds_blocks():
+    directives = parse("http { server { location / { proxy_pass http://a; } } }")
+    location = directives[0].block[0].block[0]
+    assert (location.name, location.args) == ("location", ["/"])
+    assert location.block[0].parent is location
+
+
+@pytest.mark.parametrize("arg, target", [
+    ("http://backend:5001/", "backend:5001"),
+    ("https://api.internal/v1/", "api.internal/v1"),
+    ("$upstream", "$upstream"),
+    ("unix:/tmp/sock", "unix:/tmp/sock"),
+])
+def test_upstream_target(arg, target):
+    assert upstream_target(arg) == target
+
+
+def test_adds_header_on_its_own_line_with_indentation():
+    text = "server {\n    location / {\n        proxy_pass http://backend:80/;\n    }\n}\n"
+    new_text, changes, _ = rewrite(text)
+    assert changes == 1
+    assert '        proxy_pass http://backend:80/;\n        %s "backend:80";\n' % HEADER in new_text
+
+
+def test_adds_header_after_multi_line_proxy_pass():
+    text = "location / {\n    proxy_pass\n        http://backend:80;  # upstream\n}\n"
+    new_text, changes, _ = rewrite(text)
+    assert changes == 1
+    assert new_text.splitlines()[3].strip() == f'{HEADER} "backend:80";'
+
+
+def test_adds_header_inline_when_directives_follow():
+    new_text, changes, _ = rewrite("location / { proxy_pass http://a:1; }")
+    assert new_text == f'location / {{ proxy_pass http://a:1; {HEADER} "a:1"; }}'
+
+
+def test_rewrite_is_idempotent():
+    text = "server {\n  location /a { proxy_pass http://a; }\n  location /b {\n    proxy_pass http://b;\n  }\n}\n"
+    once, changes, _ = rewrite(text)
+    twice, again, messages = rewrite(once)
+    assert changes == 2
+    assert again == 0 and twice == once
+    assert [kind for kind, _, _ in messages] == ["SKIP", "SKIP"]
+
+
+def test_header_inherited_from_enclosing_block():
+    text = f'server {{\n  {HEADER} "x";\n  location / {{ proxy_pass http://a; }}\n}}\n'
+    assert rewrite(text)[1] == 0
+
+
+def test_own_proxy_set_header_stops_inheritance():
+    # Like nginx: a block with its own proxy_set_header does not inherit the outer ones
+    text = f'server {{\n  {HEADER} "x";\n  location / {{ proxy_set_header X-Other 1; proxy_pass http://a; }}\n}}\n'
+    new_text, changes, _ = rewrite(text)
+    assert changes == 1
+    assert f'X-Other 1; proxy_pass http://a; {HEADER} "a";' in new_text
+
+
+def test_second_proxy_pass_in_a_block_sees_the_added_header():
+    text = "location / {\n  proxy_pass http://a;\n  proxy_pass http://b;\n}\n"
+    assert rewrite(text)[1] == 1
+
+
+def test_no_header_inside_if_blocks():
+    new_text, changes, messages = rewrite("location / { if ($x) { proxy_pass http://a; } }")
+    assert changes == 0
+    assert messages[0][0] == "WARN"
+
+
+def test_header_from_include(tmp_path):
+    (tmp_path / "snippets").mkdir()
+    (tmp_path / "snippets" / "upstream.conf").write_text(f'{HEADER} "x";\n')
+    text = "location / { include /etc/nginx/snippets/*.conf; proxy_pass http://a; }"
+    assert rewrite(text, str(tmp_path), str(tmp_path))[1] == 0
+
+
+def conf_tree(tmp_path):
+    (tmp_path / "snippets").mkdir()
+    include = tmp_path / "snippets" / "headers.inc"
+    include.write_text(f'{HEADER} "x";\n')
+    site = tmp_path / "site.conf"
+    site.write_text("server { location / { include snippets/headers.inc; proxy_pass http://a:1; } }\n")
+    return site, include
+
+
+def test_manifest_skips_unchanged_files(tmp_path):
+    site, _ = conf_tree(tmp_path)
+    manifest = str(tmp_path / "manifest.json")
+    assert process_files([str(site)], str(tmp_path), jobs=1, manifest_path=manifest) == 0
+    entry = json.load(open(manifest))["files"]["site.conf"]
+    assert set(entry["includes"]) == {"snippets/headers.inc"}
+    os.utime(site, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+    assert process_files([str(site)], str(tmp_path), jobs=1, manifest_path=manifest) == 0
+
+
+def test_manifest_reprocesses_a_file_when_an_include_changes(tmp_path):
+    site, include = conf_tree(tmp_path)
+    manifest = str(tmp_path / "manifest.json")
+    process_files([str(site)], str(tmp_path), jobs=1, manifest_path=manifest)
+    include.write_text("# no header any more\n")
+    assert process_files([str(site)], str(tmp_path), jobs=1, manifest_path=manifest) == 1
+    assert f'{HEADER} "a:1";' in site.read_text()
+
+
+def test_unparsable_file_falls_back_to_line_based_insertion(tmp_path, capsys):
+    site = tmp_path / "site.conf"
+    site.write_text("server {\n    location / {\n        proxy_pass http://a:1/;\n    }\n"
+                    "    location /b {\n        proxy_pass http://b;\n        " + HEADER + ' "b";\n    }\n')
+    assert process_files([str(site)], str(tmp_path), jobs=1) == 1
+    assert site.read_text().count(HEADER) == 2
+    assert f'        proxy_pass http://a:1/;\n        {HEADER} "a:1";\n' in site.read_text()
+    out = capsys.readouterr().out
+    assert "[WARN] Could not parse" in out and "unclosed 'server' block" in out
+
+
+def test_line_based_insertion_after_the_last_line():
+    assert rewrite_lines("proxy_pass http://a;") == (f'proxy_pass http://a;\n{HEADER} "a";\n', 1,
+                                                    [("ADD", 1, "Added X-Upstream-Target for a")])
@@ -0,0 +1,127 @@
+"""Tests for latency baselines and their statistics"""
+import json
+import random
+
+import pytest
+
+import baseline
+from baseline import Baseline, BaselineError, hodges_lehmann, mann_whitney_greater
+
+
+def test_mann_whitney_fully_separated_samples():
+    # U = 25 of 25; normal approximation with continuity correction gives z = 2.507
+    assert mann_whitney_greater([1, 2, 3, 4, 5], [6, 7, 8, 9, 10]) == pytest.approx(0.00609, abs=1e-4)
+
+
+def test_mann_whitney_is_one_sided():
+    assert mann_whitney_greater([6, 7, 8, 9, 10], [1, 2, 3, 4, 5]) > 0.99
+
+
+def test_mann_whitney_same_distribution_is_not_significant():
+    rng = random.Random(1)
+    before = [rng.gauss(20, 2) for _ in range(50)]
+    after = [rng.gauss(20, 2) for _ in range(50)]
+    assert mann_whitney_greater(before, after) > 0.05
+
+
+def test_mann_whitney_ties_are_averaged():
+    # Only ties: no evidence either way
+    assert mann_whitney_greater([3] * 5, [3] * 5) == 1.0
+    with_ties = mann_whitney_greater([1, 2, 2, 3, 3], [2, 3, 3, 4, 4])
+    assert 0.01 < with_ties < 0.2
+
+
+def test_hodges_lehmann_is_the_median_of_pairwise_differences():
+    # Differences -1, 0, 1, 1, 2, 3, 3, 4, 5
+    assert hodges_lehmann([1, 2, 3], [2, 4, 6]) == 2
+
+
+def test_hodges_lehmann_ignores_outliers():
+    before = [10.0, 10.5, 11.0, 10.2, 10.8]
+    after = [value + 3 for value in before[:-1]] + [500.0]
+    assert hodges_lehmann(before, after) == pytest.approx(3, abs=0.5)
+
+
+def test_hodges_lehmann_thins_large_samples():
+    rng = random.Random(2)
+    before = [rng.uniform(10, 20) for _ in range(2000)]
+    after = [value + 5 for value in before]
+    assert hodges_lehmann(before, after, limit=100) == pytest.approx(5, abs=0.5)
+
+
+def samples(center, n=30, spread=1.0, seed=0):
+    rng = random.Random(seed)
+    return [center + rng.uniform(-spread, spread) for _ in range(n)]
+
+
+def test_regression_needs_significance_and_both_thresholds():
+    base = Baseline({"slow": samples(20), "tiny": samples(20), "fast": samples(1)}, alpha=0.01,
+                    threshold_ms=5, threshold_pct=10)
+    assert base.compare("slow", samples(30, seed=1)).regressed
+    # Significant, but only 2ms slower
+    tiny = base.compare("tiny", samples(22, seed=1))
+    assert tiny.p_value < 0.01 and not tiny.regressed
+    # 6ms is 600% of 1ms, but on a route this fast the absolute threshold decides
+    assert base.compare("fast", samples(7, seed=1)).regressed
+    assert not base.compare("fast", samples(5, seed=1)).regressed
+
+
+def test_improvements_are_not_regressions():
+    base = Baseline({"case": samples(30)})
+    assert not base.compare("case", samples(10, seed=1)).regressed
+
+
+def test_too_few_samples_are_not_compared():
+    base = Baseline({"case": samples(20, n=4), "other": samples(20)})
+    assert base.compare("case", samples(40)) is None
+    assert base.compare("other", samples(40, n=baseline.MIN_SAMPLES - 1)) is None
+    assert base.compare("missing", samples(40)) is None
+    assert base.results == []
+
+
+def test_table_lists_the_worst_cases():
+    base = Baseline({"a": samples(20), "b": samples(20)})
+    base.compare("a", samples(40, seed=1))
+    base.compare("b", samples(20, seed=1))
+    lines = base.table()
+    assert lines[0].startswith("Latency vs baseline (ms): 1 regression(s) in 2 compared case(s)")
+    assert lines[2].split()[:2] == ["✗", "a"]
+    assert lines[3].split()[0] == "b"
+
+
+def test_record_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "nested" / "baseline.json")
+    report_cases = [
+        {"id": "GET a /x", "timing": {"totalMs": 3.0}, "samplesMs": [1.0, 2.0, 3.0]},
+        {"id": "GET a /y", "timing": {"totalMs": 4.0}},
+        {"id": "GET a /z", "timing": None},
+    ]
+    assert baseline.record(path, report_cases, test_file="test.json") == 2
+    loaded = Baseline.load(path, alpha=0.05)
+    assert loaded.cases == {"GET a /x": [1.0, 2.0, 3.0], "GET a /y": [4.0]}
+    assert loaded.alpha == 0.05
+
+
+def test_record_keeps_the_latest_samples(tmp_path):
+    path = str(tmp_path / "baseline.json")
+    baseline.record(path, [{"id": "c", "timing": {"totalMs": 1}, "samplesMs": list(range(baseline.MAX_SAMPLES + 5))}])
+    with open(path) as f:
+        kept = json.load(f)["cases"]["c"]["samplesMs"]
+    assert len(kept) == baseline.MAX_SAMPLES and kept[-1] == baseline.MAX_SAMPLES + 4
+
+
+@pytest.mark.parametrize("content, message", [
+    ("{", "line 1"),
+    ('{"version": 99, "cases": {}}', "not a version 1 baseline"),
+    ("[]", "not a version 1 baseline"),
+])
+def test_load_rejects_invalid_files(tmp_path, content, message):
+    path = tmp_path / "baseline.json"
+    path.write_text(content)
+    with pytest.raises(BaselineError, match=message):
+        Baseline.load(str(path))
+
+
+def test_load_missing_file(tmp_path):
+    with pytest.raises(BaselineError, match="No such file"):
+        Baseline.load(str(tmp_path / "missing.json"))
@@ -0,0 +1,72 @@
+"""Tests for reading response bodies into summaries (read_body, BodySummary)"""
+import hashlib
+import json
+
+import pytest
+import requests
+
+import main
+from main import BodyPlan, BodySummary, read_body
+
+
+@pytest.fixture
+def fetch(echo_server):
+    session = requests.Session()
+
+    def send(body=b"", **headers):
+        return session.post(f"http://127.0.0.1:{echo_server.port}/echo", data=body, headers=headers, stream=True)
+    yield send
+    session.close()
+
+
+def full_body(fetch, body=b""):
+    return fetch(body).content
+
+
+def test_only_the_wanted_keys_are_decoded(fetch):
+    response = fetch(b"hello", **{"X-A": "1"})
+    summary = read_body(response, BodyPlan(echo_keys={"headers": (), "bodySha256": ("body",)}))
+    assert set(summary.echo) == {"headers", "bodySha256"}
+    assert summary.echo["headers"]["x-a"] == "1"
+    assert summary.echo["bodySha256"] == hashlib.sha256(b"hello").hexdigest()
+    assert summary.echo_error is None and not summary.truncated
+    assert summary.size == int(response.headers["Content-Length"]) and summary.complete
+    assert summary.sha256 is None
+    assert summary.preview.startswith("{")
+
+
+def test_hash_and_size_of_the_whole_body(fetch):
+    summary = read_body(fetch(b"x" * 200000), BodyPlan(hash_body=True, read_all=True))
+    content = full_body(fetch, b"x" * 200000)
+    assert summary.size == len(content) and summary.complete
+    assert summary.sha256 == hashlib.sha256(content).hexdigest()
+    assert summary.echo is None
+
+
+def test_inspect_limit(fetch):
+    summary = read_body(fetch(b"x" * 5000), BodyPlan(echo_keys={"body": ()}, max_inspect=1000))
+    assert summary.truncated and summary.echo is None
+    assert summary.echo_error == "response body is larger than the inspect limit of 1000 bytes"
+    # The rest is still read, so the size is known
+    assert summary.size == len(full_body(fetch, b"x" * 5000)) and summary.complete
+
+
+def test_large_unneeded_bodies_are_not_downloaded(fetch, monkeypatch):
+    monkeypatch.setattr(main, "MAX_DRAIN_BYTES", 10000)
+    summary = read_body(fetch(b"x" * 100000), BodyPlan())
+    assert not summary.complete and 10000 <= summary.size < 100000
+    assert read_body(fetch(b"x" * 1000), BodyPlan()).complete
+
+
+def test_empty_body(fetch):
+    summary = read_body(fetch(**{"X-Set-Response-Status-Code": "204"}), BodyPlan(echo_keys={"headers": ()}))
+    assert summary.empty and summary.echo is None and summary.size == 0
+
+
+def test_summary_from_text():
+    summary = BodySummary.from_text(json.dumps({"headers": {"a": "1"}}))
+    assert summary.echo == {"headers": {"a": "1"}} and summary.complete and not summary.empty
+    assert summary.sha256 == hashlib.sha256(json.dumps({"headers": {"a": "1"}}).encode()).hexdigest()
+    broken = BodySummary.from_text("{not json")
+    assert broken.echo is None and broken.echo_error
+    assert BodySummary.from_text("  ").empty and BodySummary.from_text(None).size == 0
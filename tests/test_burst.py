@@ -0,0 +1,85 @@
+"""Tests for burst checks: parsing of the ``burst`` settings and the expected outcome counts"""
+import pytest
+
+from main import BurstCheck, BurstResult
+from tests.test_runner import outcomes, run_suite
+
+
+def burst(**spec):
+    return BurstCheck({"requests": 10, **spec})
+
+
+def test_counts_and_ranges():
+    check = burst(expect={"success": 3, "limited": {"min": 5}, "other": {"max": 2}})
+    assert check.expect == {"success": (3, 3), "limited": (5, None), "other": (0, 2)}
+    assert [check.describe(outcome) for outcome in BurstCheck.OUTCOMES] == ["3", ">= 5", "0..2"]
+
+
+@pytest.mark.parametrize("value", [True, False, -1, 1.5, "3", None, [1], {}, {"min": True}, {"max": "2"},
+                                   {"min": -1}, {"min": 1, "most": 2}])
+def test_invalid_expect_values_name_the_outcome(value):
+    with pytest.raises(ValueError, match="burst expect 'limited' must be a count"):
+        burst(expect={"limited": value})
+
+
+def test_min_above_max():
+    with pytest.raises(ValueError, match="burst expect 'success': 'min' 5 is greater than 'max' 4"):
+        burst(expect={"success": {"min": 5, "max": 4}})
+
+
+def test_unknown_outcome():
+    with pytest.raises(ValueError, match="burst 'expect' must be an object with success, limited, other"):
+        burst(expect={"failed": 1})
+
+
+@pytest.mark.parametrize("requests", [True, 0, 1001, "10", None])
+def test_invalid_request_counts(requests):
+    with pytest.raises(ValueError, match="burst 'requests' must be an integer from 1 to 1000"):
+        BurstCheck({"requests": requests})
+
+
+@pytest.mark.parametrize("expect, count, allowed", [
+    (3, 2, False), (3, 3, True), (3, 4, False),
+    ({"min": 2}, 1, False), ({"min": 2}, 2, True), ({"min": 2}, 10, True),
+    ({"max": 2}, 0, True), ({"max": 2}, 2, True), ({"max": 2}, 3, False),
+    ({"min": 1, "max": 1}, 1, True), ({"min": 1, "max": 2}, 3, False),
+])
+def test_bounds(expect, count, allowed):
+    assert burst(expect={"limited": expect}).allows("limited", count) is allowed
+
+
+def test_outcomes_without_expectation_are_allowed():
+    check = burst(expect={"limited": 1})
+    assert check.allows("other", 10) and check.describe("other") == ">= 0"
+
+
+def test_statuses_are_counted_by_outcome():
+    check = burst(limitedStatus=[429], requests=5)
+    result = BurstResult(check, [200, 204, 429, 503, None], [None] * 4 + ["timeout"], [0.0] * 5, 0.01)
+    assert result.counts == {"success": 2, "limited": 1, "other": 2}
+
+
+def test_offsets_spread_over_the_window():
+    assert burst(requests=4, withinMs=100).offsets() == pytest.approx([0, 0.025, 0.05, 0.075])
+
+
+def burst_suite(expect):
+    return {"hosts": {"a.example.com": [
+        {"paths": ["/limited"], "additionalRequestHeaders": {"X-Set-Response-Status-Code": "429"},
+         "expectedStatus": 429, "burst": {"requests": 5, "expect": expect}},
+    ]}}
+
+
+def test_burst_meets_expectation(tmp_path, echo_server):
+    process, report = run_suite(tmp_path, echo_server, burst_suite({"limited": 5, "success": 0}),
+                                "--runner", "native")
+    assert process.returncode == 0, process.stdout + process.stderr
+    assert outcomes(report)["GET a.example.com [0] /limited"]["Burst"] == "passed"
+    assert report["cases"][0]["burst"]["counts"] == {"success": 0, "limited": 5, "other": 0}
+
+
+def test_burst_outside_expectation_fails(tmp_path, echo_server):
+    process, report = run_suite(tmp_path, echo_server, burst_suite({"success": {"min": 1}}), "--runner", "native")
+    assert process.returncode == 1
+    assert outcomes(report)["GET a.example.com [0] /limited"]["Burst"] == "failed"
+    assert "Expected: >= 1 of 5" in process.stdout
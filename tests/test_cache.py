@@ -0,0 +1,129 @@
+"""Tests for proxy cache checks, against a small caching proxy in front of the echo server"""
+import http.client
+import http.server
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from main import CacheCheck
+from tests.test_runner import outcomes, run_suite
+
+
+class CachingProxy(http.server.ThreadingHTTPServer):
+    """Caches GET responses by Host and path and reports X-Cache-Status like nginx's $upstream_cache_status.
+
+    With ``bypass`` every request is forwarded while the status still claims HIT.
+    """
+
+    def __init__(self, upstream_port, bypass=False):
+        super().__init__(("127.0.0.1", 0), ProxyHandler)
+        self.upstream_port = upstream_port
+        self.bypass = bypass
+        self.cache = {}
+        threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+class ProxyHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; Nagle would hold the body back for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        key = (self.headers.get("Host"), self.path)
+        status = "HIT" if key in self.server.cache else "MISS"
+        if status == "MISS" or self.server.bypass:
+            upstream = http.client.HTTPConnection("127.0.0.1", self.server.upstream_port, timeout=10)
+            upstream.request("GET", self.path, headers=dict(self.headers))
+            body = upstream.getresponse().read()
+            upstream.close()
+            self.server.cache.setdefault(key, body)
+        body = self.server.cache[key] if not self.server.bypass else body
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Cache-Status", status)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def proxy(echo_server):
+    servers = []
+
+    def start(**options):
+        servers.append(CachingProxy(echo_server.port, **options))
+        return servers[-1]
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def cache_suite(cache, **endpoint):
+    return {"hosts": {"a.example.com": [{"paths": ["/cached"], "cache": cache, **endpoint}]}}
+
+
+def test_cache_check_settings():
+    check = CacheCheck({"sequence": ["miss", ["hit", "stale"], None]})
+    assert check.header == "X-Cache-Status"
+    assert check.sequence == (("MISS",), ("HIT", "STALE"), None)
+    assert CacheCheck({}).sequence == (("MISS",), ("HIT",))
+    assert check.path("/a", "t") == "/a"
+    unique = CacheCheck({"unique": True})
+    assert unique.path("/a", "t") == "/a?httptests-cache=t"
+    assert unique.path("/a?b=1", "t") == "/a?b=1&httptests-cache=t"
+
+
+@pytest.mark.parametrize("spec, message", [
+    ([], "'cache' must be an object"),
+    ({"sequence": []}, "cache 'sequence' must be a non-empty list"),
+    ({"expectedUpstreamRequests": -1}, "must be a non-negative integer"),
+])
+def test_invalid_cache_settings(spec, message):
+    with pytest.raises(ValueError, match=message):
+        CacheCheck(spec)
+
+
+def test_miss_then_hits(tmp_path, proxy):
+    server = proxy()
+    cache = {"sequence": ["MISS", "HIT", "HIT"], "expectedUpstreamRequests": 1, "unique": True,
+             "maxHitLatencyRatio": 0.5}
+    process, report = run_suite(tmp_path, server, cache_suite(
+        cache, additionalRequestHeaders={"X-Set-Response-Delay-Ms": "50"}), "--runner", "native")
+    assert process.returncode == 0, process.stdout + process.stderr
+    assert outcomes(report)["GET a.example.com [0] /cached"]["Cache"] == "passed"
+    assert [(r["cacheStatus"], r["upstream"]) for r in report["cases"][0]["cache"]] == [
+        ("MISS", True), ("HIT", False), ("HIT", False)]
+    # unique gives every run a new cache key
+    assert all("httptests-cache=" in path for _, path in server.cache)
+
+
+def test_status_mismatch(tmp_path, proxy):
+    server = proxy()
+    process, report = run_suite(tmp_path, server, cache_suite({"sequence": ["MISS", "MISS"]}), "--runner", "native")
+    assert process.returncode == 1
+    assert outcomes(report)["GET a.example.com [0] /cached"]["Cache"] == "failed"
+    assert "Cache status mismatch on request 2 of 2" in process.stdout
+
+
+def test_hits_that_reach_the_upstream_fail(tmp_path, proxy):
+    server = proxy(bypass=True)
+    process, report = run_suite(tmp_path, server, cache_suite({"expectedUpstreamRequests": 1}), "--runner", "native")
+    assert process.returncode == 1
+    assert [r["upstream"] for r in report["cases"][0]["cache"]] == [True, True]
+    assert "Upstream request count mismatch" in process.stdout
+
+
+def test_cache_check_needs_the_cache_status_header(tmp_path, echo_server):
+    process, report = run_suite(tmp_path, SimpleNamespace(port=echo_server.port), cache_suite({}),
+                                "--runner", "native")
+    assert process.returncode == 1
+    assert "Got: (header missing)" in process.stdout
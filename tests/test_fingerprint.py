@@ -0,0 +1,43 @@
+"""Tests for fingerprint.py runner arguments and cached runs"""
+import json
+import xml.etree.ElementTree as ET
+
+from fingerprint import runner_hash, write_cached_reports
+
+
+def test_output_options_do_not_count():
+    plain = runner_hash(["--test-file", "t.json", "--concurrency", "4"])
+    assert runner_hash(["--test-file", "t.json", "--report-json", "r.json", "--concurrency", "4", "--quiet",
+                        "--junit-xml=j.xml"]) == plain
+    assert runner_hash(["--test-file", "t.json", "--concurrency", "8"]) != plain
+
+
+def test_nginx_logs_counts():
+    # It adds a request ID header to every request
+    assert runner_hash(["--nginx-logs"]) != runner_hash([])
+
+
+def test_file_options_count_with_their_content(tmp_path):
+    timings = tmp_path / "timings.json"
+    timings.write_text("{}")
+    first = runner_hash(["--timings", str(timings)])
+    timings.write_text('{"cases": []}')
+    assert runner_hash(["--timings", str(timings)]) != first
+
+
+def test_cached_reports(tmp_path):
+    report, junit = tmp_path / "r.json", tmp_path / "j.xml"
+    result = {"fingerprint": "abc", "passedAt": "2026-01-01T00:00:00+00:00"}
+    written = write_cached_reports(result, ["--test-file", "t.json", "--report-json", str(report),
+                                            f"--junit-xml={junit}"])
+    assert written == [str(report), str(junit)]
+    assert json.loads(report.read_text()) == {"testFile": "t.json", "totalAssertions": 0,
+                                              "summary": {"hosts": {}, "endpoints": {}}, "cases": [],
+                                              "cached": result}
+    suite = ET.parse(junit).getroot()
+    assert suite.get("skipped") == "1"
+    assert "2026-01-01" in suite.find("testcase/skipped").get("message")
+
+
+def test_cached_reports_without_report_paths(tmp_path):
+    assert write_cached_reports({}, ["--test-file", "t.json"]) == []
@@ -0,0 +1,275 @@
+"""Tests for h2client.H2Connection against a local HTTP/2 server"""
+import hashlib
+import json
+import os
+import socket
+import ssl
+import threading
+import time
+
+import pytest
+
+h2 = pytest.importorskip("h2")
+import h2.config  # noqa: E402
+import h2.connection  # noqa: E402
+import h2.events  # noqa: E402
+import h2.settings  # noqa: E402
+
+import h2client  # noqa: E402
+from h2client import H2Connection, H2Error  # noqa: E402
+
+PEM = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "echo_server.pem")
+
+
+class H2Server:
+    """Cleartext or TLS HTTP/2 server answering requests with a JSON summary of them.
+
+    ``x-delay-ms`` delays a response. On the first connection, ``gather``
+    holds responses until that many requests arrived; they are then answered
+    in stream order, and after ``goaway_after`` responses the connection is
+    closed with a GOAWAY naming the last answered stream, or with
+    ``processed_all`` the last received one.
+    """
+
+    def __init__(self, max_streams=100, tls=False, gather=0, goaway_after=0, processed_all=False):
+        self.max_streams = max_streams
+        self.gather = gather
+        self.goaway_after = goaway_after
+        self.processed_all = processed_all
+        self.peak = 0
+        self.connections = 0
+        self.context = None
+        if tls:
+            self.context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            self.context.load_cert_chain(PEM)
+            self.context.set_alpn_protocols(["h2"])
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+            except OSError:
+                return
+            if self.context:
+                sock = self.context.wrap_socket(sock, server_side=True)
+            self.connections += 1
+            threading.Thread(target=self.serve, args=(sock, self.connections == 1), daemon=True).start()
+
+    def serve(self, sock, first):
+        conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False, header_encoding="utf-8"))
+        conn.initiate_connection()
+        conn.update_settings({h2.settings.SettingCodes.MAX_CONCURRENT_STREAMS: self.max_streams})
+        lock = threading.Lock()
+        sock.sendall(conn.data_to_send())
+        requests = {}
+        active = set()
+        complete = []
+        state = {"answered": 0, "closed": False}
+        gather = self.gather if first else 0
+        goaway_after = self.goaway_after if first else 0
+
+        def respond(stream_id):
+            headers, body = requests[stream_id]
+            time.sleep(float(headers.get("x-delay-ms", 0)) / 1000)
+            out = json.dumps({"method": headers[":method"], "path": headers[":path"], "stream": stream_id,
+                              "bodyLength": len(body), "sha256": hashlib.sha256(body).hexdigest()}).encode()
+            with lock:
+                if state["closed"]:
+                    return
+                conn.send_headers(stream_id, [(":status", "200"), ("content-length", str(len(out)))])
+                conn.send_data(stream_id, out, end_stream=True)
+                active.discard(stream_id)
+                state["answered"] += 1
+                if state["answered"] == goaway_after:
+                    state["closed"] = True
+                    conn.close_connection(last_stream_id=max(requests) if self.processed_all else stream_id)
+                sock.sendall(conn.data_to_send())
+
+        def respond_all(stream_ids):
+            for stream_id in stream_ids:
+                respond(stream_id)
+
+        while True:
+            try:
+                data = sock.recv(65535)
+            except OSError:
+                return
+            if not data:
+                return
+            with lock:
+                if state["closed"]:
+                    continue
+                for event in conn.receive_data(data):
+                    if isinstance(event, h2.events.RequestReceived):
+                        requests[event.stream_id] = [dict(event.headers), b""]
+                        active.add(event.stream_id)
+                        self.peak = max(self.peak, len(active))
+                    elif isinstance(event, h2.events.DataReceived):
+                        requests[event.stream_id][1] += event.data
+                        conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                    elif isinstance(event, h2.events.StreamEnded):
+                        complete.append(event.stream_id)
+                        if len(complete) >= gather:
+                            # Gathered requests are answered one after the other, in stream order
+                            threading.Thread(target=respond_all, args=(sorted(complete),), daemon=True).start()
+                            complete = []
+                            gather = 0
+                sock.sendall(conn.data_to_send())
+
+    def close(self):
+        self.listener.close()
+
+
+@pytest.fixture
+def server():
+    servers = []
+
+    def start(**options):
+        servers.append(H2Server(**options))
+        return servers[-1]
+    yield start
+    for started in servers:
+        started.close()
+
+
+def send(client, method="GET", path="/", body=None, delay_ms=0):
+    headers = [("x-delay-ms", str(delay_ms))] if delay_ms else []
+    result = client.request(method, path, "example.com", headers, body)
+    return result.status, json.loads(result.body)
+
+
+def send_concurrently(client, count, **request):
+    """Send ``count`` requests from as many threads; the response or H2Error of each, in order"""
+    results = [None] * count
+
+    def run(index):
+        try:
+            results[index] = send(client, path=f"/{index}", **request)
+        except H2Error as e:
+            results[index] = e
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results
+
+
+def test_requests_share_one_connection(server):
+    srv = server()
+    client = H2Connection("127.0.0.1", srv.port, timeout=5)
+    status, first = send(client, path="/a?x=1")
+    assert status == 200 and first == {**first, "method": "GET", "path": "/a?x=1", "stream": 1}
+    assert send(client)[1]["stream"] == 3
+    assert client.connections == 1 and client.requests == 2
+    client.close()
+
+
+def test_connection_headers_are_not_sent(server):
+    srv = server()
+    client = H2Connection("127.0.0.1", srv.port, timeout=5)
+    # h2 rejects connection-specific headers; the client drops them
+    result = client.request("GET", "/", "example.com", [("Connection", "keep-alive"), ("Host", "x"), ("X-A", "1")])
+    assert result.status == 200
+    client.close()
+
+
+def test_tls_negotiates_h2_with_alpn(server):
+    srv = server(tls=True)
+    client = H2Connection("127.0.0.1", srv.port, tls=True, timeout=5)
+    assert send(client)[0] == 200
+    client.close()
+
+
+def test_streams_stay_within_the_server_limit(server):
+    srv = server(max_streams=2)
+    client = H2Connection("127.0.0.1", srv.port, timeout=5)
+    results = send_concurrently(client, 8, delay_ms=50)
+    assert all(status == 200 for status, _ in results)
+    assert client.server_max_streams == 2
+    assert srv.peak <= 2 and client.peak_streams == 2
+    assert client.connections == 1
+    client.close()
+
+
+def test_client_limit_below_server_limit(server):
+    srv = server(max_streams=100)
+    client = H2Connection("127.0.0.1", srv.port, max_streams=1, timeout=5)
+    results = send_concurrently(client, 4, delay_ms=20)
+    assert all(status == 200 for status, _ in results)
+    assert srv.peak == 1 and client.peak_streams == 1
+    client.close()
+
+
+@pytest.mark.parametrize("chunked", [False, True])
+def test_large_bodies_are_sent_within_the_flow_control_window(server, chunked):
+    srv = server()
+    client = H2Connection("127.0.0.1", srv.port, timeout=5)
+    body = bytes(range(256)) * 4096  # 1 MiB, 16 times the initial window
+    sent = iter([body[:300000], body[300000:]]) if chunked else body
+    status, echoed = send(client, "POST", body=sent)
+    assert status == 200
+    assert echoed["bodyLength"] == len(body)
+    assert echoed["sha256"] == hashlib.sha256(body).hexdigest()
+    client.close()
+
+
+def test_goaway_retries_idempotent_requests_on_a_new_connection(server):
+    srv = server(gather=4, goaway_after=1, processed_all=True)
+    client = H2Connection("127.0.0.1", srv.port, timeout=5)
+    results = send_concurrently(client, 4)
+    assert [status for status, _ in results] == [200] * 4
+    assert client.connections == 2
+    client.close()
+
+
+def test_goaway_retries_unprocessed_posts(server):
+    srv = server(gather=4, goaway_after=1)
+    client = H2Connection("127.0.0.1", srv.port, timeout=5)
+    # The GOAWAY names stream 1 as the last processed one; the others are sent again
+    results = send_concurrently(client, 4, method="POST", body=b"data")
+    assert [status for status, _ in results] == [200] * 4
+    assert client.connections == 2
+    client.close()
+
+
+def test_goaway_fails_processed_posts(server):
+    srv = server(gather=4, goaway_after=1, processed_all=True)
+    client = H2Connection("127.0.0.1", srv.port, timeout=5)
+    results = send_concurrently(client, 4, method="POST", body=b"data")
+    errors = [result for result in results if isinstance(result, H2Error)]
+    assert len(errors) == 3
+    assert all("GOAWAY" in str(error) and not error.retry for error in errors)
+    # The next request opens a new connection
+    assert send(client)[0] == 200 and client.connections == 2
+    client.close()
+
+
+def test_missing_h2_package(monkeypatch):
+    monkeypatch.setattr(h2client, "AVAILABLE", False)
+    with pytest.raises(H2Error, match="pip install h2"):
+        H2Connection("127.0.0.1", 1)
+
+
+def test_handshake_does_not_hold_the_lock():
+    # Accepts connections but never answers the TLS handshake
+    listener = socket.create_server(("127.0.0.1", 0))
+    client = H2Connection("127.0.0.1", listener.getsockname()[1], tls=True, timeout=0.5)
+    errors = []
+
+    def run():
+        try:
+            send(client)
+        except (OSError, H2Error) as e:
+            errors.append(e)
+    thread = threading.Thread(target=run)
+    thread.start()
+    time.sleep(0.1)
+    assert client.lock.acquire(timeout=0.05)
+    client.lock.release()
+    thread.join(5)
+    listener.close()
+    assert len(errors) == 1 and client.connections == 0
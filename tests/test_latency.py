@@ -0,0 +1,53 @@
+"""Tests for repeated requests, latency budgets and latency statistics"""
+import pytest
+
+from main import compile_latency_budgets
+from report import latency_stats, percentile
+from tests.test_runner import outcomes, run_suite
+
+
+def test_percentile_interpolates():
+    assert percentile([4, 1, 3, 2], 50) == 2.5
+    assert percentile([1, 2, 3, 4, 5], 95) == pytest.approx(4.8)
+    assert percentile([7], 99) == 7
+    assert percentile([], 50) is None
+
+
+def test_latency_stats():
+    assert latency_stats([float(ms) for ms in range(1, 101)]) == {
+        "count": 100, "min": 1.0, "p50": 50.5, "p95": 95.05, "p99": 99.01, "max": 100.0}
+
+
+def test_compile_latency_budgets():
+    assert compile_latency_budgets({"p50Ms": 10, "p99.9Ms": 50, "maxMs": 100, "avgMs": 5}) == (
+        ("p50Ms", "p50", 50.0, 10), ("p99.9Ms", "p99.9", 99.9, 50), ("maxMs", "max", None, 100),
+        ("avgMs", None, None, 5))
+    assert compile_latency_budgets(None) == ()
+
+
+def latency_suite(**endpoint):
+    return {"hosts": {"a.example.com": [{"paths": ["/timed"], **endpoint}]}}
+
+
+def test_repeat_and_warmup(tmp_path, echo_server):
+    echo_server.stats.reset()
+    process, report = run_suite(tmp_path, echo_server, latency_suite(repeat=5, warmup=2,
+                                                                      expectedLatency={"p50Ms": 10000}))
+    assert process.returncode == 0, process.stdout + process.stderr
+    # Warmup requests are sent but not measured
+    assert echo_server.stats.requests == 7
+    assert len(report["cases"][0]["samplesMs"]) == 5
+    assert outcomes(report)["GET a.example.com [0] /timed"]["Latency"] == "passed"
+
+
+@pytest.mark.parametrize("expectedLatency, message", [
+    ({"maxMs": 10}, "Latency budget exceeded: max"),
+    ({"p90Ms": 10}, "Latency budget exceeded: p90"),
+    ({"avgMs": 1000}, "Unknown latency budget: avgMs"),
+])
+def test_latency_budget_failures(tmp_path, echo_server, expectedLatency, message):
+    process, report = run_suite(tmp_path, echo_server, latency_suite(
+        repeat=3, expectedLatency=expectedLatency, additionalRequestHeaders={"X-Set-Response-Delay-Ms": "30"}))
+    assert process.returncode == 1
+    assert outcomes(report)["GET a.example.com [0] /timed"]["Latency"] == "failed"
+    assert message in process.stdout
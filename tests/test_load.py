@@ -0,0 +1,53 @@
+"""Tests for open-loop load mode (--load)"""
+from report import latency_histogram
+from tests.test_runner import run_suite
+
+MIXED = {
+    "hosts": {
+        "a.example.com": [
+            {"paths": ["/ok"]},
+            {"paths": ["/missing"], "additionalRequestHeaders": {"X-Set-Response-Status-Code": "404"},
+             "expectedStatus": 404},
+            {"paths": ["/created"], "expectedStatus": 201},
+        ],
+    },
+}
+
+
+def run_load(tmp_path, echo_server, test_file, *args):
+    return run_suite(tmp_path, echo_server, test_file, "--load", *args)
+
+
+def test_latency_histogram():
+    counts = latency_histogram([0.5, 1, 1.5, 7, 20000], bounds=[1, 2, 10])
+    assert counts == {"<=1": 2, "<=2": 1, "<=10": 1, ">10": 1}
+
+
+def test_cases_are_cycled_at_the_offered_rate(tmp_path, echo_server):
+    echo_server.stats.reset()
+    process, report = run_load(tmp_path, echo_server, MIXED, "--rate", "60", "--duration", "0.5")
+    assert process.returncode == 0, process.stdout + process.stderr
+    assert report["requests"] == echo_server.stats.requests == 30
+    assert report["targetRate"] == 60 and report["elapsed"] >= 0.45
+    assert report["expectedStatus"]["200"] == {"requests": 10, "matched": 10, "mismatched": {}, "errors": {},
+                                               "errorRate": 0}
+    assert report["expectedStatus"]["404"]["matched"] == 10
+    assert report["expectedStatus"]["201"]["mismatched"] == {"200": 10}
+    assert report["errorRate"] == round(10 / 30, 6)
+    assert sum(report["histogramMs"].values()) == 30
+
+
+def test_max_error_rate(tmp_path, echo_server):
+    process, _ = run_load(tmp_path, echo_server, MIXED, "--rate", "30", "--duration", "0.2", "--max-error-rate", "0.1")
+    assert process.returncode == 1
+    assert "Error rate 33.33% exceeds 10.00%" in process.stdout
+
+
+def test_latency_counts_time_queued_behind_slow_requests(tmp_path, echo_server):
+    slow = {"hosts": {"a.example.com": [{"paths": ["/slow"],
+                                         "additionalRequestHeaders": {"X-Set-Response-Delay-Ms": "30"}}]}}
+    # One worker serves a request every 30ms while one is due every 20ms
+    process, report = run_load(tmp_path, echo_server, slow, "--rate", "50", "--duration", "0.2",
+                               "--load-workers", "1")
+    assert process.returncode == 0, process.stdout + process.stderr
+    assert report["latencyMs"]["max"] > 2 * report["serviceTimeMs"]["p50"]
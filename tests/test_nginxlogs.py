@@ -0,0 +1,105 @@
+"""Tests for matching nginx log lines to the requests of a run (nginxlogs.py)"""
+import os
+import stat
+
+import pytest
+
+import nginxlogs
+from nginxlogs import LogCapture, LogEntry, upstream_seconds
+from report import RunReport
+
+ACCESS = ('172.18.0.1 "GET /a HTTP/1.1" 200 "python-requests/2.32" rid=run1-1 rt=0.012 urt="{urt}"')
+ERROR = ('2026/10/17 10:00:00 [error] 29#29: *5 connect() failed (111: Connection refused) while connecting to '
+         'upstream, client: 172.18.0.1, server: _, request: "GET /a?x=1 HTTP/1.1", '
+         'upstream: "http://10.0.0.2:80/a", host: "a.example.com"')
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("0.010", 0.01), ("0.010, 0.020", 0.03), ("0.010 : 0.005", 0.015), ("0.001,0.002 : 0.003", 0.006),
+])
+def test_upstream_seconds(value, seconds):
+    assert upstream_seconds(value) == pytest.approx(seconds)
+
+
+def test_key_value_timings():
+    entry = LogEntry(ACCESS.format(urt="0.004, 0.006"))
+    assert entry.request_time == 0.012
+    assert entry.upstream_time == pytest.approx(0.01)
+
+
+def test_json_timings():
+    entry = LogEntry('{"rid": "run1-1", "request_time": "0.250", "upstream_response_time": "0.200"}')
+    assert (entry.request_time, entry.upstream_time) == (0.25, 0.2)
+
+
+def test_lines_without_timings():
+    assert LogEntry(ACCESS.format(urt="-")).upstream_time is None
+    entry = LogEntry('172.18.0.1 - - "GET /a HTTP/1.1" 200 12 "-" "curl/8.0"')
+    assert entry.request_time is None and entry.upstream_time is None
+
+
+def test_lookup_matches_access_lines_by_request_id():
+    capture = LogCapture("nginx", "run1")
+    capture.add(ACCESS.format(urt="0.010"))
+    capture.add(ACCESS.format(urt="0.010").replace("run1-1", "run1-2").replace("rt=0.012 ", ""))
+    capture.add(ACCESS.format(urt="0.010").replace("run1-1", "run2-1"))
+    assert capture.lines == 3
+    found = capture.lookup(["run1-1", "run1-2", "run1-3"], "GET", "a.example.com", "/a")
+    assert found["requests"] == [
+        {"id": "run1-1", "logged": True, "requestTimeMs": 12.0, "upstreamTimeMs": 10.0},
+        {"id": "run1-2", "logged": True, "requestTimeMs": None, "upstreamTimeMs": None},
+        {"id": "run1-3", "logged": False, "requestTimeMs": None, "upstreamTimeMs": None},
+    ]
+    assert len(found["accessLines"]) == 2 and "run2-1" not in " ".join(found["accessLines"])
+    assert found["errorLines"] == []
+
+
+def test_error_lines_are_matched_by_method_host_and_path():
+    capture = LogCapture("nginx", "run1")
+    capture.add(ERROR)
+    assert capture.lookup([], "GET", "a.example.com", "/a?x=1")["errorLines"] == [ERROR]
+    assert capture.lookup([], "GET", "b.example.com", "/a?x=1")["errorLines"] == []
+
+
+def test_lines_per_request_are_limited(monkeypatch):
+    monkeypatch.setattr(nginxlogs, "MAX_LINES", 3)
+    capture = LogCapture("nginx", "run1")
+    for _ in range(5):
+        capture.add(ACCESS.format(urt="0.010"))
+        capture.add(ERROR)
+    found = capture.lookup(["run1-1"], "GET", "a.example.com", "/a?x=1")
+    assert len(found["accessLines"]) == len(found["errorLines"]) == 3
+    assert capture.lines == 10
+
+
+def test_capture_follows_docker_logs(tmp_path, monkeypatch):
+    docker = tmp_path / "docker"
+    docker.write_text("#!/bin/sh\n"
+                      f"echo '{ACCESS.format(urt='0.010')}'\n"
+                      f"echo '{ERROR}' >&2\n")
+    docker.chmod(docker.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    capture = LogCapture("nginx", "run1")
+    assert capture.start()
+    capture.settle(quiet=0.1)
+    capture.stop()
+    found = capture.lookup(["run1-1"], "GET", "a.example.com", "/a?x=1")
+    assert found["requests"][0]["logged"] and found["errorLines"] == [ERROR]
+
+
+def test_capture_without_docker(monkeypatch, tmp_path):
+    monkeypatch.setenv("PATH", str(tmp_path))
+    assert not LogCapture("nginx", "run1").start()
+
+
+def test_report_hints_at_the_log_format(capsys):
+    capture = LogCapture("nginx", "run1")
+    capture.add('172.18.0.1 - - "GET /a HTTP/1.1" 200 12 "-" "python-requests/2.32"')
+    report = RunReport()
+    report.cases.append({"id": "GET a.example.com [0] /a", "method": "GET", "host": "a.example.com", "path": "/a",
+                         "requestIds": ["run1-1"], "assertions": [{"outcome": "passed"}]})
+    report.attach_logs(capture)
+    report.print_logs(capture)
+    out = capsys.readouterr().out
+    assert "nginx logs: 1 line(s), 0 of 1 request(s) found" in out
+    assert "log $http_x_httptests_request_id in nginx's log_format" in out
@@ -0,0 +1,78 @@
+"""Tests for path templates"""
+import pytest
+
+from paths import PathSet, PathTemplate, parse_path_group
+
+
+def test_plain_paths_stay_strings():
+    assert PathTemplate.compile("/health") == "/health"
+    # Braces without a range or list are literal
+    assert PathTemplate.compile("/items/{id}") == "/items/{id}"
+
+
+def test_numeric_range():
+    assert list(PathTemplate("/items/{1..4}")) == ["/items/1", "/items/2", "/items/3", "/items/4"]
+
+
+def test_range_with_step_and_padding():
+    assert list(PathTemplate("/p/{001..30..10}")) == ["/p/001", "/p/011", "/p/021"]
+
+
+def test_descending_and_negative_ranges():
+    assert list(PathTemplate("/{3..1}")) == ["/3", "/2", "/1"]
+    assert list(PathTemplate("/{-1..1}")) == ["/-1", "/0", "/1"]
+
+
+def test_zero_step_is_rejected():
+    with pytest.raises(ValueError, match="step must not be 0"):
+        parse_path_group("1..5..0")
+
+
+def test_lists_expand_to_the_cartesian_product():
+    template = PathTemplate("/{en,de}/{home,about}{.html,}")
+    assert len(template) == 8
+    assert list(template)[:3] == ["/en/home.html", "/en/home", "/en/about.html"]
+    assert list(template)[-1] == "/de/about"
+
+
+def test_index_matches_iteration_order():
+    template = PathTemplate("/{a,b,c}/{1..7}/{x,y}")
+    assert [template[i] for i in range(len(template))] == list(template)
+
+
+def test_huge_template_is_not_enumerated():
+    template = PathTemplate("/users/{1..1000000000}/{1..1000}")
+    assert len(template) == 10 ** 12
+    assert template[10 ** 12 - 1] == "/users/1000000000/1000"
+
+
+def test_sample_is_seeded_and_ordered():
+    entry = {"expand": "/users/{1..1000000}", "sample": 5, "seed": 42}
+    first = list(PathTemplate.compile(entry))
+    assert first == list(PathTemplate.compile(entry))
+    assert len(first) == len(set(first)) == 5
+    assert first == sorted(first, key=lambda path: int(path.rsplit("/", 1)[1]))
+    assert first != list(PathTemplate.compile(dict(entry, seed=43)))
+
+
+def test_sample_larger_than_expansion_takes_everything():
+    template = PathTemplate.compile({"expand": "/{1..3}", "sample": 10})
+    assert len(template) == 3
+    assert sorted(template) == ["/1", "/2", "/3"]
+
+
+@pytest.mark.parametrize("entry, message", [
+    ({"expand": "/{1..3}", "sample": -1}, "non-negative"),
+    ({"expand": "/{1..3}", "sample": "2"}, "non-negative"),
+    ({"paths": "/x"}, "invalid path"),
+    (42, "invalid path"),
+])
+def test_invalid_entries(entry, message):
+    with pytest.raises(ValueError, match=message):
+        PathTemplate.compile(entry)
+
+
+def test_path_set_keeps_declaration_order():
+    paths = PathSet(["/first", "/t/{1..2}", {"expand": "/s/{a,b}"}, "/last"])
+    assert len(paths) == 6
+    assert list(paths) == ["/first", "/t/1", "/t/2", "/s/a", "/s/b", "/last"]
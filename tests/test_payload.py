@@ -0,0 +1,89 @@
+"""Tests for generated request bodies (payload.py)"""
+import hashlib
+
+import pytest
+
+from payload import ASCII_TABLE, LEGACY_CACHE_LIMIT, PayloadBody, PayloadSpec, SizedPayloadBody
+from tests.test_runner import outcomes, run_suite
+
+
+def body_of(spec):
+    return b"".join(bytes(chunk) for chunk in spec.chunks())
+
+
+@pytest.mark.parametrize("spec, message", [
+    ({"size": 1, "source": "disk"}, "payload source must be one of random, seeded, zero, file"),
+    ({"source": "file"}, "payload source 'file' needs a 'path'"),
+    ({"size": -1}, "'size' must be a non-negative integer"),
+    ({"size": "10"}, "'size' must be a non-negative integer"),
+    ({"size": 1, "chunkSize": 0}, "'chunkSize' must be positive"),
+])
+def test_invalid_specs(spec, message):
+    with pytest.raises(ValueError, match=message):
+        PayloadSpec(spec)
+
+
+def test_chunks_add_up_to_the_size():
+    spec = PayloadSpec({"size": 2500, "chunkSize": 1000})
+    assert [len(chunk) for chunk in spec.chunks()] == [1000, 1000, 500]
+
+
+def test_seeded_payloads_are_reproducible_ascii():
+    first = body_of(PayloadSpec({"size": 5000, "source": "seeded", "seed": 7, "chunkSize": 999}))
+    assert first == body_of(PayloadSpec({"size": 5000, "source": "seeded", "seed": 7, "chunkSize": 999}))
+    assert first != body_of(PayloadSpec({"size": 5000, "source": "seeded", "seed": 8, "chunkSize": 999}))
+    assert set(first) <= set(ASCII_TABLE)
+
+
+def test_zero_payload():
+    assert body_of(PayloadSpec({"size": 2500, "source": "zero", "chunkSize": 1000})) == bytes(2500)
+
+
+def test_file_payload(tmp_path):
+    (tmp_path / "data.bin").write_bytes(bytes(range(256)) * 10)
+    spec = PayloadSpec({"source": "file", "path": "data.bin", "chunkSize": 1000}, str(tmp_path))
+    assert spec.size == 2560
+    assert body_of(spec) == bytes(range(256)) * 10
+    short = PayloadSpec({"source": "file", "path": "data.bin", "size": 3000}, str(tmp_path))
+    with pytest.raises(ValueError, match="has 2560 bytes, 3000 requested"):
+        body_of(short)
+
+
+def test_generate_payload_size_is_a_random_payload():
+    spec = PayloadSpec.from_endpoint({"generatePayloadSize": 100})
+    assert (spec.source, spec.size, spec.cache) == ("random", 100, True)
+    assert not PayloadSpec.from_endpoint({"generatePayloadSize": LEGACY_CACHE_LIMIT + 1}).cache
+    assert PayloadSpec.from_endpoint({}) is None
+    with pytest.raises(ValueError, match="'payload' must be an object"):
+        PayloadSpec.from_endpoint({"payload": 100})
+
+
+def test_bodies():
+    assert PayloadSpec({"size": 0}).body() == b""
+    sized = PayloadSpec({"size": 10}).body()
+    assert type(sized) is SizedPayloadBody and len(sized) == 10
+    assert type(PayloadSpec({"size": 10, "chunked": True}).body()) is PayloadBody
+
+
+def test_body_counts_and_hashes_what_was_sent():
+    body = PayloadSpec({"size": 3000, "source": "seeded", "chunkSize": 1000, "verifyChecksum": True}).body()
+    sent = b"".join(bytes(chunk) for chunk in body)
+    assert body.sent == 3000
+    assert body.sha256 == hashlib.sha256(sent).hexdigest()
+
+
+def test_cached_body_is_built_once():
+    spec = PayloadSpec({"size": 3000, "source": "random", "cache": True, "chunkSize": 1000})
+    first, second = spec.body(), spec.body()
+    assert b"".join(bytes(chunk) for chunk in first) == b"".join(bytes(chunk) for chunk in second)
+    assert first.sha256 == second.sha256 == spec.cached()[1]
+
+
+@pytest.mark.parametrize("chunked", [False, True])
+def test_upstream_receives_the_payload(tmp_path, echo_server, chunked):
+    test_file = {"hosts": {"a.example.com": [{"paths": ["/upload"], "method": "POST", "payload": {
+        "size": 3 * 1024 * 1024 + 5, "source": "seeded", "seed": 3, "chunked": chunked, "verifyChecksum": True}}]}}
+    process, report = run_suite(tmp_path, echo_server, test_file, "--runner", "native")
+    assert process.returncode == 0, process.stdout + process.stderr
+    assert outcomes(report)["POST a.example.com [0] /upload"]["Payload Checksum"] == "passed"
+    assert report["cases"][0]["timing"]["requestBytes"] > 3 * 1024 * 1024
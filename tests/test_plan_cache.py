@@ -0,0 +1,77 @@
+"""Tests for caching compiled test plans (--plan-cache)"""
+import json
+
+import pytest
+
+import main
+from main import load_plan, open_plan
+
+TEST_FILE = {
+    "hostOptions": {"limited.example.com": {"rateLimit": {"rps": 5}}},
+    "hosts": {
+        "a.example.com": [
+            {"paths": ["/one", "/items/{1..2}"], "expectedStatus": 200,
+             "burst": {"requests": 3, "expect": {"success": {"min": 1}}}},
+            {"paths": ["/submit"], "method": "POST", "data": "x"},
+        ],
+        "limited.example.com": [{"paths": ["/"]}],
+    },
+}
+
+
+@pytest.fixture
+def test_file(tmp_path):
+    path = tmp_path / "test.json"
+    path.write_text(json.dumps(TEST_FILE))
+    return path
+
+
+def case_summary(plan):
+    return [(case.host, case.method, case.path, case.position) for case in plan.cases()]
+
+
+def test_cached_plan_matches_the_compiled_one(tmp_path, test_file):
+    cache = tmp_path / "cache"
+    compiled = load_plan(str(test_file), str(cache))
+    assert len(list(cache.glob("*.plan.pickle"))) == 1
+    cached = load_plan(str(test_file), str(cache))
+    assert case_summary(cached) == case_summary(compiled) == case_summary(main.TestPlan.stream(str(test_file)))
+    assert cached.rateLimits == {"limited.example.com": {"rps": 5, "burst": 1}}
+    assert cached.endpoints[0].burst.expect == {"success": (1, None)}
+
+
+def test_cache_hit_skips_compiling(tmp_path, test_file, monkeypatch):
+    load_plan(str(test_file), str(tmp_path))
+
+    def compile_again(path):
+        raise AssertionError("compiled again")
+    monkeypatch.setattr(main.TestPlan, "stream", compile_again)
+    assert len(case_summary(load_plan(str(test_file), str(tmp_path)))) == 5
+
+
+def test_changed_file_is_compiled_again(tmp_path, test_file):
+    load_plan(str(test_file), str(tmp_path))
+    test_file.write_text(json.dumps({"hosts": {"b.example.com": [{"paths": ["/b"]}]}}))
+    assert case_summary(load_plan(str(test_file), str(tmp_path))) == [("b.example.com", "GET", "/b", 0)]
+    assert len(list(tmp_path.glob("*.plan.pickle"))) == 2
+
+
+def test_plan_version_changes_the_key(tmp_path, test_file, monkeypatch):
+    load_plan(str(test_file), str(tmp_path))
+    monkeypatch.setattr(main, "PLAN_VERSION", main.PLAN_VERSION + 1)
+    load_plan(str(test_file), str(tmp_path))
+    assert len(list(tmp_path.glob("*.plan.pickle"))) == 2
+
+
+def test_unreadable_cache_is_replaced(tmp_path, test_file):
+    load_plan(str(test_file), str(tmp_path))
+    (cached,) = tmp_path.glob("*.plan.pickle")
+    cached.write_bytes(b"not a pickle")
+    assert len(case_summary(load_plan(str(test_file), str(tmp_path)))) == 5
+    assert cached.read_bytes() != b"not a pickle"
+
+
+def test_without_a_cache_the_file_is_streamed(test_file):
+    plan = open_plan(str(test_file))
+    assert not isinstance(plan.endpoints, tuple)
+    assert len(case_summary(plan)) == 5
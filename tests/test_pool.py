@@ -0,0 +1,110 @@
+"""Tests for the keep-alive ConnectionPool and the Timing of its requests"""
+import http.server
+import threading
+
+import pytest
+import requests
+
+from pool import ConnectionPool, Timing, request_size, response_size, timing_state
+
+
+@pytest.fixture
+def pool():
+    connections = ConnectionPool(pool_size=2)
+    yield connections
+    connections.close()
+
+
+def timed(pool, url, **kwargs):
+    """Send a request with a Timing in place; returns the response and the Timing"""
+    timing_state.current = timing = Timing()
+    try:
+        response = pool.request("GET", url, **kwargs)
+        response.content
+    finally:
+        timing_state.current = None
+    return response, timing
+
+
+def test_connections_are_reused_across_hosts(pool, echo_server):
+    url = f"http://127.0.0.1:{echo_server.port}/"
+    first = timed(pool, url, host="a.example.com")[1]
+    second = timed(pool, url, host="b.example.com")[1]
+    assert first.new_connection and first.dns >= 0 and first.connect > 0
+    assert not second.new_connection and second.dns == second.connect == 0
+    assert pool.session("a.example.com") is pool.session("b.example.com")
+
+
+def test_per_host_sessions():
+    pool = ConnectionPool(per_host=True)
+    assert pool.session("a.example.com") is pool.session("a.example.com")
+    assert pool.session("a.example.com") is not pool.session("b.example.com")
+    pool.close()
+
+
+@pytest.mark.parametrize("default, keep_alive, connection", [
+    (True, None, "keep-alive"), (False, None, "close"), (True, False, "close"), (False, True, "keep-alive"),
+])
+def test_keep_alive(echo_server, default, keep_alive, connection):
+    pool = ConnectionPool(keep_alive=default)
+    response = pool.request("GET", f"http://127.0.0.1:{echo_server.port}/", keep_alive=keep_alive)
+    assert response.json()["headers"]["connection"] == connection
+    pool.close()
+
+
+def test_closed_connection_is_opened_again(pool, echo_server):
+    url = f"http://127.0.0.1:{echo_server.port}/"
+    assert timed(pool, url, keep_alive=False)[1].new_connection
+    assert timed(pool, url)[1].new_connection
+
+
+class CookieHandler(http.server.BaseHTTPRequestHandler):
+    """Sets a cookie and answers with the Cookie header it received"""
+
+    def do_GET(self):
+        body = (self.headers.get("Cookie") or "").encode()
+        self.send_response(200)
+        self.send_header("Set-Cookie", "id=1; Path=/")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_cookies_are_not_replayed(pool):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), CookieHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    try:
+        assert pool.request("GET", url).cookies["id"] == "1"
+        assert pool.request("GET", url).text == ""
+        assert len(pool.session().cookies) == 0
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_requests_without_timing_are_not_timed(pool, echo_server):
+    assert pool.request("GET", f"http://127.0.0.1:{echo_server.port}/").status_code == 200
+
+
+def test_timing_as_dict():
+    timing = Timing()
+    timing.dns, timing.connect, timing.ttfb, timing.total = 0.001, 0.0025, 0.01, 0.0123456
+    timing.status = 200
+    assert timing.as_dict() == {"dnsMs": 1.0, "connectMs": 2.5, "ttfbMs": 10.0, "totalMs": 12.346,
+                                "requestBytes": 0, "responseBytes": 0, "status": 200, "newConnection": False}
+    timing.protocol, timing.stream_id = "h2c", 3
+    assert timing.as_dict()["protocol"] == "h2c" and timing.as_dict()["streamId"] == 3
+
+
+def test_request_and_response_sizes():
+    prepared = requests.Request("POST", "http://example.com/a?b=1", headers={"X-A": "1"}, data=b"body").prepare()
+    # "POST /a?b=1 HTTP/1.1" and the blank line, each header with ": " and CRLF, the body
+    assert request_size(prepared) == 24 + sum(len(k) + len(v) + 4 for k, v in prepared.headers.items()) + 4
+    response = requests.Response()
+    response.status_code, response.reason, response._content = 200, "OK", b"12345"
+    response.headers["Content-Length"] = "5"
+    assert response_size(response) == len("HTTP/1.1 200 OK\r\n\r\n") + len("Content-Length") + 1 + 4 + 5
@@ -0,0 +1,49 @@
+"""Tests for readiness.build_components"""
+import readiness
+
+
+def upstream_targets(config, monkeypatch):
+    """(component name, container probed, port) of the upstream components"""
+    probed = []
+    monkeypatch.setattr(readiness.shutil, "which", lambda name: "/usr/bin/docker")
+    monkeypatch.setattr(readiness, "container_ip", lambda container: probed.append(container) or "10.0.0.2")
+    monkeypatch.setattr(readiness, "tcp_probe", lambda host, port, timeout=1.0: (True, f"tcp {host}:{port} open"))
+    components = readiness.build_components("http://localhost", None, config, mock_container="p_mock",
+                                            forwarder_container="p_forwarder_{port}")
+    targets = []
+    for component in components:
+        if component.name.startswith("upstream "):
+            assert component.probe()
+            targets.append((component.name, probed[-1], component.detail))
+    return targets
+
+
+def test_builtin_mock_probes_mock_container_on_additional_ports(monkeypatch):
+    config = {"mock": {"builtin": True, "network_aliases": ["backend"], "additional_ports": [8080, 9090]},
+              "readiness": {"upstreams": True}}
+    assert upstream_targets(config, monkeypatch) == [
+        ("upstream backend:80", "p_mock", "tcp 10.0.0.2:80 open"),
+        ("upstream backend:8080", "p_mock", "tcp 10.0.0.2:8080 open"),
+        ("upstream backend:9090", "p_mock", "tcp 10.0.0.2:9090 open"),
+    ]
+
+
+def test_image_mock_probes_forwarders_on_additional_ports(monkeypatch):
+    config = {"mock": {"network_aliases": ["backend"], "http_port": 8000, "additional_ports": [8080]},
+              "readiness": {"upstreams": True}}
+    assert upstream_targets(config, monkeypatch) == [
+        ("upstream backend:8000", "p_mock", "tcp 10.0.0.2:8000 open"),
+        ("upstream backend:8080", "p_forwarder_8080", "tcp 10.0.0.2:8080 open"),
+    ]
+
+
+def test_upstreams_can_be_disabled(monkeypatch):
+    config = {"mock": {"builtin": True, "network_aliases": ["backend"], "additional_ports": [8080]},
+              "readiness": {"upstreams": False}}
+    assert upstream_targets(config, monkeypatch) == []
+
+
+def test_declared_hosts_become_components():
+    config = {"readiness": {"upstreams": False, "hosts": {"api.example.com": {"path": "/health", "status": 204}}}}
+    names = [component.name for component in readiness.build_components("http://localhost:8080", None, config)]
+    assert names == ["proxy localhost:8080", "host api.example.com/health"]
@@ -0,0 +1,90 @@
+"""Tests for the run report and its JSON and JUnit output"""
+import json
+import xml.etree.ElementTree as ET
+from types import SimpleNamespace
+
+from pool import Timing
+from report import RunReport
+
+
+def case(path, host="a.example.com", position=0):
+    return SimpleNamespace(case_id=f"GET {host} [0] {path}", position=position, host=host, endpoint_name="[0]",
+                           method="GET", path=path, expectedStatus=200)
+
+
+def timing(total_ms, status=200):
+    result = Timing()
+    result.total = total_ms / 1000
+    result.status = status
+    return result
+
+
+def sample_report():
+    report = RunReport()
+    report.start_case(case("/ok"), timing(10))
+    report.add_assertion("/ok => Test Status Code")
+    report.start_case(case("/bad", host="b.example.com", position=1), timing(30, 500))
+    failed = report.add_assertion("/bad => Test Status Code")
+    failed.update(outcome="failed", message="500 != 200")
+    report.add_assertion("/bad => Response Headers")["outcome"] = "error"
+    return report
+
+
+def test_failed_counts_failures_and_errors():
+    assert sample_report().failed() == 2
+
+
+def test_summary_groups_latencies_per_host_and_endpoint():
+    summary = sample_report().summary()
+    assert summary["hosts"]["a.example.com"]["p50"] == 10.0
+    assert summary["hosts"]["b.example.com"]["max"] == 30.0
+    assert summary["endpoints"]["[0]"]["count"] == 2
+
+
+def test_samples_stand_in_for_the_timing():
+    report = RunReport()
+    record = report.start_case(case("/"), timing(1), samples=[0.001, 0.002, 0.003])
+    assert record["samplesMs"] == [1.0, 2.0, 3.0]
+    assert report.summary()["hosts"]["a.example.com"]["count"] == 3
+
+
+def test_cases_without_timing_are_left_out_of_the_summary():
+    report = RunReport()
+    report.start_case(case("/"), None)
+    assert report.summary() == {"hosts": {}, "endpoints": {}}
+
+
+def test_write_json(tmp_path):
+    path = tmp_path / "report.json"
+    sample_report().write_json(str(path), 3, "test.json")
+    written = json.loads(path.read_text())
+    assert written["testFile"] == "test.json" and written["totalAssertions"] == 3
+    assert [c["id"] for c in written["cases"]] == ["GET a.example.com [0] /ok", "GET b.example.com [0] /bad"]
+    assert written["cases"][1]["timing"]["totalMs"] == 30.0
+    assert written["cases"][1]["assertions"][0] == {"name": "/bad => Test Status Code", "outcome": "failed",
+                                                     "message": "500 != 200"}
+
+
+def test_write_junit(tmp_path):
+    path = tmp_path / "junit.xml"
+    sample_report().write_junit(str(path), "test.json")
+    suite = ET.parse(path).getroot()
+    assert (suite.get("name"), suite.get("tests"), suite.get("failures"), suite.get("errors")) == (
+        "test.json", "3", "1", "1")
+    ok, failed, errored = suite.findall("testcase")
+    assert ok.get("classname") == "a.example.com" and ok.get("time") == "0.010000"
+    assert ok.find("failure") is None
+    assert {p.get("name"): p.get("value") for p in ok.find("properties")}["status"] == "200"
+    assert failed.find("failure").get("message") == "500 != 200"
+    assert errored.find("error") is not None
+
+
+def test_merge_restores_declaration_order(tmp_path):
+    report = sample_report()
+    first, second = RunReport(), RunReport()
+    first.cases, second.cases = [report.cases[1]], [report.cases[0]]
+    first.write_json(str(tmp_path / "1.json"), 2)
+    second.write_json(str(tmp_path / "2.json"), 1)
+    merged, total = RunReport.merge([str(tmp_path / "1.json"), str(tmp_path / "2.json")])
+    assert total == 3
+    assert [c["position"] for c in merged.cases] == [0, 1]
@@ -0,0 +1,99 @@
+"""Tests for running several suites in one environment (run_suites.py)"""
+import json
+import xml.etree.ElementTree as ET
+
+import pytest
+import yaml
+
+from run_suites import Suite, SuiteResult, discover, generate_compose, plan_suites, write_json, write_junit
+
+
+def make_suite(root, name, config=None, test_file="test.json"):
+    suite_dir = root / name / ".httptests"
+    suite_dir.mkdir(parents=True)
+    (suite_dir / test_file).write_text("{}")
+    (root / name / "Dockerfile").write_text("FROM nginx\n")
+    if config is not None:
+        (suite_dir / "config.yml").write_text(yaml.safe_dump(config))
+    return str(suite_dir)
+
+
+def test_discover_finds_suites_with_a_test_file(tmp_path):
+    make_suite(tmp_path, "b")
+    make_suite(tmp_path, "a/nested", test_file="test.jsonl")
+    (tmp_path / "empty" / ".httptests").mkdir(parents=True)
+    make_suite(tmp_path, "node_modules/dep")
+    assert discover(str(tmp_path)) == [str(tmp_path / "a/nested/.httptests"), str(tmp_path / "b/.httptests")]
+
+
+def test_plan_suites_names_and_ports(tmp_path):
+    dirs = [make_suite(tmp_path, "Api/V1"), make_suite(tmp_path, "api-v1"), make_suite(tmp_path, "web")]
+    suites = plan_suites(str(tmp_path), dirs, "proj", 9000)
+    assert [(s.name, s.slug, s.port, s.prefix) for s in suites] == [
+        ("Api/V1", "api-v1", 9000, "proj_api-v1"), ("api-v1", "api-v1-2", 9001, "proj_api-v1-2"),
+        ("web", "web", 9002, "proj_web")]
+    assert suites[2].base_url == "http://localhost:9002"
+    assert suites[0].test_file.endswith("test.json")
+
+
+def test_plan_suites_rejects_shared_host_ports(tmp_path):
+    dirs = [make_suite(tmp_path, "a", {"nginx": {"ports": ["8443:443"]}}),
+            make_suite(tmp_path, "b", {"nginx": {"ports": [8443]}})]
+    with pytest.raises(ValueError, match="b: host port 8443 is already published by a"):
+        plan_suites(str(tmp_path), dirs, "proj", 9000)
+    # An extra port of one suite may also collide with the port given to the next
+    dirs = [make_suite(tmp_path, "c", {"nginx": {"ports": [9001]}}), make_suite(tmp_path, "d")]
+    with pytest.raises(ValueError, match="d: host port 9001 is already published by c"):
+        plan_suites(str(tmp_path), dirs, "proj", 9000)
+
+
+def test_suites_with_the_same_mock_share_it(tmp_path):
+    builtin = {"mock": {"builtin": True, "network_aliases": ["api.internal"]}}
+    dirs = [make_suite(tmp_path, "a", builtin),
+            make_suite(tmp_path, "b", {"mock": {"builtin": True, "network_aliases": ["auth.internal"]}}),
+            make_suite(tmp_path, "c", {"mock": {"network_aliases": ["api.internal"]}})]
+    suites = plan_suites(str(tmp_path), dirs, "proj", 9000)
+    compose = generate_compose(suites, "proj")
+    assert set(compose["networks"]) == {"mocks-1", "mocks-2"}
+    services = compose["services"]
+    assert set(services) == {"mock-1", "mock-2", "a-nginx", "b-nginx", "c-nginx"}
+    assert services["mock-1"]["networks"]["mocks-1"]["aliases"] == ["api.internal", "auth.internal"]
+    assert services["mock-2"]["networks"]["mocks-2"]["aliases"] == ["api.internal"]
+    assert services["a-nginx"]["networks"] == services["b-nginx"]["networks"] == ["mocks-1"]
+    assert services["c-nginx"]["networks"] == ["mocks-2"] and services["c-nginx"]["depends_on"] == ["mock-2"]
+    assert services["a-nginx"]["ports"] == ["9000:80"]
+    assert [suite.mock_prefix for suite in suites] == ["proj_mocks1", "proj_mocks1", "proj_mocks2"]
+
+
+def result(tmp_path, name, exit_code, report=None, junit=None):
+    suite = Suite(make_suite(tmp_path, name), name, name, 9000, "proj")
+    report_path = junit_path = None
+    if report is not None:
+        report_path = str(tmp_path / f"{name}.json")
+        (tmp_path / f"{name}.json").write_text(json.dumps(report))
+    if junit is not None:
+        junit_path = str(tmp_path / f"{name}.xml")
+        (tmp_path / f"{name}.xml").write_text(junit)
+    return SuiteResult(suite, exit_code, "", 1.5, report_path, junit_path)
+
+
+def test_write_junit_adds_an_error_for_suites_without_a_report(tmp_path):
+    passed = result(tmp_path, "a", 0, junit='<testsuite tests="2" failures="1" errors="0">'
+                                          '<testcase name="x"/><testcase name="y"><failure/></testcase></testsuite>')
+    crashed = result(tmp_path, "b", 2)
+    write_junit(str(tmp_path / "all.xml"), [passed, crashed])
+    root = ET.parse(tmp_path / "all.xml").getroot()
+    assert (root.get("tests"), root.get("failures"), root.get("errors")) == ("3", "1", "1")
+    first, second = root.findall("testsuite")
+    assert (first.get("name"), first.get("time"), len(first)) == ("a", "1.500", 2)
+    assert second.find("testcase/error").get("message") == "main.py exited with 2"
+
+
+def test_write_json_tags_cases_with_their_suite(tmp_path):
+    report = {"totalAssertions": 3, "cases": [{"id": "x", "assertions": [{"outcome": "passed"}]},
+                                              {"id": "y", "assertions": [{"outcome": "failed"}]}]}
+    write_json(str(tmp_path / "all.json"), "root", [result(tmp_path, "a", 1, report), result(tmp_path, "b", 2)])
+    combined = json.loads((tmp_path / "all.json").read_text())
+    assert (combined["totalAssertions"], combined["failedAssertions"]) == (3, 1)
+    assert [(s["name"], s["exitCode"], s["cases"]) for s in combined["suites"]] == [("a", 1, 2), ("b", 2, 0)]
+    assert [(c["suite"], c["id"]) for c in combined["cases"]] == [("a", "x"), ("a", "y")]
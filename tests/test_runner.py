@@ -0,0 +1,156 @@
+"""End-to-end tests of main.py against the echo server"""
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+
+import pytest
+import requests
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+PASSING = {
+    "collectionHeaders": [["user-agent"], ["accept-encoding"]],
+    "hosts": {
+        "a.example.com": [
+            {"paths": ["/one", "/items/{1..3}"],
+             "expectedResponseHeaders": [["Content-Type", "application/json; charset=utf-8"]],
+             "expectedRequestHeadersToUpstream": [["host", "a.example.com"], ["$collectionheaders"]]},
+            {"paths": ["/missing"], "additionalRequestHeaders": {"X-Set-Response-Status-Code": "404"},
+             "expectedStatus": 404},
+            {"paths": ["/submit"], "method": "POST", "data": "hello"},
+        ],
+        "b.example.com": [
+            {"paths": ["/b"], "additionalRequestHeaders": {"X-A": "1"},
+             # Requests go out as given: no request ID header and the default User-Agent without --nginx-logs
+             "expectedRequestHeadersToUpstream": [["x-a", "1"], ["x-gone", "$deleted"],
+                                                  ["x-httptests-request-id", "$deleted"],
+                                                  ["user-agent", requests.utils.default_user_agent()]]},
+        ],
+    },
+}
+
+FAILING = {
+    "hosts": {
+        "a.example.com": [
+            {"paths": ["/ok"]},
+            {"paths": ["/status"], "expectedStatus": 201},
+            {"paths": ["/header"], "expectedResponseHeaders": [["X-Test", "yes"]]},
+            {"paths": ["/upstream"], "expectedRequestHeadersToUpstream": [["x-a", "1"]]},
+        ],
+    },
+}
+
+
+def run_suite(tmp_path, echo_server, test_file, *args):
+    """Run main.py on a test file; returns the completed process and its JSON report"""
+    path = tmp_path / "test.json"
+    path.write_text(json.dumps(test_file))
+    report = tmp_path / "report.json"
+    process = subprocess.run(
+        [sys.executable, MAIN, "--test-file", str(path), "--base-url", f"http://127.0.0.1:{echo_server.port}",
+         "--skip-health-check", "--report-json", str(report), *args],
+        capture_output=True, text=True, timeout=60)
+    return process, json.loads(report.read_text())
+
+
+def outcomes(report):
+    """{case id: {assertion: outcome}}, without the case prefix of assertion names"""
+    return {case["id"]: {assertion["name"].split(" => ")[-1]: assertion["outcome"]
+                         for assertion in case["assertions"]} for case in report["cases"]}
+
+
+@pytest.mark.parametrize("args", [["--runner", "native"], ["--runner", "native", "--concurrency", "4"], []],
+                         ids=["native", "concurrent", "unittest"])
+def test_passing_suite(tmp_path, echo_server, args):
+    process, report = run_suite(tmp_path, echo_server, PASSING, *args)
+    assert process.returncode == 0, process.stdout + process.stderr
+    cases = outcomes(report)
+    assert list(cases) == [
+        "GET a.example.com [0] /one", "GET a.example.com [0] /items/1", "GET a.example.com [0] /items/2",
+        "GET a.example.com [0] /items/3", "GET a.example.com [1] /missing", "POST a.example.com [2] /submit",
+        "GET b.example.com [0] /b",
+    ]
+    assert all(outcome == "passed" for case in cases.values() for outcome in case.values())
+    assert cases["GET a.example.com [0] /one"] == {
+        "Test Status Code": "passed", "Response Headers": "passed", "Request Headers": "passed"}
+    assert all(case["timing"]["status"] for case in report["cases"])
+
+
+@pytest.mark.parametrize("args", [["--runner", "native"], []], ids=["native", "unittest"])
+def test_failing_assertions(tmp_path, echo_server, args):
+    process, report = run_suite(tmp_path, echo_server, FAILING, *args)
+    assert process.returncode == 1
+    cases = outcomes(report)
+    assert set(cases["GET a.example.com [0] /ok"].values()) == {"passed"}
+    assert cases["GET a.example.com [1] /status"]["Test Status Code"] == "failed"
+    assert cases["GET a.example.com [2] /header"]["Response Headers"] == "failed"
+    assert cases["GET a.example.com [3] /upstream"]["Request Headers"] == "failed"
+    messages = [assertion.get("message", "") for case in report["cases"] for assertion in case["assertions"]]
+    assert any("x-test" in message for message in messages)
+
+
+def test_failures_are_listed(tmp_path, echo_server):
+    process, _ = run_suite(tmp_path, echo_server, FAILING, "--runner", "native", "--quiet")
+    assert "Cases: 1 passed, 3 failed" in process.stdout
+    assert "✗ GET a.example.com [1] /status: Test Status Code" in process.stdout
+
+
+def test_shards_split_the_cases(tmp_path, echo_server):
+    ids = []
+    for shard in ("1/2", "2/2"):
+        process, report = run_suite(tmp_path, echo_server, PASSING, "--runner", "native", "--shard", shard)
+        assert process.returncode == 0, process.stdout + process.stderr
+        ids += [case["id"] for case in report["cases"]]
+    assert sorted(ids) == sorted(outcomes(run_suite(tmp_path, echo_server, PASSING, "--runner", "native")[1]))
+
+
+def test_nginx_logs_send_request_ids(tmp_path, echo_server, monkeypatch):
+    # docker logs of a container that logs nothing
+    docker = tmp_path / "bin" / "docker"
+    docker.parent.mkdir()
+    docker.write_text("#!/bin/sh\nexit 0\n")
+    docker.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{docker.parent}{os.pathsep}{os.environ['PATH']}")
+    test_file = {"hosts": {"a.example.com": [
+        {"paths": ["/"], "expectedRequestHeadersToUpstream": [["x-httptests-request-id"],
+                                                              ["user-agent", requests.utils.default_user_agent()]]},
+    ]}}
+    process, report = run_suite(tmp_path, echo_server, test_file, "--runner", "native", "--nginx-logs")
+    assert process.returncode == 0, process.stdout + process.stderr
+    case = report["cases"][0]
+    assert case["nginx"]["requests"] == [{"id": case["requestIds"][0], "logged": False, "requestTimeMs": None,
+                                          "upstreamTimeMs": None}]
+
+
+def read_head(sock):
+    """Status line and headers of the next response on a raw socket"""
+    data = b""
+    while b"\r\n\r\n" not in data:
+        chunk = sock.recv(1)
+        assert chunk, "connection closed"
+        data += chunk
+    return data.decode("latin-1")
+
+
+def test_echo_server_head_has_no_body(echo_server):
+    with socket.create_connection(("127.0.0.1", echo_server.port), timeout=5) as sock:
+        sock.sendall(b"HEAD /page HTTP/1.1\r\nHost: a\r\n\r\n")
+        head = read_head(sock)
+        assert head.startswith("HTTP/1.1 200 ")
+        # The Content-Length of the GET response, but no body follows on the keep-alive connection
+        assert int(re.search(r"Content-Length: (\d+)", head).group(1)) > 0
+        sock.sendall(b"GET /next HTTP/1.1\r\nHost: a\r\n\r\n")
+        assert read_head(sock).startswith("HTTP/1.1 200 ")
+
+
+def test_head_and_get_on_one_connection(tmp_path, echo_server):
+    test_file = {"hosts": {"a.example.com": [
+        {"paths": ["/one", "/two"], "method": "HEAD"},
+        {"paths": ["/three"], "expectedRequestHeadersToUpstream": [["host", "a.example.com"]]},
+    ]}}
+    process, report = run_suite(tmp_path, echo_server, test_file, "--runner", "native")
+    assert process.returncode == 0, process.stdout + process.stderr
+    assert [case["timing"]["newConnection"] for case in report["cases"]] == [True, False, False]
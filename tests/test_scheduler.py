@@ -0,0 +1,182 @@
+"""Tests for the case scheduler and token buckets"""
+import threading
+from time import perf_counter, sleep
+
+import pytest
+
+from scheduler import CaseScheduler, TokenBucket
+
+
+class FakeCase:
+    def __init__(self, name, host="free.test", sleep=0, delay=0.0):
+        self.name = name
+        self.host = host
+        self.sleep = sleep
+        self.delay = delay
+
+
+class Recorder:
+    """fetch() stand-in recording when each case was sent and how many ran at once"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent = {}
+        self.active = 0
+        self.peak = 0
+        self.start = perf_counter()
+
+    def __call__(self, case, throttle, report_errors=True):
+        throttle()
+        with self.lock:
+            self.sent[case.name] = perf_counter() - self.start
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        sleep(case.delay)
+        with self.lock:
+            self.active -= 1
+        if case.name.startswith("fail"):
+            raise ConnectionError(case.name)
+        return f"response {case.name}"
+
+
+def test_token_bucket_burst_then_rate():
+    bucket = TokenBucket(rps=10, burst=2)
+    now = bucket.updated
+    assert bucket.try_take(now) == 0
+    assert bucket.try_take(now) == 0
+    assert bucket.try_take(now) == pytest.approx(0.1)
+    # Refilled after a tenth of a second
+    assert bucket.try_take(now + 0.1) == 0
+    # Never holds more than burst tokens
+    assert bucket.try_take(now + 10) == 0
+    assert bucket.try_take(now + 10) == 0
+    assert bucket.try_take(now + 10) > 0
+
+
+@pytest.mark.parametrize("rps", [0, -1])
+def test_token_bucket_rejects_non_positive_rate(rps):
+    with pytest.raises(ValueError, match="rps must be > 0"):
+        TokenBucket(rps)
+
+
+def test_results_come_back_in_declaration_order():
+    cases = [FakeCase(f"c{i}", delay=0.05 if i % 2 == 0 else 0.0) for i in range(10)]
+    fetch = Recorder()
+    results = list(CaseScheduler(fetch, concurrency=4).run(cases))
+    assert [case.name for case, _ in results] == [case.name for case in cases]
+    assert [response for _, response in results] == [f"response c{i}" for i in range(10)]
+    assert fetch.peak == 4
+
+
+def test_concurrency_of_one_sends_one_at_a_time():
+    fetch = Recorder()
+    list(CaseScheduler(fetch, concurrency=1).run([FakeCase(f"c{i}", delay=0.01) for i in range(5)]))
+    assert fetch.peak == 1
+
+
+def test_rate_limited_host_does_not_hold_up_others():
+    limited = [FakeCase(f"slow{i}", host="limited.test") for i in range(4)]
+    free = [FakeCase(f"free{i}") for i in range(4)]
+    fetch = Recorder()
+    results = list(CaseScheduler(fetch, concurrency=2, rate_limits={"limited.test": {"rps": 20, "burst": 1}})
+                   .run(limited + free))
+    assert [case.name for case, _ in results] == [case.name for case in limited + free]
+    slow = sorted(fetch.sent[case.name] for case in limited)
+    # One request per 50ms on the limited host
+    assert all(later - earlier >= 0.04 for earlier, later in zip(slow, slow[1:]))
+    # The free host finished long before the limited one
+    assert max(fetch.sent[case.name] for case in free) < slow[-1]
+
+
+def test_throttled_host_beyond_the_window_does_not_hold_up_others():
+    # More throttled cases than the look-ahead window, listed before the free ones
+    scheduler = CaseScheduler(Recorder(), concurrency=8)
+    throttled = [FakeCase(f"slow{i}", host="sleepy.test", sleep=0.01) for i in range(scheduler.max_outstanding + 36)]
+    free = [FakeCase(f"free{i}") for i in range(200)]
+    fetch = scheduler.fetch
+    started = perf_counter()
+    results = list(scheduler.run(throttled + free))
+    elapsed = perf_counter() - started
+    assert [case.name for case, _ in results] == [case.name for case in throttled + free]
+    first_free = min(fetch.sent[case.name] for case in free)
+    last_slow = max(fetch.sent[case.name] for case in throttled)
+    # The free host starts right away instead of after the throttled cases filled the window
+    assert first_free < 0.2 < last_slow
+    # The run takes as long as the throttled host alone (100 x 10ms), not that plus the free host
+    assert elapsed < last_slow + 0.5
+
+
+def test_waiting_throttled_cases_are_read_ahead_up_to_a_limit():
+    read = []
+
+    def cases():
+        for i in range(500):
+            read.append(i)
+            yield FakeCase(f"s{i}", host="sleepy.test", sleep=0.001)
+
+    scheduler = CaseScheduler(Recorder(), concurrency=2)
+    scheduler.max_waiting = 50
+    results = scheduler.run(cases())
+    next(results)
+    sleep(0.05)
+    # Waiting cases, plus those sent since and held until consumed
+    assert len(read) <= scheduler.max_waiting + scheduler.max_outstanding + 1
+    assert sum(1 for _ in results) == 499
+
+
+def test_sleep_serializes_a_host():
+    cases = [FakeCase(f"s{i}", host="sleepy.test", sleep=0.03, delay=0.01) for i in range(3)]
+    fetch = Recorder()
+    list(CaseScheduler(fetch, concurrency=4).run(cases))
+    sent = [fetch.sent[case.name] for case in cases]
+    assert fetch.peak == 1
+    # Each request waits for the previous one (10ms) plus the sleep (30ms)
+    assert all(later - earlier >= 0.035 for earlier, later in zip(sent, sent[1:]))
+
+
+def test_cases_are_read_lazily():
+    read = []
+
+    def cases():
+        for i in range(1000):
+            read.append(i)
+            yield FakeCase(f"c{i}")
+
+    scheduler = CaseScheduler(Recorder(), concurrency=2)
+    results = scheduler.run(cases())
+    next(results)
+    sleep(0.05)
+    # Only the look-ahead window has been pulled from the generator
+    assert len(read) <= scheduler.max_outstanding + 1
+    assert sum(1 for _ in results) == 999
+
+
+def test_look_ahead_grows_with_concurrency():
+    assert CaseScheduler(Recorder(), concurrency=1).max_outstanding == CaseScheduler.min_outstanding
+    assert CaseScheduler(Recorder(), concurrency=100).max_outstanding == 100 * CaseScheduler.look_ahead
+
+
+def test_errors_are_raised_in_order():
+    results = CaseScheduler(Recorder(), concurrency=2).run([FakeCase("ok"), FakeCase("fail1"), FakeCase("late")])
+    assert next(results)[1] == "response ok"
+    with pytest.raises(ConnectionError, match="fail1"):
+        next(results)
+
+
+def test_return_errors_yields_the_exception():
+    results = list(CaseScheduler(Recorder(), concurrency=2)
+                   .run([FakeCase("ok"), FakeCase("fail1"), FakeCase("late")], return_errors=True))
+    assert results[0][1] == "response ok"
+    assert isinstance(results[1][1], ConnectionError)
+    assert results[2][1] == "response late"
+
+
+def test_error_reading_cases_follows_the_cases_read_before():
+    def cases():
+        yield FakeCase("first")
+        raise ValueError("broken test file")
+
+    results = CaseScheduler(Recorder()).run(cases())
+    assert next(results)[1] == "response first"
+    with pytest.raises(ValueError, match="broken test file"):
+        next(results)
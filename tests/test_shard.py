@@ -0,0 +1,79 @@
+"""Tests for splitting the cases of a test file into shards (--shard)"""
+import argparse
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from main import load_case_durations, parse_shard, shard_cases
+
+
+def cases(count, host="a.example.com", sleep=0):
+    return [SimpleNamespace(case_id=f"{host} {i}", host=host, sleep=sleep) for i in range(count)]
+
+
+def split(all_cases, total, **options):
+    return [list(shard_cases(iter(all_cases), shard, total, **options)) for shard in range(1, total + 1)]
+
+
+@pytest.mark.parametrize("value, shard", [("1/3", (1, 3)), (" 3 / 3 ", (3, 3)), ("1/1", (1, 1))])
+def test_parse_shard(value, shard):
+    assert parse_shard(value) == shard
+
+
+@pytest.mark.parametrize("value", ["0/3", "4/3", "1", "a/b", "", None])
+def test_parse_shard_rejects(value):
+    with pytest.raises(argparse.ArgumentTypeError, match="expected i/N"):
+        parse_shard(value)
+
+
+def test_round_robin_without_durations():
+    shards = split(cases(7), 3)
+    assert [[case.case_id[-1] for case in shard] for shard in shards] == [["0", "3", "6"], ["1", "4"], ["2", "5"]]
+
+
+def test_every_case_in_exactly_one_shard():
+    all_cases = cases(50) + cases(20, host="b.example.com", sleep=0.1) + cases(30, host="c.example.com")
+    shards = split(all_cases, 4, durations={case.case_id: i % 7 + 1 for i, case in enumerate(all_cases)},
+                   throttled_hosts={"c.example.com"})
+    assert sorted(case.case_id for shard in shards for case in shard) == sorted(case.case_id for case in all_cases)
+
+
+def test_durations_balance_the_shards():
+    all_cases = cases(6)
+    durations = {"a.example.com 0": 100, "a.example.com 1": 10, "a.example.com 2": 10, "a.example.com 3": 10}
+    shards = split(all_cases, 2, durations=durations)
+    # The slow first case fills shard 1; unknown cases cost the median (10)
+    assert [case.case_id for case in shards[0]] == ["a.example.com 0"]
+    assert len(shards[1]) == 5
+
+
+def test_throttled_hosts_stay_on_one_shard():
+    all_cases = [case for pair in zip(cases(6), cases(6, host="slow.example.com")) for case in pair]
+    all_cases += cases(4, host="sleepy.example.com", sleep=0.5)
+    shards = split(all_cases, 3, throttled_hosts={"slow.example.com"})
+    for host in ("slow.example.com", "sleepy.example.com"):
+        assert sum(any(case.host == host for case in shard) for shard in shards) == 1
+    # Other cases go to the less loaded shards
+    assert {case.host for case in shards[1]} == {"slow.example.com"}
+
+
+def test_cases_are_read_lazily():
+    read = []
+
+    def stream():
+        for case in cases(1000):
+            read.append(case)
+            yield case
+    first = next(shard_cases(stream(), 2, 4))
+    assert first.case_id == "a.example.com 1" and len(read) == 2
+
+
+def test_load_case_durations(tmp_path):
+    path = tmp_path / "report.json"
+    path.write_text(json.dumps({"cases": [
+        {"id": "a", "timing": {"totalMs": 5.0}},
+        {"id": "b", "timing": {"totalMs": 1.0}, "samplesMs": [1.0, 2.0, 3.0]},
+        {"id": "c", "timing": None},
+    ]}))
+    assert load_case_durations(str(path)) == {"a": 5.0, "b": 6.0}
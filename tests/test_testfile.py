@@ -0,0 +1,172 @@
+"""Tests for the streaming test file reader"""
+import io
+import json
+
+import pytest
+
+import testfile
+from testfile import JsonStream
+
+
+def stream(text, chunk_size=4):
+    """JsonStream over text read in tiny chunks, so every value crosses chunk boundaries"""
+    return JsonStream(io.StringIO(text), chunk_size=chunk_size)
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("value", [
+    12345678901234567890,
+    -1.5e10,
+    "a \"quoted\" string with \\ and unicode é",
+    {"nested": [1, {"deep": [True, False, None]}], "empty": {}},
+    [],
+])
+def test_value_decodes_across_chunks(value):
+    s = stream(json.dumps(value) + " ")
+    assert s.value() == value
+    assert s.peek() == ""
+
+
+def test_number_at_end_of_chunk_is_not_cut():
+    # "12" fits the first chunk exactly; the digits that follow must not be lost
+    s = stream("[12345, 6]", chunk_size=3)
+    items = []
+    for _ in s.array_items():
+        items.append(s.value())
+    assert items == [12345, 6]
+
+
+def test_large_value_is_read_with_growing_chunks():
+    big = {"paths": ["/p/%d" % i for i in range(2000)]}
+    s = stream(json.dumps(big), chunk_size=16)
+    assert s.value() == big
+
+
+def test_sliding_buffer_drops_consumed_input():
+    items = [{"n": i, "pad": "x" * 100} for i in range(200)]
+    s = stream(json.dumps(items), chunk_size=256)
+    for index in s.array_items():
+        assert s.value()["n"] == index
+        # Only about one chunk plus the current item is ever held
+        assert len(s.buffer) < 1024
+
+
+def test_object_keys_and_skip():
+    s = stream('{"skip": {"a": ["]", "}", "\\"{"]}, "keep": [1, 2], "after": "x"}')
+    seen = {}
+    for key in s.object_keys():
+        if key == "skip":
+            s.skip()
+        else:
+            seen[key] = s.value()
+    assert seen == {"keep": [1, 2], "after": "x"}
+
+
+def test_pick_stops_once_wanted_keys_are_found():
+    s = stream('{"headers": {"a": "1"}, "body": "never decoded"')
+    assert s.pick({"headers": ()}) == {"headers": {"a": "1"}}
+
+
+def test_pick_skips_obsolete_keys():
+    s = stream('{"sha256": "abc", "body": "large", "size": 5}')
+    assert s.pick({"sha256": ("body",), "body": (), "size": ()}) == {"sha256": "abc", "size": 5}
+
+
+def test_error_points_at_line():
+    s = stream('{\n  "a": 1,\n  "b": [1, 2,,]\n}')
+    with pytest.raises(testfile.TestFileError, match="line 3"):
+        for key in s.object_keys():
+            s.value()
+
+
+def test_expect_reports_end_of_file():
+    s = stream('{"a": 1')
+    with pytest.raises(testfile.TestFileError, match="found end of file"):
+        for key in s.object_keys():
+            s.value()
+
+
+def test_unterminated_string_while_skipping():
+    s = stream('["abc')
+    with pytest.raises(testfile.TestFileError, match="unterminated string"):
+        s.skip()
+
+
+def test_json_settings_after_hosts(tmp_path):
+    path = write(tmp_path, "test.json", json.dumps({
+        "hosts": {"a.test": [{"paths": ["/1"]}, {"paths": ["/2"]}], "b.test": [{"paths": ["/3"]}]},
+        "collectionHeaders": [["X-Request-Id"]],
+        "hostOptions": {"a.test": {"rateLimit": {"rps": 5}}},
+    }))
+    test_file = testfile.TestFile(path)
+    assert test_file.collection_headers == [["X-Request-Id"]]
+    assert test_file.host_options == {"a.test": {"rateLimit": {"rps": 5}}}
+    assert [(host, index, where) for host, index, _, where in test_file] == [
+        ("a.test", 0, "hosts['a.test'][0]"),
+        ("a.test", 1, "hosts['a.test'][1]"),
+        ("b.test", 0, "hosts['b.test'][0]"),
+    ]
+
+
+def test_endpoints_are_re_iterable(tmp_path):
+    path = write(tmp_path, "test.json", '{"hosts": {"a.test": [{"paths": ["/1"]}]}}')
+    test_file = testfile.TestFile(path)
+    assert list(test_file) == list(test_file)
+
+
+def test_json_error_names_the_endpoint(tmp_path):
+    path = write(tmp_path, "test.json", '{"hosts": {"a.test": [{"paths": ["/1"]}, {"paths": [}]}}')
+    with pytest.raises(testfile.TestFileError) as error:
+        list(testfile.TestFile(path))
+    assert str(error.value).startswith(f"{path}: hosts['a.test'][1]: line 1")
+
+
+def test_json_endpoint_must_be_an_object(tmp_path):
+    path = write(tmp_path, "test.json", '{"hosts": {"a.test": ["/1"]}}')
+    with pytest.raises(testfile.TestFileError, match=r"hosts\['a.test'\]\[0\]: expected an endpoint object"):
+        list(testfile.TestFile(path))
+
+
+def test_json_missing_hosts(tmp_path):
+    path = write(tmp_path, "test.json", '{"collectionHeaders": []}')
+    with pytest.raises(testfile.TestFileError, match="missing 'hosts'"):
+        list(testfile.TestFile(path))
+
+
+def test_jsonl_settings_and_indexes(tmp_path):
+    path = write(tmp_path, "test.jsonl", "\n".join([
+        '{"collectionHeaders": [["X-A"]]}',
+        '',
+        '{"host": "a.test", "paths": ["/1"]}',
+        '{"host": "b.test", "paths": ["/2"]}',
+        '{"host": "a.test", "paths": ["/3"]}',
+    ]))
+    test_file = testfile.TestFile(path)
+    assert test_file.collection_headers == [["X-A"]]
+    assert [(host, index, endpoint["paths"], where) for host, index, endpoint, where in test_file] == [
+        ("a.test", 0, ["/1"], "line 3"),
+        ("b.test", 0, ["/2"], "line 4"),
+        ("a.test", 1, ["/3"], "line 5"),
+    ]
+
+
+def test_jsonl_settings_after_endpoints_are_rejected(tmp_path):
+    path = write(tmp_path, "test.jsonl", '{"host": "a.test", "paths": ["/1"]}\n{"hostOptions": {}}\n')
+    with pytest.raises(testfile.TestFileError, match="line 2: settings lines must come before the first endpoint"):
+        list(testfile.TestFile(path))
+
+
+def test_jsonl_invalid_line(tmp_path):
+    path = write(tmp_path, "test.jsonl", '{"host": "a.test", "paths": ["/1"]}\n{"host": \n')
+    with pytest.raises(testfile.TestFileError, match="line 2"):
+        list(testfile.TestFile(path))
+
+
+def test_missing_file(tmp_path):
+    with pytest.raises(testfile.TestFileError, match="No such file"):
+        testfile.TestFile(str(tmp_path / "missing.json"))
@@ -0,0 +1,208 @@
+"""Tests for warm.py syncing and nginx reloads, with docker calls recorded instead of run"""
+import json
+import subprocess
+
+import pytest
+
+import warm
+from warm import WarmEnvironment, container_paths, copy_instructions
+
+DOCKERFILE = """\
+FROM alpine AS build
+COPY unused.conf /tmp/
+FROM nginx:alpine
+COPY --from=build /tmp/unused.conf /etc/
+COPY nginx.conf \\
+     /etc/nginx/nginx.conf
+COPY conf.d/ /etc/nginx/conf.d/
+"""
+
+SITE = """\
+server {
+    listen 80;
+    location / {
+        proxy_pass http://backend:8080;
+    }
+}
+"""
+
+
+def test_copy_instructions_of_the_final_stage(tmp_path):
+    dockerfile = tmp_path / "Dockerfile"
+    dockerfile.write_text(DOCKERFILE)
+    assert copy_instructions(str(dockerfile)) == [
+        (["nginx.conf"], "/etc/nginx/nginx.conf"),
+        (["conf.d"], "/etc/nginx/conf.d/"),
+    ]
+
+
+@pytest.mark.parametrize("rel_path, instructions, expected", [
+    ("nginx.conf", [(["nginx.conf"], "/etc/nginx/nginx.conf")], ["/etc/nginx/nginx.conf"]),
+    ("nginx.conf", [(["nginx.conf"], "/etc/nginx/")], ["/etc/nginx/nginx.conf"]),
+    ("conf.d/a/site.conf", [(["conf.d"], "/etc/nginx/conf.d/")], ["/etc/nginx/conf.d/a/site.conf"]),
+    ("conf.d/site.conf", [(["."], "/app")], ["/app/conf.d/site.conf"]),
+    ("site.conf", [(["*.conf"], "/etc/nginx/conf.d/")], ["/etc/nginx/conf.d/site.conf"]),
+    # Wildcards do not cross directories
+    ("conf.d/site.conf", [(["*.conf"], "/etc/nginx/conf.d/")], []),
+    ("other.conf", [(["nginx.conf"], "/etc/nginx/nginx.conf")], []),
+])
+def test_container_paths(rel_path, instructions, expected):
+    assert container_paths(rel_path, instructions) == expected
+
+
+class Docker:
+    """Records docker calls; ``nginx -t`` exits with ``test_status``"""
+
+    def __init__(self):
+        self.calls = []
+        self.copied = {}
+        self.test_status = 0
+
+    def run(self, command, **kwargs):
+        self.calls.append(command)
+        if command[:2] == ["docker", "cp"]:
+            with open(command[2], "r", encoding="utf-8") as f:
+                self.copied[command[3]] = f.read()
+        returncode = self.test_status if command[-1] == "-t" else 0
+        return subprocess.CompletedProcess(command, returncode, stdout="", stderr="nginx: [emerg] broken")
+
+    def commands(self):
+        return [" ".join(call[:2] + call[3:]) if call[1] == "cp" else " ".join(call) for call in self.calls]
+
+
+@pytest.fixture
+def docker(monkeypatch):
+    fake = Docker()
+    monkeypatch.setattr(warm.subprocess, "run", fake.run)
+    return fake
+
+
+@pytest.fixture
+def context(tmp_path):
+    """Build context with a suite whose environment was brought up before"""
+    root = tmp_path / "project"
+    (root / ".httptests").mkdir(parents=True)
+    (root / ".httptests" / "config.yml").write_text("nginx: {}\n")
+    (root / ".httptests" / "test.json").write_text('{"hosts": {}}')
+    (root / "conf.d").mkdir()
+    (root / "conf.d" / "site.conf").write_text(SITE)
+    (root / "nginx.conf").write_text("events {}\nhttp { include conf.d/*.conf; }\n")
+    (root / "Dockerfile").write_text(DOCKERFILE)
+    return root
+
+
+def environment(context, tmp_path, monkeypatch, **options):
+    """WarmEnvironment of the context whose synced state is the current one; ``up`` is recorded"""
+    env = WarmEnvironment(str(context / ".httptests"), **options)
+    env.staging_dir = str(tmp_path / "staging")
+    env.save_state(env.current_files())
+    env.ups = 0
+
+    def up():
+        env.ups += 1
+        return True
+    monkeypatch.setattr(env, "up", up)
+    return env
+
+
+def edit_site(context):
+    text = SITE.replace("listen 80;", "listen 80;\n    add_header X-Edited yes;")
+    (context / "conf.d" / "site.conf").write_text(text)
+    return text
+
+
+def test_nothing_changed(context, tmp_path, monkeypatch, docker):
+    env = environment(context, tmp_path, monkeypatch)
+    assert env.sync()
+    assert docker.calls == [] and env.ups == 0
+
+
+def test_test_definitions_need_no_sync(context, tmp_path, monkeypatch, docker):
+    env = environment(context, tmp_path, monkeypatch)
+    (context / ".httptests" / "test.json").write_text('{"hosts": {"a": []}}')
+    assert env.sync()
+    assert docker.calls == [] and env.ups == 0
+
+
+def test_changed_conf_is_staged_copied_and_reloaded(context, tmp_path, monkeypatch, docker):
+    env = environment(context, tmp_path, monkeypatch, container_prefix="suite1")
+    source = edit_site(context)
+    assert env.sync()
+    assert docker.commands() == [
+        "docker cp suite1_nginx:/etc/nginx/conf.d/site.conf",
+        "docker exec suite1_nginx nginx -t",
+        "docker exec suite1_nginx nginx -s reload",
+    ]
+    assert docker.calls[0][2] == str(tmp_path / "staging" / "conf.d" / "site.conf")
+    copied = docker.copied["suite1_nginx:/etc/nginx/conf.d/site.conf"]
+    assert "X-Edited" in copied and "X-Upstream-Target" in copied
+    # The sources stay untouched
+    assert (context / "conf.d" / "site.conf").read_text() == source
+    # The new state is synced: a second run has nothing to do
+    docker.calls.clear()
+    assert env.sync() and docker.calls == []
+
+
+def test_without_upstream_headers_the_source_is_copied(context, tmp_path, monkeypatch, docker):
+    env = environment(context, tmp_path, monkeypatch, upstream_headers=False)
+    source = edit_site(context)
+    assert env.sync()
+    assert docker.calls[0][2] == str(context / "conf.d" / "site.conf")
+    assert docker.copied["httptests_nginx:/etc/nginx/conf.d/site.conf"] == source
+
+
+def test_rejected_configuration_is_not_reloaded(context, tmp_path, monkeypatch, docker):
+    env = environment(context, tmp_path, monkeypatch)
+    synced = env.load_state()
+    edit_site(context)
+    docker.test_status = 1
+    assert env.sync() is False
+    assert docker.commands()[-1] == "docker exec httptests_nginx nginx -t"
+    assert env.load_state() == synced and env.ups == 0
+    # Fixed files are reloaded on the next run
+    docker.test_status = 0
+    (context / "conf.d" / "site.conf").write_text(SITE.replace("listen 80;", "listen 81;"))
+    assert env.sync()
+    assert docker.commands()[-1] == "docker exec httptests_nginx nginx -s reload"
+
+
+@pytest.mark.parametrize("change", ["new_conf", "dockerfile", "deleted_conf"])
+def test_other_changes_rebuild(context, tmp_path, monkeypatch, docker, change):
+    env = environment(context, tmp_path, monkeypatch)
+    if change == "new_conf":
+        # Not copied by the Dockerfile: only a rebuild puts it in the image
+        (context / "extra.conf").write_text("events {}\n")
+    elif change == "dockerfile":
+        (context / "Dockerfile").write_text(DOCKERFILE + "RUN true\n")
+    else:
+        (context / "conf.d" / "site.conf").unlink()
+    assert env.sync()
+    assert env.ups == 1
+    assert not any(call[1] == "cp" for call in docker.calls)
+
+
+def test_deleted_conf_is_removed_from_staging(context, tmp_path, monkeypatch, docker):
+    env = environment(context, tmp_path, monkeypatch)
+    staged = tmp_path / "staging" / "conf.d" / "site.conf"
+    assert staged.is_file()
+    (context / "conf.d" / "site.conf").unlink()
+    env.current_files()
+    assert not staged.exists()
+    record = json.loads((tmp_path / "staging" / warm.STAGED_SOURCES).read_text())
+    assert "conf.d/site.conf" not in record
+
+
+def test_up_copies_rewritten_confs_into_the_new_container(context, tmp_path, docker):
+    env = WarmEnvironment(str(context / ".httptests"), container_prefix="suite1")
+    env.staging_dir = str(tmp_path / "staging")
+    assert env.up()
+    commands = docker.commands()
+    assert "--container-prefix suite1" in commands[0]
+    assert commands[1].startswith("docker compose") and commands[1].endswith("up -d --build")
+    # nginx.conf has no proxy_pass and is built from the source as is
+    assert commands[2:] == [
+        "docker cp suite1_nginx:/etc/nginx/conf.d/site.conf",
+        "docker exec suite1_nginx nginx -t",
+        "docker exec suite1_nginx nginx -s reload",
+    ]
+    assert env.load_state() == env.current_files()
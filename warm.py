@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""Keep a suite's Docker environment running between test runs.
+
+Instead of `docker compose up --build` / `down -v` around every run, the
+warm environment stays up. Before each run the build context is compared
+with the last synced state:
+
+- only nginx .conf files changed: they are copied into the running nginx
+  container and nginx is reloaded (`nginx -t && nginx -s reload`)
+- anything else changed (Dockerfile, config.yml, other build files): the
+  environment is rebuilt
+- nothing changed: tests run right away
+
+X-Upstream-Target headers are added to copies of the .conf files in a
+staging directory outside the build context; the sources are never
+modified. The staged copies are what gets copied into the container.
+
+Usage:
+    python warm.py up    --suite DIR/.httptests
+    python warm.py run   --suite DIR/.httptests [-- extra main.py args]
+    python warm.py watch --suite DIR/.httptests [--interval 1] [-- extra main.py args]
+    python warm.py down  --suite DIR/.httptests
+
+Container names follow --container-prefix (<prefix>_nginx), the same option
+main.py and generate_docker_compose.py take.
+"""
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from add_upstream_headers import NginxSyntaxError, manifest_version, rewrite
+from fingerprint import context_files, hash_file
+
+ACTION_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = ".warm-state.json"
+STAGED_SOURCES = ".staged-sources.json"
+DEFAULT_CONTAINER_PREFIX = "httptests"
+
+
+def project_name(parent_dir: str) -> str:
+    """Compose project name, derived from the suite's parent directory like action.yml does"""
+    suffix = re.sub(r"[^a-z0-9_-]", "", parent_dir.replace("/", "_").replace("\\", "_").lower()).strip("_-")
+    return f"httptests-{suffix}" if suffix and suffix != "." else "httptests"
+
+
+def staging_path(suite_dir: str) -> str:
+    """Directory outside the build context holding the suite's .conf files with upstream headers added"""
+    key = hashlib.sha256(os.path.abspath(suite_dir).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"httptests-warm-{key}")
+
+
+def snapshot(context_dir: str, excludes: List[str]) -> Dict[str, str]:
+    """Content hash of every build context file"""
+    files = {}
+    for rel_path in context_files(context_dir, excludes):
+        digest = hashlib.sha256()
+        hash_file(os.path.join(context_dir, rel_path), digest)
+        files[rel_path] = digest.hexdigest()
+    return files
+
+
+def copy_instructions(dockerfile: str) -> List[Tuple[List[str], str]]:
+    """(sources, destination) of COPY/ADD instructions of the final build stage"""
+    with open(dockerfile, "r", encoding="utf-8") as f:
+        # Join line continuations
+        text = re.sub(r"\\\r?\n", " ", f.read())
+    instructions: List[Tuple[List[str], str]] = []
+    for line in text.splitlines():
+        words = shlex.split(line.strip(), comments=True) if line.strip() else []
+        if not words:
+            continue
+        keyword = words[0].upper()
+        if keyword == "FROM":
+            instructions = []  # Only the last stage ends up in the image
+        elif keyword in ("COPY", "ADD"):
+            args = [w for w in words[1:] if not w.startswith("--")]
+            if any(w.startswith("--from") for w in words[1:]) or len(args) < 2:
+                continue
+            instructions.append(([posixpath.normpath(src) for src in args[:-1]], args[-1]))
+    return instructions
+
+
+def container_paths(rel_path: str, instructions: List[Tuple[List[str], str]]) -> List[str]:
+    """Where a build context file ends up in the image (empty if it is not copied)"""
+    targets = []
+    for sources, dest in instructions:
+        to_dir = dest.endswith("/") or len(sources) > 1
+        for src in sources:
+            if src == ".":
+                targets.append(posixpath.join(dest, rel_path))
+            elif rel_path == src:
+                targets.append(posixpath.join(dest, posixpath.basename(rel_path)) if to_dir else dest)
+            elif rel_path.startswith(src + "/"):
+                targets.append(posixpath.join(dest, rel_path[len(src) + 1:]))
+            elif rel_path.count("/") == src.count("/") and fnmatch.fnmatchcase(rel_path, src):
+                # Wildcards do not cross directories, like in COPY
+                targets.append(posixpath.join(dest, posixpath.basename(rel_path)))
+    return targets
+
+
+class WarmEnvironment:
+    """A suite's compose project that is kept running between test runs"""
+
+    def __init__(self, suite_dir: str, upstream_headers: bool = True,
+                 container_prefix: str = DEFAULT_CONTAINER_PREFIX):
+        self.suite_dir = os.path.abspath(suite_dir)
+        self.context_dir = os.path.dirname(self.suite_dir)
+        self.compose_file = os.path.join(self.suite_dir, "docker-compose.yml")
+        self.state_path = os.path.join(self.suite_dir, STATE_FILE)
+        self.staging_dir = staging_path(self.suite_dir)
+        self.project = project_name(os.path.relpath(self.context_dir))
+        self.upstream_headers = upstream_headers
+        self.container_prefix = container_prefix
+        self.nginx_container = f"{container_prefix}_nginx"
+
+    def compose(self, *args: str) -> None:
+        subprocess.run(["docker", "compose", "-f", self.compose_file, "-p", self.project, *args], check=True)
+
+    def load_state(self) -> Optional[Dict[str, str]]:
+        if not os.path.isfile(self.state_path):
+            return None
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_state(self, files: Dict[str, str]) -> None:
+        with open(self.state_path, "w", encoding="utf-8") as f:
+            json.dump(files, f, indent=2, sort_keys=True)
+
+    def source_files(self) -> Dict[str, str]:
+        """Content hash of every build context file, as found on disk"""
+        # Test definitions are read by main.py on every run and need no sync
+        suite = os.path.basename(self.suite_dir)
+        return snapshot(self.context_dir, [f"{suite}/{STATE_FILE}", f"{suite}/test.json", f"{suite}/test.jsonl"])
+
+    def stage(self, sources: Dict[str, str]) -> Dict[str, str]:
+        """Copy changed .conf files to the staging directory with X-Upstream-Target headers added.
+
+        Same rewrite the action applies before building, but the sources stay
+        untouched. Returns the content hash of each staged file.
+        """
+        record_path = os.path.join(self.staging_dir, STAGED_SOURCES)
+        record: Dict[str, str] = {}
+        if os.path.isfile(record_path):
+            with open(record_path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        # A new rewriter stages every file again
+        version = manifest_version()
+        if record.pop("", None) != version:
+            record = {}
+
+        staged: Dict[str, str] = {}
+        for rel_path, digest in sources.items():
+            if not rel_path.endswith(".conf"):
+                continue
+            target = os.path.join(self.staging_dir, rel_path)
+            if record.get(rel_path) != digest or not os.path.isfile(target):
+                source = os.path.join(self.context_dir, rel_path)
+                with open(source, "rb") as f:
+                    raw = f.read()
+                try:
+                    text, changes, _ = rewrite(raw.decode("utf-8"), os.path.dirname(source), self.context_dir)
+                    if changes:
+                        raw = text.encode("utf-8")
+                except (UnicodeDecodeError, NginxSyntaxError):
+                    pass  # Staged as-is; nginx -t reports what is wrong
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, "wb") as f:
+                    f.write(raw)
+            digest_of = hashlib.sha256()
+            hash_file(target, digest_of)
+            staged[rel_path] = digest_of.hexdigest()
+        for rel_path in set(record) - set(staged):
+            if os.path.isfile(os.path.join(self.staging_dir, rel_path)):
+                os.remove(os.path.join(self.staging_dir, rel_path))
+
+        os.makedirs(self.staging_dir, exist_ok=True)
+        with open(record_path, "w", encoding="utf-8") as f:
+            json.dump({**{p: sources[p] for p in staged}, "": version}, f, indent=2, sort_keys=True)
+        return staged
+
+    def current_files(self, sources: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """Content hash of every file as it should be in the environment"""
+        files = dict(sources or self.source_files())
+        if self.upstream_headers:
+            files.update(self.stage(files))
+        return files
+
+    def synced_path(self, rel_path: str) -> str:
+        """Local file whose content goes into the container for a build context file"""
+        staged = os.path.join(self.staging_dir, rel_path)
+        if self.upstream_headers and rel_path.endswith(".conf") and os.path.isfile(staged):
+            return staged
+        return os.path.join(self.context_dir, rel_path)
+
+    def up(self) -> bool:
+        """(Re)generate the compose file and build and start the environment.
+
+        The image is built from the sources, so staged .conf files that differ
+        from them are copied in afterwards. Returns False if nginx rejected them.
+        """
+        print(f"🚀 Starting warm environment {self.project}...")
+        subprocess.run([sys.executable, os.path.join(ACTION_DIR, "generate_docker_compose.py"),
+                        "--suite", self.suite_dir, "--output", self.compose_file,
+                        "--container-prefix", self.container_prefix], check=True,
+                       stdout=subprocess.DEVNULL)
+        self.compose("up", "-d", "--build")
+        sources = self.source_files()
+        current = self.current_files(sources)
+        rewritten = sorted(p for p in current if current[p] != sources.get(p))
+        if rewritten and self.reload(rewritten) is False:
+            return False
+        self.save_state(current)
+        return True
+
+    def down(self) -> None:
+        print(f"🧹 Stopping warm environment {self.project}...")
+        self.compose("down", "-v")
+        if os.path.isfile(self.state_path):
+            os.remove(self.state_path)
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+    def reload(self, changed: List[str]) -> Optional[bool]:
+        """Copy changed .conf files into nginx and reload it.
+
+        Returns None when a file is not copied by the Dockerfile (a rebuild is
+        needed), otherwise whether nginx accepted the new configuration.
+        """
+        instructions = copy_instructions(os.path.join(self.context_dir, "Dockerfile"))
+        copies = [(rel_path, container_paths(rel_path, instructions)) for rel_path in changed]
+        if not all(targets for _, targets in copies):
+            return None
+        for rel_path, targets in copies:
+            for target in targets:
+                print(f"  ↻ {rel_path} -> {self.nginx_container}:{target}")
+                subprocess.run(["docker", "cp", self.synced_path(rel_path),
+                                f"{self.nginx_container}:{target}"], check=True)
+        test = subprocess.run(["docker", "exec", self.nginx_container, "nginx", "-t"], capture_output=True, text=True)
+        if test.returncode != 0:
+            # The previous configuration keeps running until the files are fixed
+            print(f"❌ nginx rejected the new configuration:\n{test.stderr}")
+            return False
+        subprocess.run(["docker", "exec", self.nginx_container, "nginx", "-s", "reload"], check=True)
+        print(f"🔄 Reloaded nginx with {len(changed)} changed file(s)")
+        return True
+
+    def sync(self) -> bool:
+        """Bring the running environment up to date; False if nginx rejected the new config"""
+        previous = self.load_state()
+        if previous is None:
+            return self.up()
+        current = self.current_files()
+        changed = sorted(p for p in set(previous) | set(current) if previous.get(p) != current.get(p))
+        if not changed:
+            return True
+        if all(p.endswith(".conf") and p in current for p in changed):
+            reloaded = self.reload(changed)
+            if reloaded is not None:
+                if reloaded:
+                    self.save_state(current)
+                return reloaded
+        print(f"🔧 {len(changed)} build file(s) changed, rebuilding...")
+        return self.up()
+
+    def run_tests(self, extra_args: List[str]) -> int:
+        test_file = os.path.join(self.suite_dir, "test.json")
+        if not os.path.isfile(test_file) and os.path.isfile(os.path.join(self.suite_dir, "test.jsonl")):
+            test_file = os.path.join(self.suite_dir, "test.jsonl")
+        return subprocess.run([sys.executable, os.path.join(ACTION_DIR, "main.py"), "--test-file", test_file,
+                               "--container-prefix", self.container_prefix, *extra_args]).returncode
+
+
+def main() -> None:
+    """Main entry point"""
+    argv = sys.argv[1:]
+    extra_args: List[str] = []
+    if "--" in argv:
+        extra_args = argv[argv.index("--") + 1:]
+        argv = argv[:argv.index("--")]
+
+    parser = argparse.ArgumentParser(description="Keep a HTTPTests environment warm between test runs")
+    parser.add_argument("command", choices=["up", "run", "watch", "down"])
+    parser.add_argument("--suite", required=True, help="Path to .httptests directory")
+    parser.add_argument("--interval", type=float, default=1.0, help="watch: seconds between change checks")
+    parser.add_argument("--container-prefix", default=DEFAULT_CONTAINER_PREFIX,
+                        help="Prefix of the suite's container names, <prefix>_nginx (default: httptests)")
+    parser.add_argument("--no-upstream-headers", action="store_true",
+                        help="Do not add X-Upstream-Target headers to .conf files before syncing")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.suite):
+        print(f"Suite directory not found: {args.suite}", file=sys.stderr)
+        sys.exit(1)
+    env = WarmEnvironment(args.suite, upstream_headers=not args.no_upstream_headers,
+                          container_prefix=args.container_prefix)
+
+    if args.command == "up":
+        if not env.up():
+            sys.exit(1)
+    elif args.command == "down":
+        env.down()
+    elif args.command == "run":
+        if not env.sync():
+            sys.exit(1)
+        sys.exit(env.run_tests(extra_args))
+    else:
+        print(f"👀 Watching {env.context_dir} for changes (Ctrl+C to stop)")
+        last = None
+        try:
+            while True:
+                current = env.current_files()
+                if current != last:
+                    if env.sync():
+                        env.run_tests(extra_args)
+                    last = env.current_files()
+                time.sleep(args.interval)
+        except KeyboardInterrupt:
+            print("\nStopped watching; environment is still running (use 'warm.py down' to stop it)")
+
+
+if __name__ == "__main__":
+    main()